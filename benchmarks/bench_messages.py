@@ -0,0 +1,55 @@
+"""Compare building queued messages as dicts with building slotted messages.
+
+Run from the repository root with `python -m benchmarks.bench_messages`.
+"""
+
+import timeit
+import tracemalloc
+
+from fam_analytics_py.segment.message import SegmentMessage
+from fam_analytics_py.utils import clean
+
+MESSAGES = 10000
+NUMBER = 100000
+
+
+def legacy_track(user_id, event):
+    msg = {
+        "integrations": {},
+        "messageId": None,
+        "anonymousId": None,
+        "properties": {},
+        "timestamp": None,
+        "context": {},
+        "userId": user_id,
+        "type": "track",
+        "event": event,
+    }
+    return clean(msg)
+
+
+def slotted_track(user_id, event):
+    msg = SegmentMessage("track", user_id=user_id, event=event)
+    msg.clean_fields()
+    return msg
+
+
+def queued_size(build):
+    tracemalloc.start()
+    queue = [build("user-{0}".format(i), "signup") for i in range(MESSAGES)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del queue
+    return size
+
+
+def report(name, fn):
+    seconds = timeit.timeit(fn, number=NUMBER)
+    print("{0:<28} {1:8.3f} us/op".format(name, seconds / NUMBER * 1e6))
+
+
+if __name__ == "__main__":
+    for name, build in [("dict", legacy_track), ("slotted", slotted_track)]:
+        size = queued_size(build)
+        print("{0:<28} {1:8.1f} MB".format("queued " + name, size / 1e6))
+        report("build " + name, lambda: build("userId", "signup"))
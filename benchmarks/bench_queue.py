@@ -0,0 +1,74 @@
+"""Compare queueing messages as dicts with queueing them as JSON bytes.
+
+Measures the memory held by a full queue and the time to turn a batch of
+queued messages into a request body.
+
+Run from the repository root with `python -m benchmarks.bench_queue`.
+"""
+
+import json
+import timeit
+import tracemalloc
+
+from fam_analytics_py.encoding import encode, encode_array, encode_object
+from fam_analytics_py.utils import DatetimeSerializer, clock
+
+MESSAGES = 10000
+BATCH = 1000
+NUMBER = 20
+
+
+def make_message(i):
+    return {
+        "type": "track",
+        "userId": "user-{0}".format(i),
+        "event": "checkout_completed",
+        "messageId": "{0:032x}".format(i),
+        "timestamp": clock.isoformat(),
+        "properties": {
+            "order_id": i,
+            "items": [{"sku": "sku-{0}".format(n), "price": n * 1.5} for n in range(8)],
+            "coupon": None,
+            "notes": "x" * 200,
+        },
+        "context": {"library": {"name": "analytics-python", "version": "1.0"}},
+    }
+
+
+def queued_size(serialize):
+    tracemalloc.start()
+    queue = [
+        encode(make_message(i)) if serialize else make_message(i)
+        for i in range(MESSAGES)
+    ]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del queue
+    return size
+
+
+def dict_body(batch):
+    return json.dumps(
+        {"batch": batch, "sentAt": clock.isoformat()}, cls=DatetimeSerializer
+    )
+
+
+def bytes_body(batch):
+    return encode_object({"batch": encode_array(batch), "sentAt": clock.isoformat()})
+
+
+def report(name, fn):
+    seconds = timeit.timeit(fn, number=NUMBER)
+    print("{0:<28} {1:8.3f} ms/batch".format(name, seconds / NUMBER * 1e3))
+
+
+if __name__ == "__main__":
+    dicts = queued_size(False)
+    encoded = queued_size(True)
+    print("{0:<28} {1:8.1f} MB".format("queued dicts", dicts / 1e6))
+    print("{0:<28} {1:8.1f} MB".format("queued bytes", encoded / 1e6))
+
+    batch = [make_message(i) for i in range(BATCH)]
+    records = [encode(msg) for msg in batch]
+    report("body from dicts", lambda: dict_body(batch))
+    report("body from bytes", lambda: bytes_body(records))
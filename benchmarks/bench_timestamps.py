@@ -0,0 +1,43 @@
+"""Compare the old and new timestamp handling used while preparing messages.
+
+Run from the repository root with `python -m benchmarks.bench_timestamps`.
+"""
+
+import timeit
+from datetime import datetime
+
+from dateutil.tz import tzlocal, tzutc
+
+from fam_analytics_py.utils import guess_timezone, to_epoch_seconds, to_isoformat
+
+NUMBER = 100000
+
+
+def legacy_default_iso():
+    return datetime.utcnow().replace(tzinfo=tzutc()).isoformat()
+
+
+def legacy_default_epoch():
+    return str(int(datetime.now(tzutc()).timestamp()))
+
+
+def legacy_naive_iso(dt):
+    delta = datetime.now() - dt
+    if delta.total_seconds() < 5:
+        return dt.replace(tzinfo=tzlocal()).isoformat()
+    return dt.replace(tzinfo=tzutc()).isoformat()
+
+
+def report(name, fn):
+    seconds = timeit.timeit(fn, number=NUMBER)
+    print("{0:<28} {1:8.3f} us/op".format(name, seconds / NUMBER * 1e6))
+
+
+if __name__ == "__main__":
+    naive = datetime(2014, 9, 3)
+    report("legacy default iso", legacy_default_iso)
+    report("default iso", to_isoformat)
+    report("legacy default epoch", legacy_default_epoch)
+    report("default epoch", lambda: str(to_epoch_seconds()))
+    report("legacy naive iso", lambda: legacy_naive_iso(naive))
+    report("naive iso", lambda: guess_timezone(naive).isoformat())
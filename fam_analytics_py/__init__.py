@@ -1,23 +1,47 @@
 from typing import Callable, Optional
 from fam_analytics_py import globals
-from fam_analytics_py.clevertap import CleverTapConfig
-from fam_analytics_py.mixpanel import MixpanelConfig
-from fam_analytics_py.segment import SegmentConfig
+from fam_analytics_py.base import Priority
+from fam_analytics_py.base.consumer import drain
+from fam_analytics_py.buffering import buffered, current_buffer
+from fam_analytics_py.clevertap import CleverTapClient, CleverTapConfig
+from fam_analytics_py.constants import Provider
+from fam_analytics_py.dead_letter import DeadLetterStore
+from fam_analytics_py.hooks import Hooks, ProfilingHook
+from fam_analytics_py.ids import default_id_generator
+from fam_analytics_py.mixpanel import MixpanelClient, MixpanelConfig
+from fam_analytics_py.routing import RoutingRules
+from fam_analytics_py.sampling import SamplingRules
+from fam_analytics_py.schema import SchemaRegistry
+from fam_analytics_py.segment import SegmentClient, SegmentConfig
+from fam_analytics_py.tenants import ClientRegistry
+from fam_analytics_py.trait_cache import TraitCache
 
 
 __all__ = (
     "alias",
+    "buffered",
     "flush",
     "group",
     "identify",
+    "identify_many",
     "initialize",
     "join",
     "page",
     "screen",
     "track",
+    "track_many",
+    "ClientRegistry",
     "CleverTapConfig",
+    "DeadLetterStore",
+    "Hooks",
     "MixpanelConfig",
+    "Priority",
+    "ProfilingHook",
+    "RoutingRules",
+    "SamplingRules",
+    "SchemaRegistry",
     "SegmentConfig",
+    "TraitCache",
 )
 
 
@@ -28,6 +52,12 @@ def initialize(
     is_clevertap_enabled: Optional[Callable[[], bool]] = None,
     is_mixpanel_enabled: Optional[Callable[[], bool]] = None,
     is_segment_enabled: Optional[Callable[[], bool]] = None,
+    id_generator: Optional[Callable[[], str]] = None,
+    trait_cache: Optional[TraitCache] = None,
+    sampling_rules: Optional[SamplingRules] = None,
+    routing_rules: Optional[RoutingRules] = None,
+    schema_registry: Optional[SchemaRegistry] = None,
+    hooks: Optional[Hooks] = None,
 ):
     globals.set_clevertap_config(clevertap_config)
     globals.set_mixpanel_config(mixpanel_config)
@@ -43,6 +73,23 @@ def initialize(
         lambda: segment_config is not None
     )
 
+    # one ID per call is shared by every provider, so it doubles as the
+    # cross-provider dedup key
+    globals.id_generator = id_generator or default_id_generator
+    globals.trait_cache = trait_cache
+    globals.sampling_rules = sampling_rules
+    globals.routing_rules = routing_rules
+    globals.schema_registry = schema_registry
+    if trait_cache is not None:
+        # identifies dropped after they were queued, e.g. shed or failed,
+        # are sent in full next time
+        hooks = Hooks(on_drop=_forget_dropped_users).extend(hooks or Hooks())
+    # compiled once, so the clients share the pipeline and stages without
+    # hooks are skipped
+    if hooks is not None:
+        hooks.compile()
+    globals.hooks = hooks
+
     globals.is_initialized = True
 
 
@@ -53,7 +100,103 @@ def track(*args, **kwargs):
 
 def identify(*args, **kwargs):
     """Send a identify call."""
-    _proxy("identify", *args, **kwargs)
+    trait_cache = globals.trait_cache
+    if trait_cache is None:
+        _proxy("identify", *args, **kwargs)
+        return
+
+    kwargs = _diff_traits(trait_cache, _as_kwargs("identify", args, kwargs))
+    if kwargs is None:
+        return
+    try:
+        results = _proxy("identify", **kwargs)
+    except Exception:
+        # the cache already holds the update that was never queued
+        _forget_users(trait_cache, [kwargs])
+        raise
+    _forget_dropped(trait_cache, kwargs, results)
+
+
+def track_many(events):
+    """Send a track call for each dict of `track()` arguments in `events`.
+
+    Returns the results of each event, a `(success, msg)` per provider.
+    """
+    return _proxy_many("track", events)
+
+
+def identify_many(users):
+    """Send an identify call for each dict of `identify()` arguments in
+    `users`, see `track_many()`."""
+    trait_cache = globals.trait_cache
+    if trait_cache is None:
+        return _proxy_many("identify", users)
+
+    users = list(users)
+    try:
+        calls = [_diff_traits(trait_cache, dict(kwargs)) for kwargs in users]
+        sent = [kwargs for kwargs in calls if kwargs is not None]
+        sent_results = iter(_proxy_many("identify", sent))
+    except Exception:
+        # an invalid call queues nothing, so neither may the cache keep
+        # the updates of the others
+        _forget_users(trait_cache, users)
+        raise
+
+    results = []
+    for kwargs in calls:
+        if kwargs is None:
+            results.append([])
+            continue
+        result = next(sent_results)
+        _forget_dropped(trait_cache, kwargs, result)
+        results.append(result)
+    return results
+
+
+def _diff_traits(trait_cache, kwargs):
+    """Keep the changed traits of an identify call, None if there are none."""
+    user_id = kwargs.get("user_id")
+    traits = kwargs.get("traits")
+    if user_id is not None and traits:
+        traits = trait_cache.diff(user_id, traits)
+        if not traits and not kwargs.get("anonymous_id"):
+            # nothing changed since the last identify of this user
+            return None
+        kwargs["traits"] = traits
+        buffer = current_buffer()
+        if buffer is not None:
+            # the cache already holds the update, so forget it if the
+            # buffered messages are dropped
+            buffer.on_discard(lambda: trait_cache.forget(user_id))
+    return kwargs
+
+
+def _forget_users(trait_cache, calls):
+    for kwargs in calls:
+        user_id = kwargs.get("user_id") if isinstance(kwargs, dict) else None
+        if user_id is not None:
+            trait_cache.forget(user_id)
+
+
+def _forget_dropped_users(provider, records, reason):
+    trait_cache = globals.trait_cache
+    if trait_cache is None:
+        return
+    identified_user = _CLIENTS[provider].identified_user
+    for record in records:
+        user_id = identified_user(record)
+        if user_id is not None:
+            trait_cache.forget(user_id)
+
+
+def _forget_dropped(trait_cache, kwargs, results):
+    user_id = kwargs.get("user_id")
+    if user_id is not None and any(
+        result is not None and not result[0] for result in results
+    ):
+        # a provider dropped the update, so resend everything next time
+        trait_cache.forget(user_id)
 
 
 def group(*args, **kwargs):
@@ -78,7 +221,18 @@ def screen(*args, **kwargs):
 
 def flush():
     """Tell the client to flush."""
-    _proxy("flush")
+    globals.raise_if_not_initialized()
+
+    manual = []
+    for _, is_client_enabled, get_client in _providers():
+        if is_client_enabled():
+            client = get_client()
+            if client.manual_flush:
+                manual.extend(client.consumers)
+            else:
+                client.flush()
+    # manual-flush clients upload from this thread, every provider at once
+    drain(manual)
 
 
 def join():
@@ -86,17 +240,211 @@ def join():
     _proxy("join")
 
 
+# positional parameters of each call, as declared on `BaseClient`
+_PARAMETERS = {
+    "track": (
+        "user_id",
+        "event",
+        "properties",
+        "context",
+        "timestamp",
+        "anonymous_id",
+        "integrations",
+        "message_id",
+        "priority",
+    ),
+    "identify": (
+        "user_id",
+        "traits",
+        "context",
+        "timestamp",
+        "anonymous_id",
+        "integrations",
+        "message_id",
+        "priority",
+    ),
+    "group": (
+        "user_id",
+        "group_id",
+        "traits",
+        "context",
+        "timestamp",
+        "anonymous_id",
+        "integrations",
+        "message_id",
+    ),
+    "alias": (
+        "previous_id",
+        "user_id",
+        "context",
+        "timestamp",
+        "integrations",
+        "message_id",
+    ),
+    "page": (
+        "user_id",
+        "category",
+        "name",
+        "properties",
+        "context",
+        "timestamp",
+        "anonymous_id",
+        "integrations",
+        "message_id",
+    ),
+    "screen": (
+        "user_id",
+        "category",
+        "name",
+        "properties",
+        "context",
+        "timestamp",
+        "anonymous_id",
+        "integrations",
+        "message_id",
+    ),
+}
+
+
+def _as_kwargs(method, args, kwargs):
+    """Fold the positional `args` of a `method` call into `kwargs`."""
+    if not args:
+        return kwargs
+    names = _PARAMETERS[method]
+    if len(args) > len(names):
+        raise TypeError(
+            "{0}() takes at most {1} positional arguments".format(method, len(names))
+        )
+    for name, value in zip(names, args):
+        if name in kwargs:
+            raise TypeError(
+                "{0}() got multiple values for argument '{1}'".format(method, name)
+            )
+        kwargs[name] = value
+    return kwargs
+
+
 def _proxy(method, *args, **kwargs):
     """Create an analytics client if one doesn't exist and send to it."""
 
     globals.raise_if_not_initialized()
 
-    for is_client_enabled, get_client in [
-        (globals.is_clevertap_enabled, globals.get_clevertap_client),
-        (globals.is_mixpanel_enabled, globals.get_mixpanel_client),
-        (globals.is_segment_enabled, globals.get_segment_client),
-    ]:
+    if method in _PARAMETERS:
+        kwargs = _as_kwargs(method, args, kwargs)
+        args = ()
+        if not kwargs.get("message_id"):
+            kwargs["message_id"] = globals.id_generator()
+
+    sampling_rules = None
+    routes = None
+    if method == "track":
+        if globals.schema_registry is not None:
+            globals.schema_registry.validate(
+                kwargs.get("event"), kwargs.get("properties")
+            )
+        sampling_rules = globals.sampling_rules
+        if globals.routing_rules is not None:
+            routes = globals.routing_rules.providers(kwargs.get("event"))
+
+    results = []
+    for provider, is_client_enabled, get_client in _providers():
+        if routes is not None and provider not in routes:
+            continue
         if is_client_enabled():
+            client_kwargs = kwargs
+            if sampling_rules is not None:
+                client_kwargs = _sample(sampling_rules, provider, kwargs)
+                if client_kwargs is None:
+                    continue
+
             client = get_client()
             fn = getattr(client, method)
-            fn(*args, **kwargs)
+            results.append(fn(*args, **client_kwargs))
+
+    return results
+
+
+def _proxy_many(method, calls):
+    """Send a list of `method` calls with one bulk call per client.
+
+    Returns the results of each call, as `_proxy` does.
+    """
+
+    globals.raise_if_not_initialized()
+
+    calls = [dict(kwargs) for kwargs in calls]
+    for kwargs in calls:
+        if not kwargs.get("message_id"):
+            kwargs["message_id"] = globals.id_generator()
+
+    sampling_rules = None
+    routing_rules = None
+    if method == "track":
+        if globals.schema_registry is not None:
+            # reject the whole list before any of it is queued
+            for kwargs in calls:
+                globals.schema_registry.validate(
+                    kwargs.get("event"), kwargs.get("properties")
+                )
+        sampling_rules = globals.sampling_rules
+        routing_rules = globals.routing_rules
+
+    results = [[] for _ in calls]
+    for provider, is_client_enabled, get_client in _providers():
+        if not is_client_enabled():
+            continue
+
+        indexes = []
+        batch = []
+        for index, kwargs in enumerate(calls):
+            if routing_rules is not None and provider not in routing_rules.providers(
+                kwargs.get("event")
+            ):
+                continue
+            if sampling_rules is not None:
+                kwargs = _sample(sampling_rules, provider, kwargs)
+                if kwargs is None:
+                    continue
+            indexes.append(index)
+            batch.append(kwargs)
+
+        if batch:
+            fn = getattr(get_client(), method + "_many")
+            for index, result in zip(indexes, fn(batch)):
+                results[index].append(result)
+
+    return results
+
+
+_CLIENTS = {
+    Provider.clevertap: CleverTapClient,
+    Provider.mixpanel: MixpanelClient,
+    Provider.segment: SegmentClient,
+}
+
+
+def _providers():
+    return [
+        (
+            Provider.clevertap,
+            globals.is_clevertap_enabled,
+            globals.get_clevertap_client,
+        ),
+        (Provider.mixpanel, globals.is_mixpanel_enabled, globals.get_mixpanel_client),
+        (Provider.segment, globals.is_segment_enabled, globals.get_segment_client),
+    ]
+
+
+def _sample(sampling_rules, provider, kwargs):
+    """Return the track `kwargs` for `provider`, or None if sampled out."""
+    rate = sampling_rules.rate(provider, kwargs.get("event"))
+    if rate >= 1.0:
+        return kwargs
+    if not sampling_rules.keep(
+        kwargs.get("user_id") or kwargs.get("anonymous_id"), rate
+    ):
+        return None
+
+    properties = dict(kwargs.get("properties") or {})
+    properties[sampling_rules.rate_property] = rate
+    return dict(kwargs, properties=properties)
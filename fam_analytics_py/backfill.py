@@ -0,0 +1,389 @@
+"""Stream historical events from a JSONL or CSV file into a provider.
+
+    python -m fam_analytics_py.backfill events.jsonl --provider mixpanel
+
+Every record is a `track()` call: `user_id` and/or `anonymous_id`, `event`,
+`timestamp` (ISO 8601 or epoch seconds, naive values are UTC), an optional
+`message_id` and `properties`. In CSV files every other column is a
+property. Records are built into provider payloads by the client, batched
+at the provider's upload size and posted by parallel workers, bypassing
+the client queue.
+
+Progress is checkpointed after every batch, so an interrupted run resumes
+where it stopped. Records without a `message_id` get one derived from
+their content, so batches resent after a resume are deduplicated by
+Segment and Mixpanel.
+"""
+
+import argparse
+import csv
+import dataclasses
+import hashlib
+import json
+import logging
+import os
+import sys
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from threading import Lock, local
+
+from dateutil.parser import isoparse
+
+from fam_analytics_py.clevertap import CleverTapClient, CleverTapConfig
+from fam_analytics_py.constants import Provider
+from fam_analytics_py.encoding import encode
+from fam_analytics_py.message import to_wire
+from fam_analytics_py.mixpanel import MixpanelClient, MixpanelConfig
+from fam_analytics_py.segment import SegmentClient, SegmentConfig
+from fam_analytics_py.utils import UTC, DatetimeSerializer
+
+LOGGER = logging.getLogger("fam-analytics-py")
+
+CLIENTS = {
+    Provider.clevertap: CleverTapClient,
+    Provider.mixpanel: MixpanelClient,
+    Provider.segment: SegmentClient,
+}
+
+FIELDS = ("user_id", "anonymous_id", "event", "timestamp", "message_id")
+
+
+class BackfillError(Exception):
+    """The backfill stopped before every record was delivered."""
+
+
+def read_records(path, format=None):
+    """Yield the records of a JSONL or CSV file, one at a time."""
+    format = format or ("csv" if path.lower().endswith(".csv") else "jsonl")
+    with open(path, newline="", encoding="utf-8") as f:
+        if format == "csv":
+            for row in csv.DictReader(f):
+                record = {key: row.pop(key) for key in FIELDS if key in row}
+                record["properties"] = row
+                yield record
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def parse_timestamp(value):
+    """Return `value`, ISO 8601 or epoch seconds, as an aware datetime."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, str):
+        try:
+            value = float(value)
+        except ValueError:
+            timestamp = isoparse(value)
+            if timestamp.tzinfo is None:
+                timestamp = timestamp.replace(tzinfo=UTC)
+            return timestamp
+    return datetime.fromtimestamp(value, UTC)
+
+
+def record_id(record):
+    """A message ID that is the same every time `record` is read."""
+    data = json.dumps(record, sort_keys=True, cls=DatetimeSerializer)
+    return hashlib.blake2b(data.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class _Unqueued(object):
+    """Makes the calls of a client return the prepared message, which the
+    backfill sends itself, instead of the dict of a queued call."""
+
+    def _enqueue(self, msg, priority=None):
+        return self._queue(msg, priority)
+
+
+class Checkpoint(object):
+    """The number of records of `source` that were handled, kept in `path`."""
+
+    def __init__(self, path, source, provider):
+        self.path = path
+        self.source = os.path.abspath(source)
+        self.provider = provider
+
+    def load(self):
+        if self.path is None or not os.path.exists(self.path):
+            return 0
+        with open(self.path) as f:
+            state = json.load(f)
+        if state["source"] != self.source or state["provider"] != self.provider:
+            raise BackfillError(
+                "checkpoint {0} belongs to a backfill of {1} into {2}".format(
+                    self.path, state["source"], state["provider"]
+                )
+            )
+        return state["offset"]
+
+    def save(self, offset):
+        if self.path is None:
+            return
+        state = {"source": self.source, "provider": self.provider, "offset": offset}
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+        # never leave a half-written checkpoint behind
+        os.replace(tmp, self.path)
+
+
+class Backfill(object):
+    """Upload the records of a file to one provider with parallel workers."""
+
+    def __init__(self, provider, config, checkpoint=None, workers=4):
+        self.provider = provider
+        self.checkpoint = checkpoint
+        self.workers = workers
+        self.stats = {"records": 0, "invalid": 0, "rejected": 0, "failed": 0}
+        self._lock = Lock()
+        self._worker = local()
+
+        # neither started nor flushed by hand, so calls are never queued
+        config = dataclasses.replace(
+            config,
+            start_consumer=False,
+            manual_flush=False,
+            error_callback=self._on_error,
+            dead_letter_callback=self._on_rejected,
+        )
+        client_class = CLIENTS[provider]
+        client_class = type(client_class.__name__, (_Unqueued, client_class), {})
+        self.client = client_class.from_config(config)
+        # the first lane sends events for every provider
+        self.consumer = self.client.consumer
+        self.upload_size = self.consumer.upload_size
+        self.max_batch_bytes = self.consumer.max_batch_bytes
+
+    def _on_error(self, error, records):
+        LOGGER.error("failed to send %s records: %s", len(records), error)
+        # called from the worker sending the batch
+        self._worker.failed = True
+        with self._lock:
+            self.stats["failed"] += len(records)
+
+    def _on_rejected(self, error, records):
+        LOGGER.warning("%s records rejected: %s", len(records), error)
+        with self._lock:
+            self.stats["rejected"] += len(records)
+
+    def _messages(self, records, skip):
+        """Yield `(offset, payload)`, offset counting the records read."""
+        for offset, record in enumerate(records, 1):
+            if offset <= skip:
+                continue
+            try:
+                _, msg = self.client.track(
+                    user_id=record.get("user_id"),
+                    anonymous_id=record.get("anonymous_id"),
+                    event=record.get("event"),
+                    properties=record.get("properties") or None,
+                    timestamp=parse_timestamp(record.get("timestamp")),
+                    message_id=record.get("message_id") or record_id(record),
+                )
+            except (AssertionError, TypeError, ValueError) as e:
+                LOGGER.warning("skipping invalid record %s: %s", offset, e)
+                self.stats["invalid"] += 1
+                continue
+            yield offset, to_wire(msg, self.client.compact)
+
+    def _batches(self, messages):
+        """Yield `(offset, batch)`, cut at the provider's upload limits."""
+        batch = []
+        size = 0
+        offset = 0
+        for offset, payload in messages:
+            batch.append(payload)
+            if self.max_batch_bytes is not None:
+                size += len(encode(payload, self.client.compact))
+            if len(batch) >= self.upload_size or (
+                self.max_batch_bytes is not None and size >= self.max_batch_bytes
+            ):
+                yield offset, batch
+                batch = []
+                size = 0
+        if batch:
+            yield offset, batch
+
+    def _send(self, batch):
+        """Send `batch` from a worker, return whether it was delivered.
+
+        Records the provider rejected count as delivered, they are final.
+        """
+        self._worker.failed = False
+        self.consumer.send(batch)
+        return not self._worker.failed
+
+    def run(self, records, skip=0):
+        """Upload `records`, resuming after the first `skip` of them."""
+        if self.checkpoint is not None:
+            skip = max(skip, self.checkpoint.load())
+        self.committed = skip
+        self._halted = False
+
+        # batches finish out of order, so the checkpoint only moves past a
+        # batch once it and every batch before it were delivered
+        self._pending = {}
+        self._done = {}
+        self._order = deque()
+        messages = self._messages(records, skip)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for offset, batch in self._batches(messages):
+                self.stats["records"] += len(batch)
+                self._pending[executor.submit(self._send, batch)] = offset
+                self._order.append(offset)
+                # bound the batches held in memory
+                if len(self._pending) >= self.workers * 2:
+                    self._collect()
+                if self._halted:
+                    break
+            while self._pending:
+                self._collect()
+
+        if self._halted:
+            raise BackfillError(
+                "{0} records could not be sent, resume from record {1}".format(
+                    self.stats["failed"], self.committed + 1
+                )
+            )
+        return self.stats
+
+    def _collect(self):
+        """Wait for a batch to finish and advance the checkpoint."""
+        finished, _ = wait(self._pending, return_when=FIRST_COMPLETED)
+        for future in finished:
+            self._done[self._pending.pop(future)] = future.result()
+
+        while self._order and self._order[0] in self._done:
+            offset = self._order.popleft()
+            if not self._done.pop(offset):
+                self._halted = True
+            if self._halted:
+                continue
+            self.committed = offset
+            if self.checkpoint is not None:
+                self.checkpoint.save(offset)
+
+
+def config_from_args(args):
+    """Build the config of `args.provider` from the provider arguments."""
+    common = dict(
+        host_url=args.host,
+        rate_limit_events_per_second=args.events_per_second,
+        rate_limit_bytes_per_second=args.bytes_per_second,
+        compact_encoding=args.compact,
+    )
+    if args.provider == Provider.segment:
+        return SegmentConfig(write_key=_require(args, "write_key"), **common)
+    if args.provider == Provider.mixpanel:
+        return MixpanelConfig(
+            project_id=_require(args, "project_id"),
+            project_token=_require(args, "project_token"),
+            service_account_username=_require(args, "service_account_username"),
+            service_account_secret=_require(args, "service_account_secret"),
+            **common,
+        )
+    return CleverTapConfig(
+        account_id=_require(args, "account_id"),
+        passcode=_require(args, "passcode"),
+        **common,
+    )
+
+
+def _require(args, name):
+    value = getattr(args, name)
+    if not value:
+        raise SystemExit(
+            "--{0} or ${1}_{2} is required for {1}".format(
+                name.replace("_", "-"), args.provider.upper(), name.upper()
+            )
+        )
+    return value
+
+
+def add_provider_arguments(parser):
+    """Add the provider, its credentials and upload options to `parser`."""
+    parser.add_argument("--provider", required=True, choices=sorted(CLIENTS))
+    parser.add_argument("--host")
+    parser.add_argument("--events-per-second", type=float)
+    parser.add_argument("--bytes-per-second", type=float)
+    parser.add_argument("--compact", action="store_true")
+
+    credentials = parser.add_argument_group(
+        "credentials", "default to $<PROVIDER>_<NAME>, e.g. $SEGMENT_WRITE_KEY"
+    )
+    for provider, names in (
+        (Provider.segment, ("write_key",)),
+        (
+            Provider.mixpanel,
+            (
+                "project_id",
+                "project_token",
+                "service_account_username",
+                "service_account_secret",
+            ),
+        ),
+        (Provider.clevertap, ("account_id", "passcode")),
+    ):
+        for name in names:
+            credentials.add_argument(
+                "--" + name.replace("_", "-"),
+                default=os.environ.get("{0}_{1}".format(provider, name).upper()),
+            )
+
+
+def _parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m fam_analytics_py.backfill",
+        description="Upload historical events from a JSONL or CSV file.",
+    )
+    parser.add_argument("path", help="JSONL or CSV file of track records")
+    parser.add_argument("--format", choices=("jsonl", "csv"))
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument(
+        "--checkpoint",
+        help="progress file, defaults to <path>.<provider>.checkpoint",
+    )
+    parser.add_argument(
+        "--restart", action="store_true", help="ignore an existing checkpoint"
+    )
+    add_provider_arguments(parser)
+    return parser
+
+
+def main(argv=None):
+    args = _parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    checkpoint = Checkpoint(
+        args.checkpoint or "{0}.{1}.checkpoint".format(args.path, args.provider),
+        args.path,
+        args.provider,
+    )
+    if args.restart and os.path.exists(checkpoint.path):
+        os.remove(checkpoint.path)
+
+    backfill = Backfill(
+        args.provider,
+        config_from_args(args),
+        checkpoint=checkpoint,
+        workers=args.workers,
+    )
+    try:
+        stats = backfill.run(read_records(args.path, args.format))
+    except BackfillError as e:
+        LOGGER.error("%s", e)
+        return 1
+
+    LOGGER.info(
+        "sent %s records, %s invalid, %s rejected",
+        stats["records"],
+        stats["invalid"],
+        stats["rejected"],
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,5 @@
 # flake8: noqa
 from .client import BaseClient
-from .consumer import BaseConsumer
+from .lanes import LaneQueue, Priority
+from .consumer import BaseConsumer, is_rejection, is_retryable
+from .watchdog import Watchdog
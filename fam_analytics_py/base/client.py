@@ -2,12 +2,26 @@ import atexit
 import logging
 import queue
 
+from fam_analytics_py import tracing
+from fam_analytics_py.buffering import collecting, current_buffer
+from fam_analytics_py.encoding import decode, encode
+from fam_analytics_py.hooks import NO_HOOKS
+from fam_analytics_py.ids import default_id_generator
+from fam_analytics_py.message import as_dict, to_wire
+from fam_analytics_py.metrics import Metrics
+
+from .consumer import drain
+from .lanes import LaneQueue, Priority
+from .watchdog import Watchdog
+
 LOGGER = logging.getLogger("fam-analytics-py")
 
 
 class BaseClient(object):
     """Base Client class. Inherit this to integrate a new client."""
 
+    PROVIDER = None
+
     def __init__(
         self,
         write_key=None,
@@ -17,22 +31,66 @@ class BaseClient(object):
         max_queue_size=10000,
         send=True,
         on_error=None,
+        id_generator=None,
+        on_dead_letter=None,
+        rate_limiter=None,
+        priority_weights=None,
+        critical_reserve=0.1,
+        serialize=False,
+        max_queue_bytes=None,
+        compact=False,
+        dead_letter_store=None,
+        manual_flush=False,
+        watchdog_interval=10.0,
+        stall_timeout=300.0,
+        trace_delivery=False,
+        hooks=None,
     ):
-        self.queue = queue.Queue(max_queue_size)
+        if max_queue_bytes is not None and not serialize:
+            raise ValueError("max_queue_bytes requires serialize=True")
+        if trace_delivery and not tracing.available():
+            raise ImportError("trace_delivery requires opentelemetry-api")
+        self.max_queue_size = max_queue_size
+        # queue messages as JSON bytes, which take a fraction of the memory
+        # of the dicts and are joined into the request body as they are
+        self.serialize = serialize
+        self.max_queue_bytes = max_queue_bytes
+        self.compact = compact
+        # link the upload span of each batch to the spans that queued it
+        self.trace_delivery = trace_delivery
+        self.pipeline = hooks.compile() if hooks is not None else NO_HOOKS
+        self.priority_weights = priority_weights
+        self.critical_reserve = critical_reserve
         self.host = host
         self.write_key = write_key
         self.credentials = credentials
         self.on_error = on_error
+        self.on_dead_letter = on_dead_letter
+        self.dead_letter_store = dead_letter_store
+        self.rate_limiter = rate_limiter
         self.debug = debug
         self.send = send
+        # no consumer threads, `flush()` uploads from the calling thread
+        self.manual_flush = manual_flush
+        self.id_generator = id_generator or default_id_generator
+        # shared with the consumers, see `_get_consumer`
+        self.metrics = Metrics()
+        if rate_limiter is not None:
+            rate_limiter.register_gauges(self.metrics)
+        self.queue = self._make_queue()
+
+        # restarts dead or stalled consumers once they are started
+        self.watchdog = None
 
-        self.consumer = self._get_consumer()
+        # one consumer per lane; most clients have a single lane
+        self.consumers = self._get_consumers()
+        self.consumer = self.consumers[0]
 
         if debug:
             LOGGER.setLevel(logging.DEBUG)
 
         # if we've disabled sending, just don't start the consumer
-        if send:
+        if send and not manual_flush:
             # On program exit, allow the consumer thread to exit cleanly.
             # This prevents exceptions and a messy shutdown when the
             # interpreter is destroyed before the daemon thread finishes
@@ -40,7 +98,11 @@ class BaseClient(object):
             # To guarantee all messages have been delivered, you'll still
             # need to call flush().
             atexit.register(self.join)
-            self.consumer.start()
+            for consumer in self.consumers:
+                consumer.start()
+            if watchdog_interval:
+                self.watchdog = Watchdog(self, watchdog_interval, stall_timeout)
+                self.watchdog.start()
 
     @property
     def upload_size(self):
@@ -49,6 +111,41 @@ class BaseClient(object):
     def _get_consumer(self):
         raise NotImplementedError()
 
+    def _make_queue(self):
+        """Create the queue of a lane, split by message priority."""
+        return LaneQueue(
+            self.max_queue_size,
+            weights=self.priority_weights,
+            reserve=self.critical_reserve,
+            metrics=self.metrics,
+            maxbytes=self.max_queue_bytes,
+            trace=self.trace_delivery,
+            on_shed=self._shed,
+        )
+
+    def _get_consumers(self):
+        """Return the consumers of every lane, each draining its own queue."""
+        return [self._get_consumer()]
+
+    def _new_consumer(self, consumer):
+        """Return a consumer to take over the lane of `consumer`."""
+        return self._get_consumer()
+
+    def _restart_consumer(self, index):
+        """Replace the consumer at `index` with a new thread on its queue."""
+        old = self.consumers[index]
+        old.pause()
+        consumer = self._new_consumer(old)
+        self.consumers[index] = consumer
+        if index == 0:
+            self.consumer = consumer
+        consumer.start()
+        return consumer
+
+    def _get_queue(self, msg):
+        """Return the queue of the lane `msg` belongs to."""
+        return self.queue
+
     def _get_url(self):
         raise NotImplementedError()
 
@@ -66,6 +163,8 @@ class BaseClient(object):
         timestamp=None,
         anonymous_id=None,
         integrations=None,
+        message_id=None,
+        priority=None,
     ):
         raise NotImplementedError()
 
@@ -78,6 +177,8 @@ class BaseClient(object):
         timestamp=None,
         anonymous_id=None,
         integrations=None,
+        message_id=None,
+        priority=None,
     ):
         raise NotImplementedError()
 
@@ -88,6 +189,7 @@ class BaseClient(object):
         context=None,
         timestamp=None,
         integrations=None,
+        message_id=None,
     ):
         raise NotImplementedError()
 
@@ -100,6 +202,7 @@ class BaseClient(object):
         timestamp=None,
         anonymous_id=None,
         integrations=None,
+        message_id=None,
     ):
         raise NotImplementedError()
 
@@ -113,6 +216,7 @@ class BaseClient(object):
         timestamp=None,
         anonymous_id=None,
         integrations=None,
+        message_id=None,
     ):
         raise NotImplementedError()
 
@@ -126,42 +230,152 @@ class BaseClient(object):
         timestamp=None,
         anonymous_id=None,
         integrations=None,
+        message_id=None,
     ):
         raise NotImplementedError()
 
-    def _enqueue(self, msg):
+    def _enqueue(self, msg, priority=None):
         """Push a new `msg` onto the queue, return `(success, msg)`"""
+        success, msg = self._queue(msg, priority)
+        # callers get a plain dict, the queue keeps the message
+        return success, as_dict(msg)
+
+    def _queue(self, msg, priority):
         msg = self._prepare_msg(msg)
+        before_enqueue = self.pipeline.before_enqueue
+        if before_enqueue is not None:
+            hooked = before_enqueue(self.PROVIDER, msg)
+            if hooked is None:
+                self._dropped([msg], "hook")
+                return False, msg
+            msg = hooked
         LOGGER.debug("queueing: %s", msg)
 
         # if send is False, return msg as if it was successfully queued
         if not self.send:
             return True, msg
 
+        buffer = current_buffer()
+        if buffer is not None:
+            buffer.add(self, msg, priority)
+            return True, msg
+
         try:
-            self.queue.put(msg, block=False)
+            lane = self._get_queue(msg)
+            item = self._serialize(msg) if self.serialize else msg
+            lane.put(item, block=False, priority=priority or Priority.default)
             LOGGER.debug("enqueued %s.", msg["type"])
             return True, msg
         except queue.Full:
             LOGGER.warn("analytics queue is full")
+            self._dropped([msg], "queue_full")
             return False, msg
 
+    def _shed(self, items):
+        """Report messages shed by the queue to make room for others."""
+        LOGGER.warning("analytics queue is full, shed %s messages", len(items))
+        self._dropped(items, "queue_full")
+
+    def _dropped(self, msgs, reason):
+        on_drop = self.pipeline.on_drop
+        if on_drop is not None:
+            records = [decode(to_wire(msg)) for msg in msgs]
+            on_drop(self.PROVIDER, records, reason)
+
+    @staticmethod
+    def identified_user(record):
+        """Return the user whose traits `record` updates, None if it is not
+        an identify record."""
+        return None
+
+    def _put_many(self, entries):
+        """Queue prepared `(msg, priority)` entries, one put per lane.
+
+        Returns whether each entry was queued.
+        """
+        lanes = {}
+        for index, (msg, priority) in enumerate(entries):
+            item = self._serialize(msg) if self.serialize else msg
+            lanes.setdefault(self._get_queue(msg), []).append(
+                (index, (item, priority or Priority.default))
+            )
+
+        results = [False] * len(entries)
+        for lane, indexed in lanes.items():
+            queued = lane.put_many([entry for _, entry in indexed])
+            for (index, _), success in zip(indexed, queued):
+                results[index] = success
+        if not all(results):
+            self._dropped(
+                [msg for (msg, _), success in zip(entries, results) if not success],
+                "queue_full",
+            )
+        return results
+
+    def track_many(self, events):
+        """Queue a track call for each dict of `track()` arguments in `events`.
+
+        Every event is validated before any is queued, and they are queued
+        with one put per lane. Returns `(success, msg)` for each event, as
+        `track()` does, so events dropped by a full queue can be retried.
+        """
+        return self._call_many(self.track, events)
+
+    def identify_many(self, users):
+        """Queue an identify call for each dict of `identify()` arguments in
+        `users`, see `track_many()`."""
+        return self._call_many(self.identify, users)
+
+    def _call_many(self, method, calls):
+        if current_buffer() is not None:
+            # joins the enclosing `buffered()` block
+            return [method(**kwargs) for kwargs in calls]
+
+        with collecting() as buffer:
+            results = [method(**kwargs) for kwargs in calls]
+        if not self.send:
+            return results
+
+        queued = self._put_many(buffer.pop(self))
+        if not all(queued):
+            LOGGER.warning(
+                "analytics queue is full, dropped %s messages", queued.count(False)
+            )
+        # calls that failed, e.g. dropped by a hook, were never buffered
+        queued = iter(queued)
+        return [
+            (next(queued), msg) if success else (success, msg)
+            for success, msg in results
+        ]
+
     def _prepare_msg(self, msg):
         raise NotImplementedError()
 
+    def _serialize(self, msg):
+        """Encode a prepared `msg` as it is sent to the provider."""
+        return encode(to_wire(msg, self.compact), self.compact)
+
     def flush(self):
         """Forces a flush from the internal queue to the server"""
-        queue = self.queue
-        size = queue.qsize()
-        queue.join()
+        if self.manual_flush:
+            drain(self.consumers)
+            return
+        queues = [consumer.queue for consumer in self.consumers]
+        size = sum(lane.qsize() for lane in queues)
+        for lane in queues:
+            lane.join()
         # Note that this message may not be pcise, because of threading.
         LOGGER.debug("successfully flushed about %s items.", size)
 
     def join(self):
         """Ends the consumer thread once the queue is empty. Blocks execution until finished"""
-        self.consumer.pause()
-        try:
-            self.consumer.join()
-        except RuntimeError:
-            # consumer thread has not started
-            pass
+        if self.watchdog is not None:
+            self.watchdog.stop()
+        for consumer in self.consumers:
+            consumer.pause()
+        for consumer in self.consumers:
+            try:
+                consumer.join()
+            except RuntimeError:
+                # consumer thread has not started
+                pass
@@ -1,74 +1,422 @@
 import logging
+import time
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
 from queue import Empty
-from threading import Thread
+from threading import Lock, Thread, local
+
+from fam_analytics_py import tracing
+from fam_analytics_py.encoding import decode, encode
+from fam_analytics_py.exceptions import APIError
+from fam_analytics_py.hooks import NO_HOOKS
+from fam_analytics_py.message import to_wire
+from fam_analytics_py.metrics import Metrics
 
 LOGGER = logging.getLogger("fam-analytics-py")
 
+# client errors that are worth retrying, all other 4xx fail for good
+RETRYABLE_STATUSES = frozenset([408, 429])
+# client errors caused by the payload, which may be down to a few records
+REJECTED_STATUSES = frozenset([400, 413, 422])
+
+
+def is_retryable(error):
+    """Whether sending the same payload again could succeed."""
+    if isinstance(error, APIError) and isinstance(error.status, int):
+        if 400 <= error.status < 500:
+            return error.status in RETRYABLE_STATUSES
+    return True
+
+
+def is_rejection(error):
+    """Whether the provider refused the payload itself, e.g. as invalid.
+
+    Other failures, such as bad credentials, fail every payload alike.
+    """
+    return isinstance(error, APIError) and error.status in REJECTED_STATUSES
+
+
+def drain(consumers):
+    """Upload everything queued for `consumers` before returning.
+
+    Runs in the calling thread; lanes with queued messages are drained in
+    parallel when there are several.
+    """
+    pending = [consumer for consumer in consumers if consumer.queue.qsize()]
+    if len(pending) == 1:
+        pending[0].drain()
+    elif pending:
+        with ThreadPoolExecutor(max_workers=len(pending)) as executor:
+            for future in [executor.submit(consumer.drain) for consumer in pending]:
+                future.result()
+
 
 class BaseConsumer(Thread):
     """Consumes the messages from the client's queue."""
 
+    PROVIDER = None
+
     def __init__(
-        self, queue, url, auth, headers, write_key=None, upload_size=100, on_error=None
+        self,
+        queue,
+        url,
+        auth,
+        headers,
+        write_key=None,
+        upload_size=100,
+        on_error=None,
+        max_batch_bytes=None,
+        retries=10,
+        timeout=15,
+        metrics=None,
+        on_dead_letter=None,
+        max_bisect_requests=20,
+        rate_limiter=None,
+        compact=False,
+        dead_letter_store=None,
+        pipeline=None,
     ):
         """Create a consumer thread."""
         Thread.__init__(self)
         # Make consumer a daemon thread so that it doesn't block program exit
         self.daemon = True
         self.upload_size = upload_size
+        self.max_batch_bytes = max_batch_bytes
         self.write_key = write_key
         self.url = url
         self.auth = auth
         self.headers = headers
         self.on_error = on_error
+        # receives records the provider rejected as invalid; they are
+        # reported to `on_error` when no dead-letter sink is set
+        self.on_dead_letter = on_dead_letter
+        # extra requests a batch may spend isolating the messages that make
+        # the provider reject it
+        self.max_bisect_requests = max_bisect_requests
+        # shared by every lane of a client, paces uploads under the
+        # provider's quota instead of being throttled by it
+        self.rate_limiter = rate_limiter
+        # leave out the fields the provider does not need and send the body
+        # without whitespace
+        self.compact = compact
+        # keeps every batch that could not be delivered, so it can be replayed
+        self.dead_letter_store = dead_letter_store
+        # the client's compiled hooks, see `fam_analytics_py.hooks.Hooks`
+        self.pipeline = pipeline or NO_HOOKS
+        # the requests made for the batch being sent, by sending thread
+        self._attempts = local()
+        # the enqueue time of the oldest message of the batch being sent and
+        # the links to the spans that queued it, by sending thread
+        self._batch = local()
+        # held while a batch is taken and uploaded, so a lane is uploaded by
+        # one thread at a time even when flushed from another
+        self._upload_lock = Lock()
         self.queue = queue
+        # traced queues keep the caller's span of each message
+        self.trace = getattr(queue, "trace", False)
         # It's important to set running in the constructor: if we are asked to
         # pause immediately after construction, we might set running to True in
         # run() *after* we set it to False in pause... and keep running forever.
         self.running = True
-        self.retries = 10
+        self.retries = retries
+        self.timeout = timeout
+        self.metrics = metrics or Metrics()
+        # when the run loop last went round or a request was last made, so
+        # a batch going through its retries is not taken for a stall, see
+        # `Watchdog`
+        self.heartbeat = time.monotonic()
 
     def run(self):
         """Runs the consumer."""
         while self.running:
+            self.heartbeat = time.monotonic()
             self.upload()
 
     def pause(self):
         """Pause the consumer."""
         self.running = False
 
-    def upload(self):
+    def drain(self):
+        """Upload every queued batch from the calling thread."""
+        while self.queue.qsize():
+            self.upload(block=False)
+
+    def upload(self, block=True):
         """Upload the next batch of items, return whether successful."""
-        success = False
-        batch = self.next()
-        if len(batch) == 0:
+        with self._upload_lock:
+            return self._upload(block)
+
+    def _upload(self, block):
+        batch = self.next(block)
+        count = len(batch)
+        if count == 0:
             return False
 
         try:
-            self.request(batch)
-            success = True
+            return self._deliver(batch)
         except Exception as e:
-            success = False
-            if self.on_error:
-                self.on_error(e, batch)
+            LOGGER.exception("error uploading %s records", count)
+            self._fail(e, batch)
+            return False
         finally:
             # mark items as acknowledged from queue
-            for item in batch:
+            for _ in range(count):
                 self.queue.task_done()
-            return success
 
-    def next(self):
+    def _deliver(self, batch):
+        """Run `batch` through the hooks and send it, return whether successful."""
+        pipeline = self.pipeline
+        if pipeline.on_batch_built is not None:
+            try:
+                built = pipeline.on_batch_built(self.PROVIDER, batch)
+            except Exception as e:
+                self._hook_failed("on_batch_built", e, batch)
+                return False
+            if built is None:
+                self._dropped([decode(record) for record in batch], "hook")
+                return False
+            batch = built
+        if pipeline.before_send is not None:
+            try:
+                pipeline.before_send(self.PROVIDER, batch)
+            except Exception as e:
+                self._hook_failed("before_send", e, batch)
+                return False
+
+        with self._span(len(batch)):
+            success = self.send(batch)
+
+        if pipeline.after_response is not None:
+            try:
+                pipeline.after_response(self.PROVIDER, batch, success)
+            except Exception:
+                # the batch went out already, only the hook missed it
+                LOGGER.exception("analytics after_response hook failed")
+        oldest = getattr(self._batch, "oldest", None)
+        if success and oldest is not None:
+            # from the enqueue of its oldest message to the provider's ack
+            self.metrics.observe("delivery_seconds", time.monotonic() - oldest)
+        return success
+
+    def _hook_failed(self, stage, error, batch):
+        LOGGER.exception(
+            "analytics %s hook failed, dropping %s records", stage, len(batch)
+        )
+        self._fail(error, batch, reason="hook")
+
+    def _span(self, size):
+        if not self.trace:
+            return nullcontext()
+        return tracing.upload_span(self.PROVIDER, self.lane, size, self._batch.links)
+
+    def send(self, batch):
+        """Deliver `batch` of provider payloads, return whether all went through.
+
+        Used by `upload()` and by callers that batch outside of the queue.
+        """
+        return self._send(batch, [self.max_bisect_requests])
+
+    def _send(self, batch, budget):
+        """Send `batch`, halving it on rejection to quarantine bad messages.
+
+        `budget` is a one-item list holding the extra requests left, shared
+        by every half of the original batch. Returns whether all of `batch`
+        was delivered.
+        """
+        self._pace(len(batch))
+        self._attempts.count = 0
+        try:
+            self.request(batch)
+            return True
+        except Exception as e:
+            if not is_rejection(e):
+                self._fail(e, batch)
+                return False
+            if len(batch) == 1 or budget[0] < 2:
+                self._dead_letter(e, batch)
+                return False
+
+        budget[0] -= 2
+        self.metrics.incr("bisect_requests", 2)
+        middle = len(batch) // 2
+        left = self._send(batch[:middle], budget)
+        right = self._send(batch[middle:], budget)
+        return left and right
+
+    def _pace(self, events):
+        """Wait for the rate limiter to allow sending `events` records."""
+        if self.rate_limiter is not None:
+            waited = self.rate_limiter.acquire(events=events)
+            if waited:
+                self.metrics.incr("rate_limited_seconds", waited)
+
+    def _attempt(self):
+        """Count a request made for the batch being sent."""
+        self._attempts.count = getattr(self._attempts, "count", 0) + 1
+        self.heartbeat = time.monotonic()
+
+    @property
+    def lane(self):
+        """The lane of the client this consumer drains, if it has several."""
+        return None
+
+    def _store(self, kind, error, records):
+        if self.dead_letter_store is not None:
+            self.dead_letter_store.write(
+                self.PROVIDER,
+                kind,
+                records,
+                error,
+                attempts=getattr(self._attempts, "count", 0),
+                lane=self.lane,
+            )
+
+    def _fail(self, error, records, reason="failed"):
+        """Report `records` that could not be delivered before retries ran out."""
+        records = [decode(record) for record in records]
+        self._store("failed", error, records)
+        self._dropped(records, reason)
+        if self.on_error:
+            self.on_error(error, records)
+
+    def _dropped(self, records, reason):
+        if self.pipeline.on_drop is not None:
+            try:
+                self.pipeline.on_drop(self.PROVIDER, records, reason)
+            except Exception:
+                LOGGER.exception("analytics on_drop hook failed")
+
+    def _retry_delay(self, error, attempt):
+        """Seconds to wait before retrying a request that failed with `error`."""
+        if isinstance(error, APIError) and error.status == 429:
+            # back off instead of retrying straight into the rate limit
+            return self._backoff(attempt)
+        return 0.0
+
+    def _backoff(self, attempt):
+        """Seconds to wait before the retry following `attempt`, doubling."""
+        return min(0.5 * 2**attempt, 30.0)
+
+    def _wait_to_retry(self, error, attempt):
+        delay = self._retry_delay(error, attempt)
+        if delay:
+            # throttled by the provider, unlike rate_limited_seconds which
+            # counts the client's own pacing
+            self.metrics.incr("backoff_seconds", delay)
+            time.sleep(delay)
+
+    def next(self, block=True):
         """Return the next batch of items to upload."""
         queue = self.queue
+        get_stamped = getattr(queue, "get_stamped", None)
         items = []
+        total_size = 0
+        encoding = None
+        started = None
+        oldest = None
+        links = [] if self.trace else None
+        pipeline = self.pipeline
+        # batch hooks are given the payloads, not their encoding
+        keep_payloads = any(
+            stage is not None
+            for stage in (
+                pipeline.on_batch_built,
+                pipeline.before_send,
+                pipeline.after_response,
+            )
+        )
         while len(items) < self.upload_size:
             try:
-                item = queue.get(block=True, timeout=0.5)
-                items.append(item)
+                if get_stamped is not None:
+                    item, enqueued_at, link = get_stamped(block=block, timeout=0.5)
+                else:
+                    item = queue.get(block=block, timeout=0.5)
+                    enqueued_at = link = None
             except Empty:
                 break
 
+            now = time.monotonic()
+            if started is None:
+                started = now
+            if enqueued_at is not None:
+                self.metrics.observe("queue_wait_seconds", now - enqueued_at)
+                if oldest is None or enqueued_at < oldest:
+                    oldest = enqueued_at
+            if link is not None:
+                links.append(link)
+
+            try:
+                # the provider payload is only built at batch time
+                item = to_wire(item, self.compact)
+                if self.max_batch_bytes is not None:
+                    size, item, encoded = self._measure(item, keep_payloads)
+                    total_size += size
+                    if encoded is not None:
+                        encoding = (encoding or 0) + encoded
+            except Exception as e:
+                # e.g. a property JSON cannot represent, fails on its own
+                self._skip(e, item)
+                continue
+            items.append(item)
+
+            # stop once the batch reaches the limit, so it can only
+            # overshoot by the size of its last message
+            if self.max_batch_bytes is not None and total_size >= self.max_batch_bytes:
+                break
+
+        if items:
+            self.metrics.observe("batch_build_seconds", time.monotonic() - started)
+        if encoding is not None:
+            # `post()` records it for batches it serializes itself
+            self.metrics.observe("serialize_seconds", encoding)
+        self._batch.oldest = oldest
+        self._batch.links = links
         return items
 
+    def _skip(self, error, item):
+        """Fail and acknowledge an `item` that cannot be batched."""
+        LOGGER.error("dropping a record that cannot be encoded: %s", error)
+        try:
+            self._fail(error, [item])
+        except Exception:
+            # the batch taken so far must still be uploaded
+            LOGGER.exception("error reporting a record that cannot be encoded")
+        finally:
+            self.queue.task_done()
+
+    def _measure(self, item, keep_payload):
+        """Return the encoded size of `item`, the item to batch and the
+        seconds spent encoding it for the request, if any.
+
+        The encoded record is batched instead of `item`, so the request
+        does not serialize it again, unless `keep_payload`.
+        """
+        if isinstance(item, bytes):
+            return len(item), item, None
+        started = time.monotonic()
+        encoded = encode(item, self.compact)
+        if keep_payload:
+            return len(encoded), item, None
+        return len(encoded), encoded, time.monotonic() - started
+
     def request(self, batch, attempt=0):
         raise NotImplementedError()
+
+    def _dead_letter(self, error, records):
+        """Hand `records` that can never be delivered to the dead-letter sink."""
+        LOGGER.warning("dropping %s invalid records: %s", len(records), error)
+        self.metrics.incr("records_dead_lettered", len(records))
+        records = [decode(record) for record in records]
+        self._store("rejected", error, records)
+        self._dropped(records, "rejected")
+        sink = self.on_dead_letter or self.on_error
+        if sink:
+            sink(error, records)
+
+    def _reject(self, url, status, rejections):
+        """Dead-letter `(record, code, message)` rejections, grouped by reason."""
+        groups = {}
+        for record, code, message in rejections:
+            groups.setdefault((code, message), []).append(record)
+        for (code, message), records in groups.items():
+            self._dead_letter(APIError(url, status, code, message), records)
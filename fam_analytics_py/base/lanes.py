@@ -0,0 +1,294 @@
+import time
+from collections import deque
+from queue import Empty, Full
+from threading import Condition, Lock
+
+from fam_analytics_py import tracing
+
+
+class Priority:
+    critical = "critical"
+    default = "default"
+    best_effort = "best_effort"
+
+
+# highest priority first
+PRIORITIES = (Priority.critical, Priority.default, Priority.best_effort)
+
+DEFAULT_WEIGHTS = {
+    Priority.critical: 8,
+    Priority.default: 4,
+    Priority.best_effort: 1,
+}
+
+
+class LaneQueue(object):
+    """A bounded queue with one FIFO lane per priority.
+
+    Drop-in for `queue.Queue` as used by the clients and consumers. `get()`
+    drains the lanes in weighted round-robin order, so lower priorities are
+    slowed down but never starved. `reserve` is the fraction of `maxsize`
+    only critical messages may use. When there is no room left, a message
+    sheds the oldest message of the lowest priority below its own, so
+    critical messages are only ever refused once nothing else is queued.
+
+    With `maxbytes`, items must be bytes and the queue is also bounded by
+    their total length, with the same reserve for critical messages.
+
+    `on_shed`, when set, is called with the items shed by a put, once the
+    queue is unlocked.
+
+    Every item is stamped with its `time.monotonic()` enqueue time, kept
+    beside it so it never reaches the payload, and with `trace`, a link to
+    the span of the caller; `get_stamped()` returns them.
+    """
+
+    def __init__(
+        self,
+        maxsize=0,
+        weights=None,
+        reserve=0.1,
+        metrics=None,
+        maxbytes=None,
+        trace=False,
+        on_shed=None,
+    ):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+        self.reserved = int(maxsize * reserve) if maxsize > 0 else 0
+        self.reserved_bytes = int(maxbytes * reserve) if maxbytes else 0
+        self.metrics = metrics
+        self.trace = trace
+        self.on_shed = on_shed
+        self._lanes = {priority: deque() for priority in PRIORITIES}
+        # `(enqueued_at, link)` of each item, in the same order
+        self._stamps = {priority: deque() for priority in PRIORITIES}
+        self._lane_bytes = {priority: 0 for priority in PRIORITIES}
+        self._credits = {priority: 0 for priority in PRIORITIES}
+        self._size = 0
+        self._bytes = 0
+
+        self.mutex = Lock()
+        self.not_empty = Condition(self.mutex)
+        self.not_full = Condition(self.mutex)
+        self.all_tasks_done = Condition(self.mutex)
+        self.unfinished_tasks = 0
+
+    def qsize(self):
+        with self.mutex:
+            return self._size
+
+    def empty(self):
+        with self.mutex:
+            return not self._size
+
+    def full(self):
+        with self.mutex:
+            return 0 < self.maxsize <= self._size
+
+    def lane_size(self, priority):
+        with self.mutex:
+            return len(self._lanes[priority])
+
+    def nbytes(self):
+        """Total length of the queued items, when bounded by `maxbytes`."""
+        with self.mutex:
+            return self._bytes
+
+    def _has_room(self, priority, nbytes):
+        critical = priority == Priority.critical
+        if self.maxsize > 0:
+            if not critical:
+                queued = self._size - len(self._lanes[Priority.critical])
+                if queued >= self.maxsize - self.reserved:
+                    return False
+            if self._size >= self.maxsize:
+                return False
+        if self.maxbytes:
+            if not critical:
+                queued = self._bytes - self._lane_bytes[Priority.critical]
+                if queued + nbytes > self.maxbytes - self.reserved_bytes:
+                    return False
+            if self._bytes + nbytes > self.maxbytes:
+                return False
+        return True
+
+    def _stamp(self):
+        link = tracing.current_link() if self.trace else None
+        return time.monotonic(), link
+
+    def _append(self, priority, item, stamp, nbytes):
+        self._lanes[priority].append(item)
+        self._stamps[priority].append(stamp)
+        self._size += 1
+        if nbytes:
+            self._bytes += nbytes
+            self._lane_bytes[priority] += nbytes
+        self.unfinished_tasks += 1
+
+    def _remove(self, priority):
+        """Pop the oldest item of the lane of `priority` and its stamp."""
+        item = self._lanes[priority].popleft()
+        stamp = self._stamps[priority].popleft()
+        self._size -= 1
+        if self.maxbytes:
+            self._bytes -= len(item)
+            self._lane_bytes[priority] -= len(item)
+        return item, stamp
+
+    def _shed_for(self, priority, shed):
+        """Drop the oldest message of the lowest lane below `priority`,
+        adding it to `shed`."""
+        rank = PRIORITIES.index(priority)
+        for lower in reversed(PRIORITIES[rank + 1 :]):
+            if self._lanes[lower]:
+                item, _ = self._remove(lower)
+                shed.append(item)
+                self._task_done()
+                if self.metrics is not None:
+                    self.metrics.incr("shed_" + lower)
+                return True
+        return False
+
+    def _report_shed(self, shed):
+        if shed and self.on_shed is not None:
+            self.on_shed(shed)
+
+    def put(self, item, block=True, timeout=None, priority=Priority.default):
+        if priority not in self._lanes:
+            raise ValueError("unknown priority: {0}".format(priority))
+
+        nbytes = len(item) if self.maxbytes else 0
+        if self.maxbytes and nbytes > self.maxbytes:
+            # would never fit, even in an empty queue
+            raise Full
+
+        stamp = self._stamp()
+        shed = []
+        try:
+            with self.not_full:
+                deadline = None if timeout is None else time.monotonic() + timeout
+                while not self._has_room(priority, nbytes):
+                    if self._shed_for(priority, shed):
+                        continue
+                    if not block:
+                        raise Full
+                    if deadline is None:
+                        self.not_full.wait()
+                    else:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            raise Full
+                        self.not_full.wait(remaining)
+
+                self._append(priority, item, stamp, nbytes)
+                self.not_empty.notify()
+        finally:
+            self._report_shed(shed)
+
+    def put_nowait(self, item, priority=Priority.default):
+        return self.put(item, block=False, priority=priority)
+
+    def put_many(self, entries):
+        """Put `(item, priority)` entries without blocking, under one lock.
+
+        Returns whether each entry was queued; entries that find no room,
+        or are shed by a later entry, are dropped like a `put_nowait`
+        raising `Full`. Only items of earlier puts go to `on_shed`.
+        """
+        results = []
+        # index of each entry queued so far, by item
+        indexes = {}
+        shed = []
+        stamp = self._stamp()
+        with self.not_full:
+            for item, priority in entries:
+                if priority not in self._lanes:
+                    raise ValueError("unknown priority: {0}".format(priority))
+                nbytes = len(item) if self.maxbytes else 0
+                if self.maxbytes and nbytes > self.maxbytes:
+                    results.append(False)
+                    continue
+                room = self._has_room(priority, nbytes)
+                while not room and self._shed_for(priority, shed):
+                    room = self._has_room(priority, nbytes)
+                    index = indexes.pop(id(shed[-1]), None)
+                    if index is not None:
+                        results[index] = False
+                        shed.pop()
+                results.append(room)
+                if not room:
+                    continue
+
+                indexes[id(item)] = len(results) - 1
+                self._append(priority, item, stamp, nbytes)
+
+            queued = results.count(True)
+            if queued:
+                self.not_empty.notify(queued)
+        self._report_shed(shed)
+        return results
+
+    def _next_lane(self):
+        """Pick the priority to serve next by smooth weighted round-robin."""
+        total = 0
+        best = None
+        for priority in PRIORITIES:
+            if not self._lanes[priority]:
+                continue
+            weight = self.weights[priority]
+            total += weight
+            self._credits[priority] += weight
+            if best is None or self._credits[priority] > self._credits[best]:
+                best = priority
+        self._credits[best] -= total
+        return best
+
+    def get(self, block=True, timeout=None):
+        return self._get(block, timeout)[0]
+
+    def get_stamped(self, block=True, timeout=None):
+        """Return `(item, enqueued_at, link)` for the next item."""
+        item, (enqueued_at, link) = self._get(block, timeout)
+        return item, enqueued_at, link
+
+    def _get(self, block, timeout):
+        with self.not_empty:
+            if not block:
+                if not self._size:
+                    raise Empty
+            elif timeout is None:
+                while not self._size:
+                    self.not_empty.wait()
+            else:
+                deadline = time.monotonic() + timeout
+                while not self._size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise Empty
+                    self.not_empty.wait(remaining)
+
+            entry = self._remove(self._next_lane())
+            self.not_full.notify()
+            return entry
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def _task_done(self):
+        unfinished = self.unfinished_tasks - 1
+        if unfinished < 0:
+            raise ValueError("task_done() called too many times")
+        if unfinished == 0:
+            self.all_tasks_done.notify_all()
+        self.unfinished_tasks = unfinished
+
+    def task_done(self):
+        with self.all_tasks_done:
+            self._task_done()
+
+    def join(self):
+        with self.all_tasks_done:
+            while self.unfinished_tasks:
+                self.all_tasks_done.wait()
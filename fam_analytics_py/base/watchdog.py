@@ -0,0 +1,61 @@
+import logging
+import time
+from threading import Event, Thread
+
+LOGGER = logging.getLogger("fam-analytics-py")
+
+
+class Watchdog(Thread):
+    """Restarts the consumers of a client that died or stopped making progress.
+
+    Every `interval` seconds, each running consumer is checked. A consumer
+    whose thread exited, or whose last heartbeat is older than
+    `stall_timeout`, is replaced by a new thread on the same queue, so no
+    queued message is lost. Consumers beat on every request attempt, so a
+    batch going through its retries is not mistaken for a stall. A stalled
+    thread is paused and exits once its request returns. Restarts are
+    counted in the `consumer_restarts`, `consumers_dead` and
+    `consumers_stalled` metrics, and the time spent stalled in
+    `stalled_seconds`.
+    """
+
+    def __init__(self, client, interval=10.0, stall_timeout=300.0):
+        Thread.__init__(self)
+        self.daemon = True
+        self.client = client
+        self.interval = interval
+        self.stall_timeout = stall_timeout
+        self._stopped = Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            self.check()
+
+    def stop(self):
+        self._stopped.set()
+
+    def check(self):
+        """Restart the consumers that need it, return how many were."""
+        metrics = self.client.metrics
+        restarted = 0
+        for index, consumer in enumerate(list(self.client.consumers)):
+            if not consumer.running:
+                # paused by `join()`, or already replaced
+                continue
+            if not consumer.is_alive():
+                LOGGER.error("analytics consumer died, restarting it")
+                metrics.incr("consumers_dead")
+            else:
+                stalled = time.monotonic() - consumer.heartbeat
+                if stalled <= self.stall_timeout:
+                    continue
+                LOGGER.error(
+                    "analytics consumer stalled for %.0fs, restarting it", stalled
+                )
+                metrics.incr("consumers_stalled")
+                metrics.incr("stalled_seconds", stalled)
+
+            self.client._restart_consumer(index)
+            metrics.incr("consumer_restarts")
+            restarted += 1
+        return restarted
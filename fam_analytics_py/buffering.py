@@ -0,0 +1,108 @@
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+LOGGER = logging.getLogger("fam-analytics-py")
+
+_current = ContextVar("fam_analytics_py_buffer", default=None)
+
+
+def current_buffer():
+    """Return the buffer of the active `buffered()` block, if any."""
+    return _current.get()
+
+
+class Buffer(object):
+    """The messages queued by the clients inside a `buffered()` block.
+
+    Messages are validated and built when they are called, so errors still
+    surface at the call, but they only reach the client queues on
+    `commit()`, in one bulk put per client lane.
+    """
+
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.discarded = False
+        # client -> [(msg, priority)], in call order
+        self._entries = {}
+        self._on_discard = []
+
+    def __len__(self):
+        return sum(len(entries) for entries in self._entries.values())
+
+    def add(self, client, msg, priority):
+        self._entries.setdefault(client, []).append((msg, priority))
+
+    def pop(self, client):
+        """Remove and return the `(msg, priority)` entries of `client`."""
+        return self._entries.pop(client, [])
+
+    def on_discard(self, callback):
+        """Call `callback` if the buffered messages are never queued."""
+        self._on_discard.append(callback)
+
+    def discard(self):
+        """Drop the buffered messages, e.g. when the request rolled back."""
+        if self.discarded:
+            return
+        self.discarded = True
+        self._entries = {}
+        callbacks, self._on_discard = self._on_discard, []
+        for callback in callbacks:
+            callback()
+
+    def commit(self):
+        """Queue the buffered messages, or hand them to the enclosing block."""
+        if self.discarded:
+            return
+        entries, self._entries = self._entries, {}
+        callbacks, self._on_discard = self._on_discard, []
+        if self.parent is not None:
+            for client, messages in entries.items():
+                self.parent._entries.setdefault(client, []).extend(messages)
+            self.parent._on_discard.extend(callbacks)
+            return
+
+        dropped = 0
+        for client, messages in entries.items():
+            results = client._put_many(messages)
+            dropped += results.count(False)
+        if dropped:
+            LOGGER.warning("analytics queue is full, dropped %s messages", dropped)
+            for callback in callbacks:
+                callback()
+
+
+@contextmanager
+def buffered():
+    """Hold the messages of every call in the block until it exits.
+
+    They are queued together when the block exits normally and dropped if
+    it raises or `discard()` is called on the yielded `Buffer`. Nested
+    blocks join the outermost one.
+
+        with fam_analytics_py.buffered():
+            fam_analytics_py.track(...)
+            fam_analytics_py.identify(...)
+    """
+    buffer = Buffer(_current.get())
+    token = _current.set(buffer)
+    try:
+        yield buffer
+    except BaseException:
+        _current.reset(token)
+        buffer.discard()
+        raise
+    _current.reset(token)
+    buffer.commit()
+
+
+@contextmanager
+def collecting():
+    """Collect the messages queued in the block, leaving them to the caller."""
+    buffer = Buffer()
+    token = _current.set(buffer)
+    try:
+        yield buffer
+    finally:
+        _current.reset(token)
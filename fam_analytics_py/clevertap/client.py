@@ -1,22 +1,24 @@
 from datetime import datetime
 
-from dateutil.tz import tzutc
 from six import string_types
 
 from fam_analytics_py.base import BaseClient
+from fam_analytics_py.constants import Provider
+from fam_analytics_py.ratelimit import get_rate_limiter
 from fam_analytics_py.types import ID_TYPES
 from fam_analytics_py.utils import (
-    clean,
-    guess_timezone,
     remove_trailing_slash,
     require,
     stringify_id,
+    to_epoch_seconds,
 )
 
 from .consumer import CleverTapConsumer
+from .message import CleverTapMessage
 
 
 class CleverTapClient(BaseClient):
+    PROVIDER = Provider.clevertap
     DEFAULT_HOST = "https://in1.api.clevertap.com"
 
     def __init__(
@@ -28,8 +30,30 @@ class CleverTapClient(BaseClient):
         max_queue_size=10000,
         send=True,
         on_error=None,
+        id_generator=None,
+        upload_size=1000,
+        timeout=15,
+        retries=10,
+        on_dead_letter=None,
+        max_bisect_requests=20,
+        rate_limiter=None,
+        priority_weights=None,
+        critical_reserve=0.1,
+        serialize=False,
+        max_queue_bytes=None,
+        compact=False,
+        dead_letter_store=None,
+        manual_flush=False,
+        watchdog_interval=10.0,
+        stall_timeout=300.0,
+        trace_delivery=False,
+        hooks=None,
     ):
         require("credentials", credentials, dict)
+        self._upload_size = upload_size
+        self.timeout = timeout
+        self.retries = retries
+        self.max_bisect_requests = max_bisect_requests
 
         super(CleverTapClient, self).__init__(
             write_key=write_key,
@@ -39,11 +63,64 @@ class CleverTapClient(BaseClient):
             max_queue_size=max_queue_size,
             send=send,
             on_error=on_error,
+            id_generator=id_generator,
+            on_dead_letter=on_dead_letter,
+            rate_limiter=rate_limiter,
+            priority_weights=priority_weights,
+            critical_reserve=critical_reserve,
+            serialize=serialize,
+            max_queue_bytes=max_queue_bytes,
+            compact=compact,
+            dead_letter_store=dead_letter_store,
+            manual_flush=manual_flush,
+            watchdog_interval=watchdog_interval,
+            stall_timeout=stall_timeout,
+            trace_delivery=trace_delivery,
+            hooks=hooks,
         )
 
+    @classmethod
+    def from_config(cls, config, **kwargs):
+        """Create a client from a `CleverTapConfig`, with `kwargs` overriding it."""
+        options = dict(
+            credentials={
+                "clevertap_account_id": config.account_id,
+                "clevertap_passcode": config.passcode,
+            },
+            host=config.host_url,
+            debug=config.enable_debug,
+            on_error=config.error_callback,
+            send=config.start_consumer or config.manual_flush,
+            max_queue_size=config.max_queue_size,
+            upload_size=config.upload_size,
+            timeout=config.timeout,
+            retries=config.retries,
+            on_dead_letter=config.dead_letter_callback,
+            max_bisect_requests=config.max_bisect_requests,
+            rate_limiter=get_rate_limiter(config),
+            priority_weights=config.priority_weights,
+            critical_reserve=config.critical_reserve,
+            serialize=config.serialize_messages,
+            max_queue_bytes=config.max_queue_bytes,
+            compact=config.compact_encoding,
+            dead_letter_store=config.dead_letter_store,
+            manual_flush=config.manual_flush,
+            watchdog_interval=config.watchdog_interval,
+            stall_timeout=config.stall_timeout,
+            trace_delivery=config.trace_delivery,
+        )
+        options.update(kwargs)
+        return cls(**options)
+
     @property
     def upload_size(self):
-        return 100
+        return self._upload_size
+
+    @staticmethod
+    def identified_user(record):
+        if record.get("type") == "profile":
+            return record.get("identity")
+        return None
 
     def _get_consumer(self):
         return CleverTapConsumer(
@@ -54,6 +131,15 @@ class CleverTapClient(BaseClient):
             auth=self._get_auth(),
             headers=self._get_headers(),
             on_error=self.on_error,
+            retries=self.retries,
+            timeout=self.timeout,
+            metrics=self.metrics,
+            on_dead_letter=self.on_dead_letter,
+            max_bisect_requests=self.max_bisect_requests,
+            rate_limiter=self.rate_limiter,
+            compact=self.compact,
+            dead_letter_store=self.dead_letter_store,
+            pipeline=self.pipeline,
         )
 
     def _get_url(self):
@@ -77,24 +163,24 @@ class CleverTapClient(BaseClient):
         timestamp=None,
         anonymous_id=None,
         integrations=None,
+        message_id=None,
+        priority=None,
     ):
-        properties = properties or {}
         require("user_id / anonymous_id", user_id or anonymous_id, ID_TYPES)
-        require("properties", properties, dict)
+        if properties is not None:
+            require("properties", properties, dict)
         require("event", event, string_types)
 
-        msg = {
-            "type": "event",
-            "evtName": event,
-            "evtData": properties,
-            "ts": timestamp,
-            "identity": user_id,
-        }
-
-        if anonymous_id:
-            msg.update({"objectId": anonymous_id})
+        msg = CleverTapMessage(
+            "event",
+            ts=timestamp,
+            identity=user_id,
+            object_id=anonymous_id or None,
+            evt_name=event,
+            evt_data=properties,
+        )
 
-        return self._enqueue(msg)
+        return self._enqueue(msg, priority)
 
     def identify(
         self,
@@ -104,22 +190,22 @@ class CleverTapClient(BaseClient):
         timestamp=None,
         anonymous_id=None,
         integrations=None,
+        message_id=None,
+        priority=None,
     ):
-        traits = traits or {}
         require("user_id / anonymous_id", user_id or anonymous_id, ID_TYPES)
-        require("traits", traits, dict)
+        if traits is not None:
+            require("traits", traits, dict)
 
-        msg = {
-            "type": "profile",
-            "profileData": traits,
-            "ts": timestamp,
-            "identity": user_id,
-        }
-
-        if anonymous_id:
-            msg.update({"objectId": anonymous_id})
+        msg = CleverTapMessage(
+            "profile",
+            ts=timestamp,
+            identity=user_id,
+            object_id=anonymous_id or None,
+            profile_data=traits,
+        )
 
-        return self._enqueue(msg)
+        return self._enqueue(msg, priority)
 
     def alias(
         self,
@@ -128,6 +214,7 @@ class CleverTapClient(BaseClient):
         context=None,
         timestamp=None,
         integrations=None,
+        message_id=None,
     ):
         return None
 
@@ -140,6 +227,7 @@ class CleverTapClient(BaseClient):
         timestamp=None,
         anonymous_id=None,
         integrations=None,
+        message_id=None,
     ):
         return None
 
@@ -153,6 +241,7 @@ class CleverTapClient(BaseClient):
         timestamp=None,
         anonymous_id=None,
         integrations=None,
+        message_id=None,
     ):
         return None
 
@@ -166,21 +255,21 @@ class CleverTapClient(BaseClient):
         timestamp=None,
         anonymous_id=None,
         integrations=None,
+        message_id=None,
     ):
         return None
 
     def _prepare_msg(self, msg):
-        timestamp = msg["ts"]
-        if timestamp is None:
-            timestamp = datetime.now(tzutc())
+        timestamp = msg.ts
 
-        require("type", msg["type"], string_types)
-        require("ts", timestamp, datetime)
+        require("type", msg.type, string_types)
+        if timestamp is not None:
+            require("ts", timestamp, datetime)
 
         # add the common keys and their values
-        timestamp = guess_timezone(timestamp)
-        msg["ts"] = str(int(timestamp.timestamp()))
-        msg["identity"] = stringify_id(msg.get("identity", None))
-        msg["objectId"] = stringify_id(msg.get("objectId", None))
+        msg.ts = str(to_epoch_seconds(timestamp))
+        msg.identity = stringify_id(msg.identity)
+        msg.object_id = stringify_id(msg.object_id)
 
-        return clean(msg)
+        msg.clean_fields()
+        return msg
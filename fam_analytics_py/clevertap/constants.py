@@ -0,0 +1,5 @@
+# Codes of unprocessed `/1/upload` records that may succeed when resent; the
+# other codes report invalid records. CleverTap numbers its record errors
+# itself, in ranges that overlap HTTP statuses, so only a record throttled
+# with 429 is resent.
+RETRYABLE_RECORD_CODES = frozenset([429])
@@ -1,13 +1,99 @@
-from fam_analytics_py.base import BaseConsumer
+from fam_analytics_py.base import BaseConsumer, is_retryable
+from fam_analytics_py.constants import Provider
+from fam_analytics_py.encoding import encode_array, encode_object, is_encoded
+from fam_analytics_py.exceptions import APIError
 from fam_analytics_py.request import post
 
+from .constants import RETRYABLE_RECORD_CODES
+
 
 class CleverTapConsumer(BaseConsumer):
+    PROVIDER = Provider.clevertap
+
     def request(self, batch, attempt=0):
-        """Attempt to upload the batch and retry before raising an error"""
-        try:
-            post(url=self.url, auth=self.auth, headers=self.headers, d=batch)
-        except Exception:
+        """Attempt to upload the batch and retry before raising an error.
+
+        Records the provider could not process yet are resent on their own,
+        after backing off and through the rate limiter.
+        """
+        while True:
+            try:
+                status, response = self._post(batch)
+            except Exception as e:
+                if attempt > self.retries or not is_retryable(e):
+                    raise
+                self._wait_to_retry(e, attempt)
+                attempt += 1
+                continue
+
+            retry = self._unprocessed(status, response)
+            if not retry:
+                return
+            error = APIError(
+                self.url, status, "unprocessed", "records were not processed"
+            )
             if attempt > self.retries:
-                raise
-            self.request(batch, attempt + 1)
+                self._fail(error, retry)
+                return
+            self.metrics.incr("records_resent", len(retry))
+            self._wait_to_retry(error, attempt)
+            self._pace(len(retry))
+            batch = retry
+            attempt += 1
+
+    def _unprocessed(self, status, response):
+        """Dead-letter the invalid records of `response`, return those to
+        resend; the records that went through are not sent again."""
+        unprocessed = (
+            response.get("unprocessed") if isinstance(response, dict) else None
+        )
+        if not unprocessed:
+            return []
+
+        retry, rejections = [], []
+        for item in unprocessed:
+            record = item.get("record")
+            if record is None:
+                continue
+            code = item.get("code")
+            if code in RETRYABLE_RECORD_CODES:
+                retry.append(record)
+            else:
+                rejections.append((record, code, item.get("error", "unprocessed")))
+        self._reject(self.url, status, rejections)
+        return retry
+
+    def _retry_delay(self, error, attempt):
+        if isinstance(error, APIError) and error.code == "unprocessed":
+            # the records were throttled, give the provider time
+            return self._backoff(attempt)
+        return super()._retry_delay(error, attempt)
+
+    def _post(self, batch):
+        """Post `batch`, returning the status and the decoded response."""
+        body = {"d": batch}
+        if is_encoded(batch):
+            body = {"_data": encode_object({"d": encode_array(batch)})}
+        self._attempt()
+        try:
+            res = post(
+                url=self.url,
+                auth=self.auth,
+                headers=self.headers,
+                timeout=self.timeout,
+                rate_limiter=self.rate_limiter,
+                compact=self.compact,
+                metrics=self.metrics,
+                trace=self.trace,
+                **body
+            )
+        except APIError as e:
+            # a rejected upload still lists the records it could not process
+            if isinstance(e.payload, dict) and e.payload.get("unprocessed"):
+                return e.status, e.payload
+            raise
+
+        try:
+            return res.status_code, res.json()
+        except ValueError:
+            return res.status_code, None
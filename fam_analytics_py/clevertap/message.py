@@ -0,0 +1,49 @@
+from fam_analytics_py.message import Message
+
+
+class CleverTapMessage(Message):
+    """An event or profile record of the `/1/upload` API."""
+
+    __slots__ = ("evt_name", "evt_data", "profile_data", "ts", "identity", "object_id")
+
+    OBJECTS = frozenset(["evtData", "profileData"])
+    OPTIONAL = frozenset(["identity", "objectId"])
+
+    LAYOUTS = {
+        "event": (
+            ("type", "type"),
+            ("evtName", "evt_name"),
+            ("evtData", "evt_data"),
+            ("ts", "ts"),
+            ("identity", "identity"),
+            ("objectId", "object_id"),
+        ),
+        "profile": (
+            ("type", "type"),
+            ("profileData", "profile_data"),
+            ("ts", "ts"),
+            ("identity", "identity"),
+            ("objectId", "object_id"),
+        ),
+    }
+
+    def __init__(
+        self,
+        type,
+        ts=None,
+        identity=None,
+        object_id=None,
+        evt_name=None,
+        evt_data=None,
+        profile_data=None,
+    ):
+        self.type = type
+        self.ts = ts
+        self.identity = identity
+        self.object_id = object_id
+        self.evt_name = evt_name
+        self.evt_data = evt_data
+        self.profile_data = profile_data
+
+    def layout(self):
+        return self.LAYOUTS[self.type]
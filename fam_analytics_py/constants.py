@@ -0,0 +1,7 @@
+class Provider:
+    clevertap = "clevertap"
+    mixpanel = "mixpanel"
+    segment = "segment"
+
+
+PROVIDERS = (Provider.clevertap, Provider.mixpanel, Provider.segment)
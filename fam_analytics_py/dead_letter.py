@@ -0,0 +1,65 @@
+import json
+import os
+from threading import Lock
+
+from fam_analytics_py.exceptions import APIError
+from fam_analytics_py.utils import DatetimeSerializer, clock
+
+
+def describe_error(error):
+    """Return `error` as a JSON-friendly dict."""
+    data = {"type": type(error).__name__, "message": str(error)}
+    if isinstance(error, APIError):
+        data.update(status=error.status, code=error.code, message=error.message)
+    return data
+
+
+class DeadLetterStore(object):
+    """An append-only JSONL file of the batches a consumer gave up on.
+
+    Each line holds the provider and lane of a batch, whether it `failed`
+    once retries ran out or was `rejected` as invalid, the error, the
+    number of requests made and the records. One store may be shared by
+    every client; writes are serialized and flushed one line at a time.
+    Replay the file with `python -m fam_analytics_py.replay`.
+    """
+
+    def __init__(self, path, fsync=False):
+        self.path = path
+        self.fsync = fsync
+        self._lock = Lock()
+        self._file = None
+
+    def write(self, provider, kind, records, error, attempts=0, lane=None):
+        entry = {
+            "provider": provider,
+            "lane": lane,
+            "kind": kind,
+            "failed_at": clock.isoformat(),
+            "attempts": attempts,
+            "error": describe_error(error),
+            "records": records,
+        }
+        line = json.dumps(entry, cls=DatetimeSerializer) + "\n"
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(line)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+
+    def read(self):
+        """Yield the stored entries, oldest first."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,42 @@
+import json
+
+from fam_analytics_py.utils import DatetimeSerializer
+
+COMPACT_SEPARATORS = (",", ":")
+
+# reused so encoding a message does not build an encoder each time
+_encoder = DatetimeSerializer()
+_compact_encoder = DatetimeSerializer(separators=COMPACT_SEPARATORS)
+
+
+def encode(obj, compact=False):
+    """Serialize `obj` to JSON bytes, without whitespace if `compact`."""
+    encoder = _compact_encoder if compact else _encoder
+    return encoder.encode(obj).encode("utf-8")
+
+
+def decode(record):
+    """Return `record` as a dict, decoding it if it was queued as bytes."""
+    if isinstance(record, bytes):
+        return json.loads(record)
+    return record
+
+
+def is_encoded(records):
+    """Whether the records of a batch were serialized when queued."""
+    return bool(records) and isinstance(records[0], bytes)
+
+
+def encode_array(records):
+    """Join encoded records into a JSON array without decoding them."""
+    return b"[%s]" % b",".join(
+        record if isinstance(record, bytes) else encode(record) for record in records
+    )
+
+
+def encode_object(fields):
+    """Encode a JSON object whose bytes values are already encoded."""
+    return b"{%s}" % b",".join(
+        b"%s:%s" % (encode(key), value if isinstance(value, bytes) else encode(value))
+        for key, value in fields.items()
+    )
@@ -1,10 +1,16 @@
 class APIError(Exception):
-    def __init__(self, url, status, code, message):
+    def __init__(self, url, status, code, message, payload=None):
         self.url = url
         self.status = status
         self.code = code
         self.message = message
+        # the decoded response body, if it was JSON
+        self.payload = payload
 
     def __str__(self):
         msg = "[Analytics: {0}] {1}: {2} ({3})"
         return msg.format(self.url, self.code, self.message, self.status)
+
+
+class SchemaValidationError(AssertionError):
+    """An event does not match its schema in a `SchemaRegistry`."""
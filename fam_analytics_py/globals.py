@@ -1,8 +1,13 @@
 from typing import Callable, Optional
 
 from fam_analytics_py.clevertap import CleverTapClient, CleverTapConfig
+from fam_analytics_py.hooks import Hooks
 from fam_analytics_py.mixpanel import MixpanelClient, MixpanelConfig
+from fam_analytics_py.routing import RoutingRules
+from fam_analytics_py.sampling import SamplingRules
+from fam_analytics_py.schema import SchemaRegistry
 from fam_analytics_py.segment import SegmentClient, SegmentConfig
+from fam_analytics_py.trait_cache import TraitCache
 
 
 _clevertap_config: Optional[CleverTapConfig] = None
@@ -17,6 +22,13 @@ is_clevertap_enabled: Callable[[], bool]
 is_mixpanel_enabled: Callable[[], bool]
 is_segment_enabled: Callable[[], bool]
 
+id_generator: Callable[[], str]
+trait_cache: Optional[TraitCache] = None
+sampling_rules: Optional[SamplingRules] = None
+routing_rules: Optional[RoutingRules] = None
+schema_registry: Optional[SchemaRegistry] = None
+hooks: Optional[Hooks] = None
+
 is_initialized: bool = False
 
 
@@ -54,16 +66,7 @@ def get_clevertap_client() -> CleverTapClient:
     _raise_if_config_not_set(config=_clevertap_config)
 
     if not _clevertap_client:
-        _clevertap_client = CleverTapClient(
-            credentials={
-                "clevertap_account_id": _clevertap_config.account_id,
-                "clevertap_passcode": _clevertap_config.passcode,
-            },
-            host=_clevertap_config.host_url,
-            debug=_clevertap_config.enable_debug,
-            on_error=_clevertap_config.error_callback,
-            send=_clevertap_config.start_consumer,
-        )
+        _clevertap_client = CleverTapClient.from_config(_clevertap_config, hooks=hooks)
 
     return _clevertap_client
 
@@ -75,6 +78,7 @@ def get_mixpanel_client() -> MixpanelClient:
     if not _mixpanel_client:
         _mixpanel_client = MixpanelClient(
             config=_mixpanel_config,
+            hooks=hooks,
         )
 
     return _mixpanel_client
@@ -85,12 +89,6 @@ def get_segment_client() -> SegmentClient:
     _raise_if_config_not_set(config=_segment_config)
 
     if not _segment_client:
-        _segment_client = SegmentClient(
-            credentials=_segment_config.write_key,
-            host=_segment_config.host_url,
-            debug=_segment_config.enable_debug,
-            on_error=_segment_config.error_callback,
-            send=_segment_config.start_consumer,
-        )
+        _segment_client = SegmentClient.from_config(_segment_config, hooks=hooks)
 
     return _segment_client
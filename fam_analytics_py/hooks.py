@@ -0,0 +1,156 @@
+import random
+import time
+from threading import local
+
+from fam_analytics_py.metrics import Metrics
+
+# stages that return the value passed on to the next hook; returning None
+# drops the message or batch
+FILTER_STAGES = ("before_enqueue", "on_batch_built")
+# stages that are only notified
+NOTIFY_STAGES = ("before_send", "after_response", "on_drop")
+STAGES = FILTER_STAGES + NOTIFY_STAGES
+
+
+def _chain(hooks):
+    if not hooks:
+        return None
+    if len(hooks) == 1:
+        return hooks[0]
+
+    def run(provider, value):
+        for hook in hooks:
+            value = hook(provider, value)
+            if value is None:
+                return None
+        return value
+
+    return run
+
+
+def _fan_out(hooks):
+    if not hooks:
+        return None
+    if len(hooks) == 1:
+        return hooks[0]
+
+    def run(provider, *args):
+        for hook in hooks:
+            hook(provider, *args)
+
+    return run
+
+
+class Pipeline(object):
+    """The compiled hooks, one callable or None per stage."""
+
+    __slots__ = STAGES
+
+    def __init__(self, **stages):
+        for stage in STAGES:
+            setattr(self, stage, stages.get(stage))
+
+
+NO_HOOKS = Pipeline()
+
+
+class Hooks(object):
+    """Functions run at each stage of the pipeline, in registration order.
+
+    Every hook gets the provider first:
+
+    - `before_enqueue(provider, msg)` returns the message to queue, e.g.
+      scrubbed or enriched, or None to drop it;
+    - `on_batch_built(provider, batch)` returns the payloads to send, or
+      None to drop the batch;
+    - `before_send(provider, batch)` and `after_response(provider, batch,
+      success)` surround the upload of a batch, retries included;
+    - `on_drop(provider, records, reason)` sees messages dropped by a hook
+      (`hook`) or a full queue, including those shed to make room for a
+      higher priority (`queue_full`), and records that were `failed` or
+      `rejected` by the provider.
+
+    `compile()` builds each stage into a single callable, or None when it
+    has no hooks, so unused stages cost one attribute check.
+    """
+
+    def __init__(self, **stages):
+        self._hooks = {stage: [] for stage in STAGES}
+        self._pipeline = None
+        for stage, hooks in stages.items():
+            for hook in hooks if isinstance(hooks, (list, tuple)) else [hooks]:
+                self.register(stage, hook)
+
+    def register(self, stage, hook):
+        """Run `hook` at `stage`; returns `hook`, so it can decorate."""
+        if stage not in self._hooks:
+            raise ValueError("unknown hook stage: {0}".format(stage))
+        self._hooks[stage].append(hook)
+        self._pipeline = None
+        return hook
+
+    def add(self, obj):
+        """Register every method of `obj` named after a stage."""
+        for stage in STAGES:
+            hook = getattr(obj, stage, None)
+            if hook is not None:
+                self.register(stage, hook)
+        return obj
+
+    def extend(self, hooks):
+        """Register every hook of `hooks`, after those of this one."""
+        for stage in STAGES:
+            for hook in hooks._hooks[stage]:
+                self.register(stage, hook)
+        return self
+
+    def compile(self):
+        if self._pipeline is None:
+            stages = {stage: _chain(self._hooks[stage]) for stage in FILTER_STAGES}
+            for stage in NOTIFY_STAGES:
+                stages[stage] = _fan_out(self._hooks[stage])
+            self._pipeline = Pipeline(**stages)
+        return self._pipeline
+
+
+class ProfilingHook(object):
+    """Samples how long batches spend between the stages of the pipeline.
+
+    For `sample_rate` of the batches, records `<provider>.prepare_seconds`,
+    from the batch being built until it is sent, and `<provider>.send_seconds`,
+    until the response, in `metrics`. Drops are counted for every message as
+    `<provider>.dropped_<reason>`. Add it last to include the other hooks:
+
+        hooks.add(ProfilingHook(0.01))
+    """
+
+    def __init__(self, sample_rate=0.01, metrics=None):
+        self.sample_rate = sample_rate
+        self.metrics = metrics or Metrics()
+        # the batch being sent by each consumer thread
+        self._batch = local()
+
+    def on_batch_built(self, provider, batch):
+        self._batch.built = (
+            time.monotonic() if random.random() < self.sample_rate else None
+        )
+        return batch
+
+    def before_send(self, provider, batch):
+        built = getattr(self._batch, "built", None)
+        if built is None:
+            return
+        now = time.monotonic()
+        self.metrics.observe(provider + ".prepare_seconds", now - built)
+        self._batch.sent = now
+
+    def after_response(self, provider, batch, success):
+        if getattr(self._batch, "built", None) is None:
+            return
+        self._batch.built = None
+        self.metrics.observe(
+            provider + ".send_seconds", time.monotonic() - self._batch.sent
+        )
+
+    def on_drop(self, provider, records, reason):
+        self.metrics.incr("{0}.dropped_{1}".format(provider, reason), len(records))
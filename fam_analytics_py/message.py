@@ -0,0 +1,112 @@
+from fam_analytics_py.utils import clean
+
+
+class Message(object):
+    """A queued message, kept in slots until its batch is sent.
+
+    A dict per message costs several times the memory of its slots, plus
+    the `{}` defaults of its empty fields. `layout()` lists the
+    `(wire key, slot)` pairs of the message in wire order, and `to_dict()`
+    builds the provider payload from them, sending an unset field in
+    `OBJECTS` as `{}`. Access by wire key keeps the dict interface the
+    clients, callbacks and tests use.
+    """
+
+    __slots__ = ("type",)
+
+    # `(wire key, slot)` pairs, in wire order
+    FIELDS = ()
+    # wire keys whose unset value is sent as an empty object
+    OBJECTS = frozenset()
+    # wire keys the provider treats the same whether null, empty or absent
+    OPTIONAL = frozenset()
+
+    def layout(self):
+        return self.FIELDS
+
+    def _slot(self, key):
+        for wire_key, slot in self.layout():
+            if wire_key == key:
+                return slot
+        if key == "type":
+            return "type"
+        raise KeyError(key)
+
+    def __getitem__(self, key):
+        value = getattr(self, self._slot(key))
+        if value is None and key in self.OBJECTS:
+            return {}
+        return value
+
+    def __setitem__(self, key, value):
+        setattr(self, self._slot(key), value)
+
+    def __contains__(self, key):
+        try:
+            self._slot(key)
+        except KeyError:
+            return False
+        return True
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return [key for key, _ in self.layout()]
+
+    def clean_fields(self):
+        """Clean every set field, copying the caller's dicts."""
+        for _, slot in self.layout():
+            value = getattr(self, slot)
+            if value is not None:
+                setattr(self, slot, clean(value))
+
+    def to_dict(self, compact=False):
+        """Return the message as the provider expects it.
+
+        With `compact`, optional fields that are null or empty are left out.
+        """
+        data = {}
+        for key, slot in self.layout():
+            value = getattr(self, slot)
+            if compact and key in self.OPTIONAL and (value is None or value == {}):
+                continue
+            if value is None and key in self.OBJECTS:
+                value = {}
+            data[key] = value
+        return data
+
+    def as_dict(self):
+        """Return the message as a dict, with its type even when the
+        provider payload leaves it out."""
+        data = self.to_dict()
+        if "type" not in data:
+            data = dict({"type": self.type}, **data)
+        return data
+
+    def __eq__(self, other):
+        if isinstance(other, Message):
+            other = other.to_dict()
+        return self.to_dict() == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "{0}({1!r})".format(type(self).__name__, self.to_dict())
+
+
+def as_dict(item):
+    """Return a prepared message as the dict `track()` and co. return."""
+    if isinstance(item, Message):
+        return item.as_dict()
+    return item
+
+
+def to_wire(item, compact=False):
+    """Return a queued item as its provider payload."""
+    if isinstance(item, Message):
+        return item.to_dict(compact)
+    return item
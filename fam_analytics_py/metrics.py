@@ -0,0 +1,98 @@
+from bisect import bisect_left
+from threading import Lock
+
+# upper bounds of the histogram buckets in seconds, doubling from 1ms to ~35m
+BUCKETS = tuple(0.001 * 2**i for i in range(22))
+
+
+class Histogram(object):
+    """Counts of observed values in fixed exponential buckets.
+
+    Quantiles are the upper bound of the bucket they fall in, so they are
+    over-estimated by at most a factor of two; `max` is exact.
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank and seen:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "max": self.max,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+        }
+
+
+class Metrics(object):
+    """Counters, gauges and histograms describing a client and its consumers.
+
+    Counters are incremented and histograms observed from the caller and
+    consumer threads; gauges are callables evaluated only when a snapshot is
+    taken.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+
+    def incr(self, name, value=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def get(self, name):
+        return self._counters.get(name, 0)
+
+    def observe(self, name, value):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.observe(value)
+
+    def histogram(self, name):
+        """Return the summary of histogram `name`, None if nothing was observed."""
+        with self._lock:
+            histogram = self._histograms.get(name)
+            return histogram.summary() if histogram is not None else None
+
+    def register_gauge(self, name, fn):
+        self._gauges[name] = fn
+
+    def snapshot(self):
+        """Return the current value of every counter and gauge."""
+        with self._lock:
+            data = dict(self._counters)
+            for name, histogram in self._histograms.items():
+                data[name] = histogram.summary()
+        for name, fn in list(self._gauges.items()):
+            data[name] = fn()
+        return data
+
+
+def ratio(numerator, denominator):
+    return numerator / denominator if denominator else 0.0
@@ -0,0 +1,72 @@
+"""Buffer the analytics calls of each web request, see `buffered()`.
+
+The calls made while a request is handled are queued together once it
+completes, and dropped if the handler raises or responds with a server
+error, the usual sign that its transaction rolled back. Calls made while a
+streaming response body is iterated are not buffered.
+
+    # Django settings
+    MIDDLEWARE = [..., "fam_analytics_py.middleware.DjangoMiddleware"]
+
+    # any WSGI or ASGI app
+    app = WSGIMiddleware(app)
+    app = ASGIMiddleware(app)
+"""
+
+from fam_analytics_py.buffering import buffered
+
+
+def _failed(status):
+    return status is not None and int(status) >= 500
+
+
+class WSGIMiddleware(object):
+    def __init__(self, app):
+        self.app = app
+
+    def __call__(self, environ, start_response):
+        response = {}
+
+        def _start_response(status, headers, exc_info=None):
+            response["status"] = status.split(None, 1)[0]
+            return start_response(status, headers, exc_info)
+
+        with buffered() as buffer:
+            result = self.app(environ, _start_response)
+            if _failed(response.get("status")):
+                buffer.discard()
+        return result
+
+
+class ASGIMiddleware(object):
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        response = {}
+
+        async def _send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            await send(message)
+
+        with buffered() as buffer:
+            await self.app(scope, receive, _send)
+            if _failed(response.get("status")):
+                buffer.discard()
+
+
+class DjangoMiddleware(object):
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with buffered() as buffer:
+            response = self.get_response(request)
+            if _failed(response.status_code):
+                buffer.discard()
+        return response
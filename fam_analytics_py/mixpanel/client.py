@@ -1,13 +1,14 @@
 from datetime import datetime
-import uuid
+from typing import Optional
 
-from dateutil.tz import tzutc
 from requests.auth import HTTPBasicAuth
 
 from fam_analytics_py.base import BaseClient
+from fam_analytics_py.constants import Provider
+from fam_analytics_py.ratelimit import get_rate_limiter
 from fam_analytics_py.types import ID_TYPES
 from fam_analytics_py.utils import (
-    clean,
+    clock,
     remove_trailing_slash,
     require,
 )
@@ -15,41 +16,107 @@ from fam_analytics_py.utils import (
 from .config import MixpanelConfig
 from .constants import MessageType
 from .consumer import MixpanelConsumer
+from .message import MixpanelMessage
 
 
 class MixpanelClient(BaseClient):
+    PROVIDER = Provider.mixpanel
     DEFAULT_HOST = "https://api.mixpanel.com"
 
     def __init__(
         self,
         config: MixpanelConfig,
-        max_queue_size: int = 10000,
+        max_queue_size: Optional[int] = None,
+        id_generator=None,
+        hooks=None,
     ):
         self.config = config
+        if max_queue_size is None:
+            max_queue_size = config.max_queue_size
 
         super(MixpanelClient, self).__init__(
             host=config.host_url,
             debug=config.enable_debug,
             max_queue_size=max_queue_size,
             on_error=config.error_callback,
-            send=config.start_consumer,
+            send=config.start_consumer or config.manual_flush,
+            id_generator=id_generator,
+            on_dead_letter=config.dead_letter_callback,
+            rate_limiter=get_rate_limiter(config),
+            priority_weights=config.priority_weights,
+            critical_reserve=config.critical_reserve,
+            serialize=config.serialize_messages,
+            max_queue_bytes=config.max_queue_bytes,
+            compact=config.compact_encoding,
+            dead_letter_store=config.dead_letter_store,
+            manual_flush=config.manual_flush,
+            watchdog_interval=config.watchdog_interval,
+            stall_timeout=config.stall_timeout,
+            trace_delivery=config.trace_delivery,
+            hooks=hooks,
         )
 
+    @classmethod
+    def from_config(cls, config, **kwargs):
+        """Create a client from a `MixpanelConfig`."""
+        return cls(config=config, **kwargs)
+
     @property
     def upload_size(self):
-        return 100
+        return self.config.event_upload_size
+
+    @staticmethod
+    def identified_user(record):
+        if "$set" in record:
+            return record.get("$distinct_id")
+        return None
 
-    def _get_consumer(self):
+    def _get_consumer(self, message_type=MessageType.event):
         return MixpanelConsumer(
             config=self.config,
-            queue=self.queue,
+            queue=(
+                self.profile_queue
+                if message_type == MessageType.profile
+                else self.queue
+            ),
             url=self._get_url(),
             auth=self._get_auth(),
             headers=self._get_headers(),
-            upload_size=self.upload_size,
+            message_type=message_type,
+            upload_size=(
+                self.config.profile_upload_size
+                if message_type == MessageType.profile
+                else self.config.event_upload_size
+            ),
             on_error=self.on_error,
+            retries=self.config.retries,
+            timeout=self.config.timeout,
+            metrics=self.metrics,
+            on_dead_letter=self.on_dead_letter,
+            max_bisect_requests=self.config.max_bisect_requests,
+            rate_limiter=self.rate_limiter,
+            compact=self.compact,
+            dead_letter_store=self.dead_letter_store,
+            pipeline=self.pipeline,
         )
 
+    def _get_consumers(self):
+        # events and profiles go to different endpoints, so each gets its own
+        # lane and consumer and a slow `/engage` never holds up `/import`
+        self.profile_queue = self._make_queue()
+        return [
+            self._get_consumer(MessageType.event),
+            self._get_consumer(MessageType.profile),
+        ]
+
+    def _new_consumer(self, consumer):
+        return self._get_consumer(consumer.lane)
+
+    def _get_queue(self, msg):
+        if msg.type == MessageType.profile:
+            return self.profile_queue
+        return self.queue
+
     def _get_url(self):
         return remove_trailing_slash(self.host or self.DEFAULT_HOST)
 
@@ -73,14 +140,18 @@ class MixpanelClient(BaseClient):
         timestamp=None,
         anonymous_id=None,
         integrations=None,
+        message_id=None,
+        priority=None,
     ):
         require("user_id / anonymous_id", user_id or anonymous_id, ID_TYPES)
         require("event", event, str)
 
         properties = properties or {}
         require("properties", properties, dict)
+        # the caller's dict is shared with the other providers
+        properties = dict(properties)
 
-        insert_id = str(uuid.uuid4())
+        insert_id = message_id or self.id_generator()
         distinct_id = str(user_id or anonymous_id)
 
         properties.update(
@@ -92,13 +163,9 @@ class MixpanelClient(BaseClient):
         )
         self._update_timestamp_if_needed(properties=properties)
 
-        msg = {
-            "type": MessageType.event,
-            "event": event,
-            "properties": properties,
-        }
+        msg = MixpanelMessage(MessageType.event, event=event, properties=properties)
 
-        return self._enqueue(msg)
+        return self._enqueue(msg, priority)
 
     def identify(
         self,
@@ -108,19 +175,21 @@ class MixpanelClient(BaseClient):
         timestamp=None,
         anonymous_id=None,
         integrations=None,
+        message_id=None,
+        priority=None,
     ):
         require("user_id / anonymous_id", user_id or anonymous_id, ID_TYPES)
-        traits = traits or {}
-        require("traits", traits, dict)
-
-        msg = {
-            "type": MessageType.profile,
-            "$token": self.config.project_token,
-            "$distinct_id": str(user_id or anonymous_id),
-            "$set": traits,
-        }
+        if traits is not None:
+            require("traits", traits, dict)
+
+        msg = MixpanelMessage(
+            MessageType.profile,
+            token=self.config.project_token,
+            distinct_id=str(user_id or anonymous_id),
+            set=traits,
+        )
 
-        return self._enqueue(msg)
+        return self._enqueue(msg, priority)
 
     def alias(
         self,
@@ -129,6 +198,7 @@ class MixpanelClient(BaseClient):
         context=None,
         timestamp=None,
         integrations=None,
+        message_id=None,
     ):
         return None
 
@@ -141,6 +211,7 @@ class MixpanelClient(BaseClient):
         timestamp=None,
         anonymous_id=None,
         integrations=None,
+        message_id=None,
     ):
         return None
 
@@ -154,6 +225,7 @@ class MixpanelClient(BaseClient):
         timestamp=None,
         anonymous_id=None,
         integrations=None,
+        message_id=None,
     ):
         return None
 
@@ -167,6 +239,7 @@ class MixpanelClient(BaseClient):
         timestamp=None,
         anonymous_id=None,
         integrations=None,
+        message_id=None,
     ):
         return None
 
@@ -174,9 +247,10 @@ class MixpanelClient(BaseClient):
         datetime_obj = properties.pop("time")
         if datetime_obj:
             require("time", datetime_obj, datetime)
+            properties["time"] = int(datetime_obj.timestamp())
         else:
-            datetime_obj = datetime.now(tzutc())
-        properties["time"] = int(datetime_obj.timestamp())
+            properties["time"] = int(clock.epoch())
 
     def _prepare_msg(self, msg):
-        return clean(msg)
+        msg.clean_fields()
+        return msg
@@ -1,5 +1,7 @@
 from dataclasses import dataclass
-from typing import Callable, Optional
+from typing import Callable, Dict, Optional
+
+from fam_analytics_py.dead_letter import DeadLetterStore
 
 
 @dataclass
@@ -11,5 +13,45 @@ class MixpanelConfig:
 
     host_url: Optional[str] = None
     error_callback: Optional[Callable] = None
+    # called with `(error, records)` for records rejected as invalid,
+    # defaults to error_callback
+    dead_letter_callback: Optional[Callable] = None
+    # keeps the batches that failed or were rejected, for replay
+    dead_letter_store: Optional[DeadLetterStore] = None
     start_consumer: bool = True
+    # no consumer thread: messages are kept in memory and uploaded by the
+    # thread calling flush(), for serverless functions and batch jobs
+    manual_flush: bool = False
+    # how often consumers are checked, restarting any that died or made no
+    # request for stall_timeout seconds; None disables the watchdog. Keep it
+    # above timeout plus the longest backoff between retries (30s)
+    watchdog_interval: Optional[float] = 10.0
+    stall_timeout: float = 300.0
+    # OpenTelemetry span per uploaded batch, linked to the spans that queued
+    # its messages; requires opentelemetry-api
+    trace_delivery: bool = False
     enable_debug: bool = False
+
+    # `/import` and `/engage` each accept up to 2000 records per request
+    event_upload_size: int = 2000
+    profile_upload_size: int = 2000
+    max_queue_size: int = 10000
+    timeout: int = 15
+    retries: int = 10
+    # extra requests a rejected batch may spend isolating its bad messages
+    max_bisect_requests: int = 20
+    # paces uploads below the provider's quota; None disables a limit
+    rate_limit_events_per_second: Optional[float] = None
+    rate_limit_bytes_per_second: Optional[float] = None
+    # relative share of each priority lane when draining, e.g.
+    # {"critical": 8, "default": 4, "best_effort": 1}; None keeps the default
+    priority_weights: Optional[Dict[str, int]] = None
+    # fraction of max_queue_size only critical messages may fill
+    critical_reserve: float = 0.1
+    # queue messages as JSON bytes instead of dicts, bounding the queue by
+    # max_queue_bytes as well as max_queue_size
+    serialize_messages: bool = False
+    max_queue_bytes: Optional[int] = None
+    # leave null and empty optional fields out of messages and send batches
+    # without whitespace
+    compact_encoding: bool = False
@@ -1,6 +1,9 @@
 import time
-from dataclasses import dataclass, field
-from fam_analytics_py.base import BaseConsumer
+
+from fam_analytics_py.base import BaseConsumer, is_retryable
+from fam_analytics_py.constants import Provider
+from fam_analytics_py.encoding import encode_array, is_encoded
+from fam_analytics_py.metrics import ratio
 from fam_analytics_py.request import post
 
 from .config import MixpanelConfig
@@ -8,11 +11,11 @@ from .constants import MessageType, PAYLOAD_PATH_MAP
 
 
 class MixpanelConsumer(BaseConsumer):
+    """Consumes one lane of messages, either events or profile updates."""
+
+    PROVIDER = Provider.mixpanel
 
-    @dataclass
-    class MessageBatches:
-        events: "list[dict]" = field(default_factory=lambda: [])
-        profiles: "list[dict]" = field(default_factory=lambda: [])
+    SET_KEYS = {"$token", "$distinct_id", "$set"}
 
     def __init__(
         self,
@@ -21,10 +24,21 @@ class MixpanelConsumer(BaseConsumer):
         url,
         auth,
         headers,
+        message_type=MessageType.event,
         upload_size=100,
         on_error=None,
+        retries=10,
+        timeout=15,
+        metrics=None,
+        on_dead_letter=None,
+        max_bisect_requests=20,
+        rate_limiter=None,
+        compact=False,
+        dead_letter_store=None,
+        pipeline=None,
     ):
         self.config = config
+        self.message_type = message_type
         super().__init__(
             queue=queue,
             url=url,
@@ -33,52 +47,119 @@ class MixpanelConsumer(BaseConsumer):
             write_key=None,
             upload_size=upload_size,
             on_error=on_error,
+            retries=retries,
+            timeout=timeout,
+            metrics=metrics,
+            on_dead_letter=on_dead_letter,
+            max_bisect_requests=max_bisect_requests,
+            rate_limiter=rate_limiter,
+            compact=compact,
+            dead_letter_store=dead_letter_store,
+            pipeline=pipeline,
         )
+        self.path = PAYLOAD_PATH_MAP[message_type].format(
+            base_url=url,
+            project_id=config.project_id,
+        )
+        if message_type == MessageType.profile:
+            self.metrics.register_gauge(
+                "profile_merge_ratio",
+                lambda: ratio(
+                    self.metrics.get("profile_updates_received"),
+                    self.metrics.get("profile_updates_sent"),
+                ),
+            )
 
-    def _segregate_batch(self, batch: "list[dict]") -> MessageBatches:
-        batches = self.MessageBatches()
+    @property
+    def lane(self):
+        return self.message_type
+
+    def _coalesce_profiles(self, batch):
+        """Merge the consecutive `$set` updates of each `$distinct_id` in `batch`.
+
+        The merged update takes the position of the first one and later
+        values win per key. Any other operation on a profile, e.g. `$unset`,
+        passes through untouched and ends the merge of its `$set`s, so the
+        operations still apply in order. Queued records are never modified.
+        """
+        coalesced = []
+        # index in `coalesced` of the update later `$set`s merge into
+        merged = {}
+        # indexes of the updates already copied, to merge into
+        copied = set()
         for msg in batch:
-            msg_type = msg.pop("type")
-            if msg_type == MessageType.event:
-                batches.events.append(msg)
-            elif msg_type == MessageType.profile:
-                batches.profiles.append(msg)
+            key = (msg.get("$token"), msg.get("$distinct_id"))
+            if msg.keys() != self.SET_KEYS:
+                merged.pop(key, None)
+                coalesced.append(msg)
+                continue
 
-        return batches
+            index = merged.get(key)
+            if index is None:
+                merged[key] = len(coalesced)
+                coalesced.append(msg)
+                continue
+            if index not in copied:
+                target = coalesced[index]
+                coalesced[index] = dict(target, **{"$set": dict(target["$set"])})
+                copied.add(index)
+            coalesced[index]["$set"].update(msg["$set"])
+
+        self.metrics.incr("profile_updates_received", len(batch))
+        self.metrics.incr("profile_updates_sent", len(coalesced))
+        return coalesced
 
     def request(self, batch):
         """Attempt to upload the batch and retry before raising an error"""
 
-        batches = self._segregate_batch(batch=batch)
+        if is_encoded(batch):
+            # serialized without their type when queued; profile updates
+            # are sent as they are, since merging them means decoding
+            body = {"_data": encode_array(batch)}
+        else:
+            for msg in batch:
+                msg.pop("type", None)
 
-        path_payload_pair = [
-            (
-                PAYLOAD_PATH_MAP[MessageType.event].format(
-                    base_url=self.url,
-                    project_id=self.config.project_id,
-                ),
-                batches.events,
-            ),
-            (
-                PAYLOAD_PATH_MAP[MessageType.profile].format(
-                    base_url=self.url,
-                ),
-                batches.profiles,
-            ),
-        ]
-        for path, payload in path_payload_pair:
-            if not payload:
-                continue
+            if self.message_type == MessageType.profile:
+                batch = self._coalesce_profiles(batch)
+            body = {"_payload": batch}
 
-            attempt = 1
-            while True:
-                try:
-                    post(
-                        url=path, auth=self.auth, headers=self.headers, _payload=payload
-                    )
+        attempt = 1
+        while True:
+            try:
+                self._attempt()
+                post(
+                    url=self.path,
+                    auth=self.auth,
+                    headers=self.headers,
+                    timeout=self.timeout,
+                    rate_limiter=self.rate_limiter,
+                    compact=self.compact,
+                    metrics=self.metrics,
+                    trace=self.trace,
+                    **body
+                )
+                break
+            except Exception as e:
+                rejections = self._failed_records(e, batch)
+                if rejections:
+                    # the other records were imported, only these are invalid
+                    self._reject(self.path, e.status, rejections)
                     break
-                except Exception:
-                    attempt += 1
-                    if attempt > self.retries:
-                        raise
-                    time.sleep(0.1 * attempt)
+                attempt += 1
+                if attempt > self.retries or not is_retryable(e):
+                    raise
+                time.sleep(max(0.1 * attempt, self._retry_delay(e, attempt)))
+
+    def _failed_records(self, error, batch):
+        """Return the records of `batch` a strict `/import` reported invalid."""
+        payload = getattr(error, "payload", None)
+        if not isinstance(payload, dict):
+            return []
+
+        rejections = []
+        for failure in payload.get("failed_records") or ():
+            index = failure.get("index")
+            if isinstance(index, int) and 0 <= index < len(batch):
+                rejections.append((batch[index], error.code, failure.get("message")))
+        return rejections
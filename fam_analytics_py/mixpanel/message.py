@@ -0,0 +1,45 @@
+from fam_analytics_py.message import Message
+
+from .constants import MessageType
+
+
+class MixpanelMessage(Message):
+    """An `/import` event or an `/engage` profile update.
+
+    The type picks the lane and endpoint; it is not part of the payload.
+    """
+
+    __slots__ = ("event", "properties", "token", "distinct_id", "set")
+
+    OBJECTS = frozenset(["properties", "$set"])
+
+    LAYOUTS = {
+        MessageType.event: (
+            ("event", "event"),
+            ("properties", "properties"),
+        ),
+        MessageType.profile: (
+            ("$token", "token"),
+            ("$distinct_id", "distinct_id"),
+            ("$set", "set"),
+        ),
+    }
+
+    def __init__(
+        self,
+        type,
+        event=None,
+        properties=None,
+        token=None,
+        distinct_id=None,
+        set=None,
+    ):
+        self.type = type
+        self.event = event
+        self.properties = properties
+        self.token = token
+        self.distinct_id = distinct_id
+        self.set = set
+
+    def layout(self):
+        return self.LAYOUTS[self.type]
@@ -0,0 +1,88 @@
+import time
+from threading import Lock
+
+
+class TokenBucket(object):
+    """Refills `rate` tokens per second up to `capacity`.
+
+    A request larger than what is left takes the bucket into debt instead of
+    waiting for a refill it could never get, so one oversized batch is paced
+    rather than blocked forever.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else rate)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = Lock()
+
+    def _refill(self, now):
+        elapsed = now - self._updated_at
+        self._updated_at = now
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+
+    def reserve(self, amount):
+        """Take `amount` tokens, returning how long to wait before using them."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= amount
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self, amount):
+        """Take `amount` tokens, blocking until they are available."""
+        wait = self.reserve(amount)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    @property
+    def level(self):
+        """The tokens currently available, negative while in debt."""
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens
+
+
+class RateLimiter(object):
+    """Paces uploads to a provider by events and bytes per second."""
+
+    def __init__(self, events_per_second=None, bytes_per_second=None, burst=1.0):
+        """`burst` is how many seconds' worth of tokens may be spent at once."""
+        self.events = (
+            TokenBucket(events_per_second, events_per_second * burst)
+            if events_per_second
+            else None
+        )
+        self.bytes = (
+            TokenBucket(bytes_per_second, bytes_per_second * burst)
+            if bytes_per_second
+            else None
+        )
+
+    def acquire(self, events=0, nbytes=0):
+        """Block until `events` and `nbytes` may be sent, return the wait."""
+        wait = 0.0
+        if events and self.events is not None:
+            wait += self.events.acquire(events)
+        if nbytes and self.bytes is not None:
+            wait += self.bytes.acquire(nbytes)
+        return wait
+
+    def register_gauges(self, metrics):
+        if self.events is not None:
+            metrics.register_gauge("rate_limit_event_tokens", lambda: self.events.level)
+        if self.bytes is not None:
+            metrics.register_gauge("rate_limit_byte_tokens", lambda: self.bytes.level)
+
+
+def get_rate_limiter(config):
+    """Return the limiter described by a provider config, if it sets one."""
+    if not (config.rate_limit_events_per_second or config.rate_limit_bytes_per_second):
+        return None
+    return RateLimiter(
+        events_per_second=config.rate_limit_events_per_second,
+        bytes_per_second=config.rate_limit_bytes_per_second,
+    )
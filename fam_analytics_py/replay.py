@@ -0,0 +1,164 @@
+"""Replay the batches of a dead-letter store into a provider.
+
+    python -m fam_analytics_py.replay dead_letters.jsonl --provider segment \
+        --events-per-second 500
+
+Records of consecutive entries are merged into batches of the provider's
+upload size and paced by the rate limits given, which is much faster than
+sending them again one call at a time. Only batches that `failed` are
+replayed unless `--include-rejected` is given; rejected records are
+usually rejected again.
+
+Progress is checkpointed, so a replay that stops, e.g. because the
+provider is still down, resumes where it left off. Records keep their
+message IDs, so Segment and Mixpanel deduplicate any that are resent.
+"""
+
+import argparse
+import dataclasses
+import logging
+import os
+import sys
+
+from fam_analytics_py.backfill import (
+    CLIENTS,
+    Checkpoint,
+    add_provider_arguments,
+    config_from_args,
+)
+from fam_analytics_py.dead_letter import DeadLetterStore
+
+LOGGER = logging.getLogger("fam-analytics-py")
+
+
+class ReplayError(Exception):
+    """The replay stopped before every batch was delivered."""
+
+
+class Replay(object):
+    """Send the records of dead-letter entries to one provider again."""
+
+    def __init__(self, provider, config, checkpoint=None, include_rejected=False):
+        self.provider = provider
+        self.checkpoint = checkpoint
+        self.kinds = {"failed", "rejected"} if include_rejected else {"failed"}
+        self.stats = {"entries": 0, "records": 0, "failed": 0, "rejected": 0}
+
+        config = dataclasses.replace(
+            config,
+            start_consumer=False,
+            error_callback=self._on_error,
+            dead_letter_callback=self._on_rejected,
+            # never append to the store being replayed
+            dead_letter_store=None,
+        )
+        self.client = CLIENTS[provider].from_config(config)
+        self.consumers = {consumer.lane: consumer for consumer in self.client.consumers}
+        self.batch_size = max(
+            consumer.upload_size for consumer in self.consumers.values()
+        )
+
+    def _on_error(self, error, records):
+        LOGGER.error("failed to replay %s records: %s", len(records), error)
+        self.stats["failed"] += len(records)
+
+    def _on_rejected(self, error, records):
+        LOGGER.warning("%s replayed records rejected: %s", len(records), error)
+        self.stats["rejected"] += len(records)
+
+    def run(self, entries):
+        """Replay `entries`, skipping those already replayed."""
+        skip = self.checkpoint.load() if self.checkpoint is not None else 0
+        pending = {}
+        size = 0
+        offset = skip
+        for offset, entry in enumerate(entries, 1):
+            if offset <= skip:
+                continue
+            if entry["provider"] == self.provider and entry["kind"] in self.kinds:
+                records = entry["records"]
+                pending.setdefault(entry.get("lane"), []).extend(records)
+                size += len(records)
+                self.stats["entries"] += 1
+            if size >= self.batch_size:
+                self._flush(pending, offset)
+                pending = {}
+                size = 0
+        self._flush(pending, offset)
+        return self.stats
+
+    def _flush(self, pending, offset):
+        """Send the `pending` records of every lane, then checkpoint `offset`."""
+        for lane, records in pending.items():
+            consumer = self.consumers.get(lane, self.client.consumer)
+            for start in range(0, len(records), consumer.upload_size):
+                batch = records[start : start + consumer.upload_size]
+                self.stats["records"] += len(batch)
+                consumer.send(batch)
+                if self.stats["failed"]:
+                    raise ReplayError(
+                        "{0} records could not be sent, {1} is still down".format(
+                            self.stats["failed"], self.provider
+                        )
+                    )
+        if self.checkpoint is not None:
+            self.checkpoint.save(offset)
+
+
+def _parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m fam_analytics_py.replay",
+        description="Replay the batches kept by a dead-letter store.",
+    )
+    parser.add_argument("path", help="dead-letter store to replay")
+    parser.add_argument(
+        "--checkpoint",
+        help="progress file, defaults to <path>.<provider>.replayed",
+    )
+    parser.add_argument(
+        "--restart", action="store_true", help="ignore an existing checkpoint"
+    )
+    parser.add_argument(
+        "--include-rejected",
+        action="store_true",
+        help="also replay records the provider rejected as invalid",
+    )
+    add_provider_arguments(parser)
+    return parser
+
+
+def main(argv=None):
+    args = _parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    checkpoint = Checkpoint(
+        args.checkpoint or "{0}.{1}.replayed".format(args.path, args.provider),
+        args.path,
+        args.provider,
+    )
+    if args.restart and os.path.exists(checkpoint.path):
+        os.remove(checkpoint.path)
+
+    replay = Replay(
+        args.provider,
+        config_from_args(args),
+        checkpoint=checkpoint,
+        include_rejected=args.include_rejected,
+    )
+    try:
+        stats = replay.run(DeadLetterStore(args.path).read())
+    except ReplayError as e:
+        LOGGER.error("%s", e)
+        return 1
+
+    LOGGER.info(
+        "replayed %s records from %s entries, %s rejected",
+        stats["records"],
+        stats["entries"],
+        stats["rejected"],
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
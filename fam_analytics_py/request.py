@@ -1,8 +1,11 @@
 import json
 import logging
+import time
 
 from requests import sessions
 
+from fam_analytics_py import tracing
+from fam_analytics_py.encoding import COMPACT_SEPARATORS
 from fam_analytics_py.exceptions import APIError
 from fam_analytics_py.utils import DatetimeSerializer
 
@@ -10,18 +13,46 @@ LOGGER = logging.getLogger("fam-analytics-py")
 _session = sessions.Session()
 
 
-def post(url, headers, auth, _payload=None, **kwargs):
-    """Post `_payload` or the `kwargs` to the API"""
+def post(
+    url,
+    headers,
+    auth,
+    _payload=None,
+    timeout=15,
+    rate_limiter=None,
+    _data=None,
+    compact=False,
+    metrics=None,
+    trace=False,
+    **kwargs
+):
+    """Post the encoded `_data`, or `_payload` or the `kwargs`, to the API"""
 
-    body = _payload
-    if not body:
-        body = kwargs
+    data = _data
+    if data is None:
+        body = _payload
+        if not body:
+            body = kwargs
+        started = time.monotonic()
+        data = json.dumps(
+            body,
+            cls=DatetimeSerializer,
+            separators=COMPACT_SEPARATORS if compact else None,
+        )
+        if metrics is not None:
+            metrics.observe("serialize_seconds", time.monotonic() - started)
 
-    data = json.dumps(body, cls=DatetimeSerializer)
+    if rate_limiter is not None:
+        rate_limiter.acquire(nbytes=len(data))
 
+    if trace:
+        headers = tracing.inject(headers)
     headers["content-type"] = "application/json"
     LOGGER.debug("making request: %s", data)
-    res = _session.post(url, data=data, auth=auth, headers=headers, timeout=15)
+    started = time.monotonic()
+    res = _session.post(url, data=data, auth=auth, headers=headers, timeout=timeout)
+    if metrics is not None:
+        metrics.observe("http_seconds", time.monotonic() - started)
 
     if res.status_code == 200:
         LOGGER.debug("data uploaded successfully")
@@ -31,8 +62,10 @@ def post(url, headers, auth, _payload=None, **kwargs):
         payload = res.json()
         LOGGER.debug("received response: %s", payload)
         if "message" in payload and "code" in payload:
-            raise APIError(url, res.status_code, payload["code"], payload["message"])
+            raise APIError(
+                url, res.status_code, payload["code"], payload["message"], payload
+            )
         else:
-            raise APIError(url, res.status_code, "unknown", res.text)
+            raise APIError(url, res.status_code, "unknown", res.text, payload)
     except ValueError:
         raise APIError(url, res.status_code, "unknown", res.text)
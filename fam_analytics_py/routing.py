@@ -0,0 +1,84 @@
+import re
+from fnmatch import translate
+
+from fam_analytics_py.constants import PROVIDERS
+
+WILDCARDS = frozenset("*?[")
+
+
+class _Matcher(object):
+    """Matches event names against exact names and `fnmatch` patterns."""
+
+    def __init__(self, patterns):
+        self.names = set()
+        wildcards = []
+        for pattern in patterns:
+            if WILDCARDS.intersection(pattern):
+                wildcards.append(translate(pattern))
+            else:
+                self.names.add(pattern)
+        self.regex = re.compile("|".join(wildcards)) if wildcards else None
+
+    def __call__(self, event):
+        if event in self.names:
+            return True
+        return self.regex is not None and self.regex.match(event) is not None
+
+
+class RoutingRules(object):
+    """Which providers receive each `track()` event.
+
+    `rules` maps a provider to an `allow` and/or `deny` list of event names,
+    which may use `fnmatch` wildcards such as "campaign_*". A provider with
+    an allow list only receives matching events, a denied event is never
+    sent, and a provider without rules receives everything.
+
+    The providers of an event are resolved once and kept in a dict, so
+    routing a known event is a single lookup. The dict is reset when it
+    reaches `max_events`, which only happens for unbounded event names.
+    """
+
+    def __init__(self, rules, max_events=10000):
+        self.max_events = max_events
+        self._compile(rules)
+        self._routes = {}
+
+    def _compile(self, rules):
+        self._allow = {}
+        self._deny = {}
+        for provider, rule in rules.items():
+            if provider not in PROVIDERS:
+                raise ValueError("unknown provider: {0}".format(provider))
+            unknown = set(rule) - {"allow", "deny"}
+            if unknown:
+                raise ValueError(
+                    "unknown routing keys for {0}: {1}".format(
+                        provider, ", ".join(sorted(unknown))
+                    )
+                )
+            if "allow" in rule:
+                self._allow[provider] = _Matcher(rule["allow"])
+            if "deny" in rule:
+                self._deny[provider] = _Matcher(rule["deny"])
+
+    def _resolve(self, event):
+        providers = []
+        for provider in PROVIDERS:
+            allow = self._allow.get(provider)
+            if allow is not None and not allow(event):
+                continue
+            deny = self._deny.get(provider)
+            if deny is not None and deny(event):
+                continue
+            providers.append(provider)
+        return frozenset(providers)
+
+    def providers(self, event):
+        """Return the set of providers that receive `event`."""
+        providers = self._routes.get(event)
+        if providers is None:
+            providers = self._resolve("" if event is None else str(event))
+            if len(self._routes) >= self.max_events:
+                self._routes.clear()
+            self._routes[event] = providers
+        return providers
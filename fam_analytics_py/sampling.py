@@ -0,0 +1,73 @@
+import hashlib
+
+from fam_analytics_py.constants import PROVIDERS
+
+ANY = "*"
+
+
+def user_bucket(user_id):
+    """Map `user_id` to a stable point in [0, 1)."""
+    digest = hashlib.blake2b(str(user_id).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") / 2.0**64
+
+
+class SamplingRules(object):
+    """Sample rates for `track()` calls, by event name and provider.
+
+    `rules` maps an event name, or a `(provider, event)` pair, to the
+    fraction of users whose events are kept. Either side of a pair may be
+    "*"; the most specific rule wins: `(provider, event)`, then `event`,
+    then `(provider, "*")`, then `default_rate`.
+
+    Users are sampled by hashing their ID, so a user is either in or out for
+    every event with the same rate, and a user kept at a low rate is also
+    kept at any higher one. Kept events get the applied rate in the
+    `rate_property` property so counts can be reweighted.
+    """
+
+    def __init__(self, rules, default_rate=1.0, rate_property="sample_rate"):
+        self.default_rate = default_rate
+        self.rate_property = rate_property
+        self._compile(rules)
+
+    def _compile(self, rules):
+        provider_rates = {}
+        event_rates = {}
+        pair_rates = {}
+        for key, rate in rules.items():
+            if not 0.0 <= rate <= 1.0:
+                raise ValueError("sample rate for {0} must be in [0, 1]".format(key))
+            provider, event = key if isinstance(key, tuple) else (ANY, key)
+            if event == ANY:
+                provider_rates[provider] = rate
+            elif provider == ANY:
+                event_rates[event] = rate
+            else:
+                pair_rates[(provider, event)] = rate
+
+        default_rate = provider_rates.pop(ANY, self.default_rate)
+        # resolve the precedence once, so a lookup is at most two dict hits
+        self._provider_rates = {
+            provider: provider_rates.get(provider, default_rate)
+            for provider in PROVIDERS
+        }
+        self._rates = {}
+        for event in set(event_rates) | {event for _, event in pair_rates}:
+            for provider in PROVIDERS:
+                self._rates[(provider, event)] = pair_rates.get(
+                    (provider, event),
+                    event_rates.get(event, self._provider_rates[provider]),
+                )
+
+    def rate(self, provider, event):
+        """Return the sample rate of `event` for `provider`."""
+        rate = self._rates.get((provider, event))
+        if rate is None:
+            rate = self._provider_rates.get(provider, self.default_rate)
+        return rate
+
+    def keep(self, user_id, rate):
+        """Whether events of `user_id` are kept at `rate`."""
+        if rate >= 1.0:
+            return True
+        return user_bucket(user_id) < rate
@@ -0,0 +1,130 @@
+from fam_analytics_py.exceptions import SchemaValidationError
+
+SPEC_KEYS = frozenset(["type", "required", "nullable", "max_length"])
+
+
+def _type_name(types):
+    return " or ".join(t.__name__ for t in types)
+
+
+def _compile_property(event, name, spec):
+    """Return a callable that raises if a value of property `name` is invalid."""
+    if not isinstance(spec, dict):
+        spec = {"type": spec}
+    unknown = set(spec) - SPEC_KEYS
+    if unknown:
+        raise ValueError(
+            "unknown schema keys for {0}.{1}: {2}".format(
+                event, name, ", ".join(sorted(unknown))
+            )
+        )
+
+    types = spec.get("type", object)
+    types = tuple(types) if isinstance(types, (tuple, list)) else (types,)
+    if float in types and int not in types:
+        types += (int,)
+    # bool is an int, but True is no amount
+    numeric = bool not in types and int in types
+    nullable = spec.get("nullable", False)
+    max_length = spec.get("max_length")
+
+    def invalid(value, reason):
+        raise SchemaValidationError(
+            "{0}: property {1!r} {2}, got {3!r}".format(event, name, reason, value)
+        )
+
+    expected = "must be " + _type_name(types)
+
+    def check(value):
+        if not isinstance(value, types) or (numeric and isinstance(value, bool)):
+            if value is None and nullable:
+                return
+            invalid(value, expected)
+
+    if max_length is None:
+        return check
+
+    too_long = "must be at most {0} long".format(max_length)
+
+    def check_length(value):
+        check(value)
+        if value is not None and len(value) > max_length:
+            invalid(value, too_long)
+
+    return check_length
+
+
+def _compile_event(event, properties, allow_unknown_properties):
+    """Return a callable that raises if the properties of `event` are invalid."""
+    checks = {}
+    required = []
+    for name, spec in properties.items():
+        checks[name] = _compile_property(event, name, spec)
+        if isinstance(spec, dict) and spec.get("required"):
+            required.append(name)
+    required = frozenset(required)
+
+    def validate(properties):
+        if required and not required.issubset(properties):
+            raise SchemaValidationError(
+                "{0}: missing required properties: {1}".format(
+                    event, ", ".join(sorted(required.difference(properties)))
+                )
+            )
+        for name, value in properties.items():
+            check = checks.get(name)
+            if check is not None:
+                check(value)
+            elif not allow_unknown_properties:
+                raise SchemaValidationError(
+                    "{0}: unknown property {1!r}".format(event, name)
+                )
+
+    return validate
+
+
+class SchemaRegistry(object):
+    """The expected properties of `track()` events, by event name.
+
+    `schemas` maps an event name to its properties, each declared as a type,
+    a tuple of types, or a dict with a `type` and optionally `required`,
+    `nullable` and `max_length` (of strings, lists and dicts):
+
+        SchemaRegistry({
+            "purchase": {
+                "amount": float,
+                "currency": {"type": str, "required": True, "max_length": 3},
+            },
+        })
+
+    A `float` property also takes ints, and numeric properties never take
+    bools. Each schema is compiled into a validator once, so validating an
+    event is a dict lookup and a check per property. An invalid event raises
+    `SchemaValidationError` before it is queued for any provider. Events
+    without a schema pass unless `strict`.
+    """
+
+    def __init__(self, schemas, strict=False, allow_unknown_properties=True):
+        self.strict = strict
+        self._validators = {
+            event: _compile_event(event, properties, allow_unknown_properties)
+            for event, properties in schemas.items()
+        }
+
+    def __contains__(self, event):
+        return event in self._validators
+
+    def validate(self, event, properties):
+        """Raise `SchemaValidationError` unless `properties` fit `event`."""
+        validator = self._validators.get(event)
+        if validator is None:
+            if self.strict:
+                raise SchemaValidationError("{0}: unknown event".format(event))
+            return
+        if properties is None:
+            properties = {}
+        elif not isinstance(properties, dict):
+            raise SchemaValidationError(
+                "{0}: properties must be a dict, got {1!r}".format(event, properties)
+            )
+        validator(properties)
@@ -1,24 +1,25 @@
 from datetime import datetime
-from uuid import uuid4
 
-from dateutil.tz import tzutc
 from requests.auth import HTTPBasicAuth
 from six import string_types
 
 from fam_analytics_py.base import BaseClient
+from fam_analytics_py.constants import Provider
+from fam_analytics_py.ratelimit import get_rate_limiter
 from fam_analytics_py.types import ID_TYPES
 from fam_analytics_py.utils import (
-    clean,
-    guess_timezone,
     remove_trailing_slash,
     require,
     stringify_id,
+    to_isoformat,
 )
 
 from .consumer import SegmentConsumer
+from .message import SegmentMessage
 
 
 class SegmentClient(BaseClient):
+    PROVIDER = Provider.segment
     DEFAULT_HOST = "https://api.segment.io"
 
     def __init__(
@@ -29,8 +30,32 @@ class SegmentClient(BaseClient):
         max_queue_size=10000,
         send=True,
         on_error=None,
+        id_generator=None,
+        upload_size=1000,
+        max_batch_bytes=460000,
+        timeout=15,
+        retries=10,
+        on_dead_letter=None,
+        max_bisect_requests=20,
+        rate_limiter=None,
+        priority_weights=None,
+        critical_reserve=0.1,
+        serialize=False,
+        max_queue_bytes=None,
+        compact=False,
+        dead_letter_store=None,
+        manual_flush=False,
+        watchdog_interval=10.0,
+        stall_timeout=300.0,
+        trace_delivery=False,
+        hooks=None,
     ):
         require("write key", write_key, string_types)
+        self._upload_size = upload_size
+        self.max_batch_bytes = max_batch_bytes
+        self.timeout = timeout
+        self.retries = retries
+        self.max_bisect_requests = max_bisect_requests
 
         super(SegmentClient, self).__init__(
             write_key=write_key,
@@ -39,11 +64,62 @@ class SegmentClient(BaseClient):
             max_queue_size=max_queue_size,
             send=send,
             on_error=on_error,
+            id_generator=id_generator,
+            on_dead_letter=on_dead_letter,
+            rate_limiter=rate_limiter,
+            priority_weights=priority_weights,
+            critical_reserve=critical_reserve,
+            serialize=serialize,
+            max_queue_bytes=max_queue_bytes,
+            compact=compact,
+            dead_letter_store=dead_letter_store,
+            manual_flush=manual_flush,
+            watchdog_interval=watchdog_interval,
+            stall_timeout=stall_timeout,
+            trace_delivery=trace_delivery,
+            hooks=hooks,
         )
 
+    @classmethod
+    def from_config(cls, config, **kwargs):
+        """Create a client from a `SegmentConfig`, with `kwargs` overriding it."""
+        options = dict(
+            write_key=config.write_key,
+            host=config.host_url,
+            debug=config.enable_debug,
+            on_error=config.error_callback,
+            send=config.start_consumer or config.manual_flush,
+            max_queue_size=config.max_queue_size,
+            upload_size=config.upload_size,
+            max_batch_bytes=config.max_batch_bytes,
+            timeout=config.timeout,
+            retries=config.retries,
+            on_dead_letter=config.dead_letter_callback,
+            max_bisect_requests=config.max_bisect_requests,
+            rate_limiter=get_rate_limiter(config),
+            priority_weights=config.priority_weights,
+            critical_reserve=config.critical_reserve,
+            serialize=config.serialize_messages,
+            max_queue_bytes=config.max_queue_bytes,
+            compact=config.compact_encoding,
+            dead_letter_store=config.dead_letter_store,
+            manual_flush=config.manual_flush,
+            watchdog_interval=config.watchdog_interval,
+            stall_timeout=config.stall_timeout,
+            trace_delivery=config.trace_delivery,
+        )
+        options.update(kwargs)
+        return cls(**options)
+
     @property
     def upload_size(self):
-        return 100
+        return self._upload_size
+
+    @staticmethod
+    def identified_user(record):
+        if record.get("type") == "identify":
+            return record.get("userId")
+        return None
 
     def _get_consumer(self):
         return SegmentConsumer(
@@ -54,6 +130,16 @@ class SegmentClient(BaseClient):
             auth=self._get_auth(),
             headers=self._get_headers(),
             on_error=self.on_error,
+            max_batch_bytes=self.max_batch_bytes,
+            retries=self.retries,
+            timeout=self.timeout,
+            metrics=self.metrics,
+            on_dead_letter=self.on_dead_letter,
+            max_bisect_requests=self.max_bisect_requests,
+            rate_limiter=self.rate_limiter,
+            compact=self.compact,
+            dead_letter_store=self.dead_letter_store,
+            pipeline=self.pipeline,
         )
 
     def _get_url(self):
@@ -74,25 +160,26 @@ class SegmentClient(BaseClient):
         timestamp=None,
         anonymous_id=None,
         integrations=None,
+        message_id=None,
+        priority=None,
     ):
-        properties = properties or {}
-        context = context or {}
-        integrations = integrations or {}
         require("user_id or anonymous_id", user_id or anonymous_id, ID_TYPES)
-        require("properties", properties, dict)
+        if properties is not None:
+            require("properties", properties, dict)
         require("event", event, string_types)
 
-        msg = {
-            "integrations": integrations,
-            "anonymousId": anonymous_id,
-            "properties": properties,
-            "timestamp": timestamp,
-            "context": context,
-            "userId": user_id,
-            "type": "track",
-            "event": event,
-        }
-        return self._enqueue(msg)
+        msg = SegmentMessage(
+            "track",
+            user_id=user_id,
+            anonymous_id=anonymous_id,
+            message_id=message_id,
+            timestamp=timestamp,
+            context=context,
+            integrations=integrations,
+            event=event,
+            properties=properties,
+        )
+        return self._enqueue(msg, priority)
 
     def identify(
         self,
@@ -102,23 +189,24 @@ class SegmentClient(BaseClient):
         timestamp=None,
         anonymous_id=None,
         integrations=None,
+        message_id=None,
+        priority=None,
     ):
-        traits = traits or {}
-        context = context or {}
-        integrations = integrations or {}
         require("user_id or anonymous_id", user_id or anonymous_id, ID_TYPES)
-        require("traits", traits, dict)
-
-        msg = {
-            "integrations": integrations,
-            "anonymousId": anonymous_id,
-            "timestamp": timestamp,
-            "context": context,
-            "type": "identify",
-            "userId": user_id,
-            "traits": traits,
-        }
-        return self._enqueue(msg)
+        if traits is not None:
+            require("traits", traits, dict)
+
+        msg = SegmentMessage(
+            "identify",
+            user_id=user_id,
+            anonymous_id=anonymous_id,
+            message_id=message_id,
+            timestamp=timestamp,
+            context=context,
+            integrations=integrations,
+            traits=traits,
+        )
+        return self._enqueue(msg, priority)
 
     def alias(
         self,
@@ -127,20 +215,20 @@ class SegmentClient(BaseClient):
         context=None,
         timestamp=None,
         integrations=None,
+        message_id=None,
     ):
-        context = context or {}
-        integrations = integrations or {}
         require("previous_id", previous_id, ID_TYPES)
         require("user_id", user_id, ID_TYPES)
 
-        msg = {
-            "integrations": integrations,
-            "previousId": previous_id,
-            "timestamp": timestamp,
-            "context": context,
-            "userId": user_id,
-            "type": "alias",
-        }
+        msg = SegmentMessage(
+            "alias",
+            user_id=user_id,
+            message_id=message_id,
+            timestamp=timestamp,
+            context=context,
+            integrations=integrations,
+            previous_id=previous_id,
+        )
         return self._enqueue(msg)
 
     def group(
@@ -152,24 +240,24 @@ class SegmentClient(BaseClient):
         timestamp=None,
         anonymous_id=None,
         integrations=None,
+        message_id=None,
     ):
-        traits = traits or {}
-        context = context or {}
-        integrations = integrations or {}
         require("user_id or anonymous_id", user_id or anonymous_id, ID_TYPES)
         require("group_id", group_id, ID_TYPES)
-        require("traits", traits, dict)
-
-        msg = {
-            "integrations": integrations,
-            "anonymousId": anonymous_id,
-            "timestamp": timestamp,
-            "groupId": group_id,
-            "context": context,
-            "userId": user_id,
-            "traits": traits,
-            "type": "group",
-        }
+        if traits is not None:
+            require("traits", traits, dict)
+
+        msg = SegmentMessage(
+            "group",
+            user_id=user_id,
+            anonymous_id=anonymous_id,
+            message_id=message_id,
+            timestamp=timestamp,
+            context=context,
+            integrations=integrations,
+            traits=traits,
+            group_id=group_id,
+        )
 
         return self._enqueue(msg)
 
@@ -183,29 +271,29 @@ class SegmentClient(BaseClient):
         timestamp=None,
         anonymous_id=None,
         integrations=None,
+        message_id=None,
     ):
-        properties = properties or {}
-        context = context or {}
-        integrations = integrations or {}
         require("user_id or anonymous_id", user_id or anonymous_id, ID_TYPES)
-        require("properties", properties, dict)
+        if properties is not None:
+            require("properties", properties, dict)
 
         if name:
             require("name", name, string_types)
         if category:
             require("category", category, string_types)
 
-        msg = {
-            "integrations": integrations,
-            "anonymousId": anonymous_id,
-            "properties": properties,
-            "timestamp": timestamp,
-            "category": category,
-            "context": context,
-            "userId": user_id,
-            "type": "screen",
-            "name": name,
-        }
+        msg = SegmentMessage(
+            "screen",
+            user_id=user_id,
+            anonymous_id=anonymous_id,
+            message_id=message_id,
+            timestamp=timestamp,
+            context=context,
+            integrations=integrations,
+            properties=properties,
+            name=name,
+            category=category,
+        )
 
         return self._enqueue(msg)
 
@@ -219,48 +307,49 @@ class SegmentClient(BaseClient):
         timestamp=None,
         anonymous_id=None,
         integrations=None,
+        message_id=None,
     ):
-        properties = properties or {}
-        context = context or {}
-        integrations = integrations or {}
         require("user_id or anonymous_id", user_id or anonymous_id, ID_TYPES)
-        require("properties", properties, dict)
+        if properties is not None:
+            require("properties", properties, dict)
 
         if name:
             require("name", name, string_types)
         if category:
             require("category", category, string_types)
 
-        msg = {
-            "integrations": integrations,
-            "anonymousId": anonymous_id,
-            "properties": properties,
-            "timestamp": timestamp,
-            "category": category,
-            "context": context,
-            "userId": user_id,
-            "type": "page",
-            "name": name,
-        }
+        msg = SegmentMessage(
+            "page",
+            user_id=user_id,
+            anonymous_id=anonymous_id,
+            message_id=message_id,
+            timestamp=timestamp,
+            context=context,
+            integrations=integrations,
+            properties=properties,
+            name=name,
+            category=category,
+        )
 
         return self._enqueue(msg)
 
     def _prepare_msg(self, msg):
-        timestamp = msg["timestamp"]
-        if timestamp is None:
-            timestamp = datetime.utcnow().replace(tzinfo=tzutc())
+        timestamp = msg.timestamp
 
-        require("integrations", msg["integrations"], dict)
-        require("type", msg["type"], string_types)
-        require("timestamp", timestamp, datetime)
-        require("context", msg["context"], dict)
+        if msg.integrations is not None:
+            require("integrations", msg.integrations, dict)
+        require("type", msg.type, string_types)
+        if timestamp is not None:
+            require("timestamp", timestamp, datetime)
+        if msg.context is not None:
+            require("context", msg.context, dict)
 
         # add common
-        timestamp = guess_timezone(timestamp)
-        msg["timestamp"] = timestamp.isoformat()
-        msg["messageId"] = str(uuid4())
+        msg.timestamp = to_isoformat(timestamp)
+        msg.message_id = msg.message_id or self.id_generator()
 
-        msg["userId"] = stringify_id(msg.get("userId", None))
-        msg["anonymousId"] = stringify_id(msg.get("anonymousId", None))
+        msg.user_id = stringify_id(msg.user_id)
+        msg.anonymous_id = stringify_id(msg.anonymous_id)
 
-        return clean(msg)
+        msg.clean_fields()
+        return msg
@@ -1,23 +1,33 @@
-from datetime import datetime
-
-from dateutil.tz import tzutc
-
-from fam_analytics_py.base import BaseConsumer
+from fam_analytics_py.base import BaseConsumer, is_retryable
+from fam_analytics_py.constants import Provider
+from fam_analytics_py.encoding import encode_array, encode_object, is_encoded
 from fam_analytics_py.request import post
+from fam_analytics_py.utils import clock
 
 
 class SegmentConsumer(BaseConsumer):
+    PROVIDER = Provider.segment
+
     def request(self, batch, attempt=0):
         """Attempt to upload the batch and retry before raising an error"""
+        body = {"batch": batch, "sentAt": clock.isoformat()}
+        if is_encoded(batch):
+            body = {"_data": encode_object(dict(body, batch=encode_array(batch)))}
         try:
+            self._attempt()
             post(
                 url=self.url,
                 auth=self.auth,
                 headers=self.headers,
-                batch=batch,
-                sentAt=datetime.utcnow().replace(tzinfo=tzutc()).isoformat(),
+                timeout=self.timeout,
+                rate_limiter=self.rate_limiter,
+                compact=self.compact,
+                metrics=self.metrics,
+                trace=self.trace,
+                **body
             )
-        except Exception:
-            if attempt > self.retries:
+        except Exception as e:
+            if attempt > self.retries or not is_retryable(e):
                 raise
+            self._wait_to_retry(e, attempt)
             self.request(batch, attempt + 1)
@@ -0,0 +1,128 @@
+from fam_analytics_py.message import Message
+
+
+class SegmentMessage(Message):
+    """A message of any of the Segment calls, laid out by its type."""
+
+    __slots__ = (
+        "integrations",
+        "message_id",
+        "anonymous_id",
+        "previous_id",
+        "group_id",
+        "properties",
+        "traits",
+        "timestamp",
+        "category",
+        "context",
+        "user_id",
+        "event",
+        "name",
+    )
+
+    OBJECTS = frozenset(["integrations", "properties", "traits", "context"])
+    OPTIONAL = frozenset(
+        [
+            "integrations",
+            "anonymousId",
+            "userId",
+            "properties",
+            "traits",
+            "context",
+            "category",
+            "name",
+        ]
+    )
+
+    LAYOUTS = {
+        "track": (
+            ("integrations", "integrations"),
+            ("messageId", "message_id"),
+            ("anonymousId", "anonymous_id"),
+            ("properties", "properties"),
+            ("timestamp", "timestamp"),
+            ("context", "context"),
+            ("userId", "user_id"),
+            ("type", "type"),
+            ("event", "event"),
+        ),
+        "identify": (
+            ("integrations", "integrations"),
+            ("messageId", "message_id"),
+            ("anonymousId", "anonymous_id"),
+            ("timestamp", "timestamp"),
+            ("context", "context"),
+            ("type", "type"),
+            ("userId", "user_id"),
+            ("traits", "traits"),
+        ),
+        "alias": (
+            ("integrations", "integrations"),
+            ("messageId", "message_id"),
+            ("previousId", "previous_id"),
+            ("timestamp", "timestamp"),
+            ("context", "context"),
+            ("userId", "user_id"),
+            ("type", "type"),
+            ("anonymousId", "anonymous_id"),
+        ),
+        "group": (
+            ("integrations", "integrations"),
+            ("messageId", "message_id"),
+            ("anonymousId", "anonymous_id"),
+            ("timestamp", "timestamp"),
+            ("groupId", "group_id"),
+            ("context", "context"),
+            ("userId", "user_id"),
+            ("traits", "traits"),
+            ("type", "type"),
+        ),
+        "screen": (
+            ("integrations", "integrations"),
+            ("messageId", "message_id"),
+            ("anonymousId", "anonymous_id"),
+            ("properties", "properties"),
+            ("timestamp", "timestamp"),
+            ("category", "category"),
+            ("context", "context"),
+            ("userId", "user_id"),
+            ("type", "type"),
+            ("name", "name"),
+        ),
+    }
+    LAYOUTS["page"] = LAYOUTS["screen"]
+
+    def __init__(
+        self,
+        type,
+        user_id=None,
+        anonymous_id=None,
+        message_id=None,
+        timestamp=None,
+        context=None,
+        integrations=None,
+        event=None,
+        properties=None,
+        traits=None,
+        name=None,
+        category=None,
+        group_id=None,
+        previous_id=None,
+    ):
+        self.type = type
+        self.user_id = user_id
+        self.anonymous_id = anonymous_id
+        self.message_id = message_id
+        self.timestamp = timestamp
+        self.context = context
+        self.integrations = integrations
+        self.event = event
+        self.properties = properties
+        self.traits = traits
+        self.name = name
+        self.category = category
+        self.group_id = group_id
+        self.previous_id = previous_id
+
+    def layout(self):
+        return self.LAYOUTS[self.type]
@@ -0,0 +1,206 @@
+import atexit
+import dataclasses
+import logging
+from collections import deque
+from threading import Condition, Lock, Thread
+
+from fam_analytics_py.base.consumer import drain
+from fam_analytics_py.clevertap import CleverTapClient, CleverTapConfig
+from fam_analytics_py.mixpanel import MixpanelClient, MixpanelConfig
+from fam_analytics_py.segment import SegmentClient, SegmentConfig
+
+LOGGER = logging.getLogger("fam-analytics-py")
+
+CLIENTS = {
+    CleverTapConfig: CleverTapClient,
+    MixpanelConfig: MixpanelClient,
+    SegmentConfig: SegmentClient,
+}
+
+
+class ConsumerPool(object):
+    """Threads uploading for the consumers of many clients, in turn.
+
+    Each thread takes the next consumer with queued messages, uploads one
+    batch and puts it back at the end of the line, so a tenant with a
+    backlog cannot hold the threads while the others wait. A consumer is
+    only uploaded by one thread at a time, which keeps each lane in order.
+    """
+
+    def __init__(self, workers=2, poll_interval=0.1):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.running = False
+        # consumers waiting for their turn, those being uploaded are out
+        self._ready = deque()
+        self._members = set()
+        self._cond = Condition()
+        self._threads = []
+
+    def add(self, consumers):
+        with self._cond:
+            for consumer in consumers:
+                self._members.add(consumer)
+                self._ready.append(consumer)
+            self._cond.notify_all()
+
+    def remove(self, consumers):
+        with self._cond:
+            for consumer in consumers:
+                self._members.discard(consumer)
+                if consumer in self._ready:
+                    self._ready.remove(consumer)
+
+    def start(self):
+        self.running = True
+        for _ in range(self.workers):
+            thread = Thread(target=self._run)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """Stop the threads once their current upload is done."""
+        with self._cond:
+            self.running = False
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def _claim(self):
+        """Take the next consumer with queued messages, None if there is none."""
+        with self._cond:
+            for _ in range(len(self._ready)):
+                consumer = self._ready.popleft()
+                if consumer.queue.qsize():
+                    return consumer
+                self._ready.append(consumer)
+            if self.running:
+                self._cond.wait(self.poll_interval)
+            return None
+
+    def _release(self, consumer):
+        with self._cond:
+            if consumer in self._members:
+                self._ready.append(consumer)
+                self._cond.notify()
+
+    def _run(self):
+        while self.running:
+            consumer = self._claim()
+            if consumer is None:
+                continue
+            try:
+                consumer.upload(block=False)
+            except Exception:
+                # e.g. a failing on_error callback, the thread uploads for
+                # every tenant of the provider so it must keep going
+                LOGGER.exception("error uploading for a pooled client")
+            finally:
+                self._release(consumer)
+
+
+class ClientRegistry(object):
+    """Clients created from configs and keyed by tenant, e.g. one Mixpanel
+    project or Segment write key per product line.
+
+    Every tenant keeps its own queue, credentials and rate limit, but the
+    clients of a provider share one `ConsumerPool` of `workers` threads,
+    scheduled fairly between tenants, instead of starting threads each.
+    All clients already share the HTTP connection pool of
+    `fam_analytics_py.request`.
+
+        registry = ClientRegistry()
+        registry.add("payments", MixpanelConfig(...))
+        registry.get("payments", Provider.mixpanel).track(...)
+    """
+
+    def __init__(self, workers=2, hooks=None):
+        self.workers = workers
+        self.hooks = hooks
+        self._clients = {}
+        self._pools = {}
+        self._lock = Lock()
+        atexit.register(self.join)
+
+    def add(self, tenant, config, **kwargs):
+        """Create the client of `config` for `tenant` and return it.
+
+        `kwargs` are passed on to the client's `from_config`.
+        """
+        client_class = CLIENTS.get(type(config))
+        if client_class is None:
+            raise TypeError("unsupported config: {0!r}".format(config))
+        key = (tenant, client_class.PROVIDER)
+
+        # the pool uploads for the client instead of its own threads
+        pooled = config.start_consumer and not config.manual_flush
+        if pooled:
+            config = dataclasses.replace(config, manual_flush=True)
+        kwargs.setdefault("hooks", self.hooks)
+
+        with self._lock:
+            if key in self._clients:
+                raise ValueError("tenant {0} already has a {1} client".format(*key))
+            client = client_class.from_config(config, **kwargs)
+            self._clients[key] = client
+            if pooled:
+                self._pool(client.PROVIDER).add(client.consumers)
+        return client
+
+    def _pool(self, provider):
+        pool = self._pools.get(provider)
+        if pool is None:
+            pool = self._pools[provider] = ConsumerPool(self.workers)
+            pool.start()
+        return pool
+
+    def get(self, tenant, provider):
+        """Return the `provider` client of `tenant`."""
+        try:
+            return self._clients[(tenant, provider)]
+        except KeyError:
+            raise KeyError("no {1} client for tenant {0}".format(tenant, provider))
+
+    def clients(self, tenant):
+        """Return the clients of `tenant`, by provider."""
+        return {
+            provider: client
+            for (name, provider), client in self._clients.items()
+            if name == tenant
+        }
+
+    def tenants(self):
+        return list(dict.fromkeys(tenant for tenant, _ in self._clients))
+
+    def remove(self, tenant):
+        """Flush the clients of `tenant` and stop uploading for them."""
+        with self._lock:
+            clients = {
+                key: client for key, client in self._clients.items() if key[0] == tenant
+            }
+            for (_, provider), client in clients.items():
+                del self._clients[(tenant, provider)]
+                pool = self._pools.get(provider)
+                if pool is not None:
+                    pool.remove(client.consumers)
+        self._flush(clients.values())
+
+    def flush(self):
+        """Upload everything queued by every tenant before returning."""
+        self._flush(list(self._clients.values()))
+
+    def _flush(self, clients):
+        consumers = [consumer for client in clients for consumer in client.consumers]
+        # every lane at once from this thread, taking turns with the pool
+        # workers on each lane, then wait for the batches they were uploading
+        drain(consumers)
+        for consumer in consumers:
+            consumer.queue.join()
+
+    def join(self):
+        """Stop the pool threads. Blocks until their uploads are done."""
+        for pool in list(self._pools.values()):
+            pool.stop()
+        self._pools = {}
@@ -0,0 +1,47 @@
+"""OpenTelemetry spans for uploads, used when `opentelemetry-api` is installed.
+
+Each queued message keeps a link to the span that was current when it was
+enqueued, e.g. the web request that tracked it. The upload of a batch is a
+span linked to all of them, and its trace context is propagated to the
+provider in the request headers.
+"""
+
+try:
+    from opentelemetry import propagate, trace
+except ImportError:
+    propagate = None
+    trace = None
+
+TRACER_NAME = "fam_analytics_py"
+
+
+def available():
+    return trace is not None
+
+
+def current_link():
+    """Return a link to the caller's span, None if there is none."""
+    span_context = trace.get_current_span().get_span_context()
+    if not span_context.is_valid:
+        return None
+    return trace.Link(span_context)
+
+
+def upload_span(provider, lane, size, links):
+    """Return a context manager spanning the upload of a batch."""
+    attributes = {"analytics.provider": provider or "", "analytics.batch_size": size}
+    if lane is not None:
+        attributes["analytics.lane"] = lane
+    return trace.get_tracer(TRACER_NAME).start_as_current_span(
+        "analytics upload",
+        kind=trace.SpanKind.CLIENT,
+        links=links,
+        attributes=attributes,
+    )
+
+
+def inject(headers):
+    """Return a copy of `headers` carrying the current trace context."""
+    headers = dict(headers)
+    propagate.inject(headers)
+    return headers
@@ -0,0 +1,87 @@
+import json
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from fam_analytics_py.metrics import Metrics, ratio
+from fam_analytics_py.utils import DatetimeSerializer
+
+
+def hash_trait(value):
+    """Return a compact fingerprint of a trait value."""
+    try:
+        # the type keeps e.g. `1`, `1.0` and `True` apart
+        return hash((type(value), value))
+    except TypeError:
+        return hash(
+            json.dumps(value, sort_keys=True, cls=DatetimeSerializer, default=str)
+        )
+
+
+class TraitCache(object):
+    """Remembers a fingerprint of the traits last sent for each user.
+
+    `diff()` returns only the traits that changed since the previous call for
+    the same user. Users are evicted least recently used first once
+    `max_users` is reached, and forgotten `ttl` seconds after they were first
+    cached so every trait is re-sent periodically.
+    """
+
+    def __init__(self, max_users=100000, ttl=3600):
+        self.max_users = max_users
+        self.ttl = ttl
+        self._lock = Lock()
+        # user_id -> (expires_at, {trait: fingerprint})
+        self._users = OrderedDict()
+
+        self.metrics = Metrics()
+        self.metrics.register_gauge("size", lambda: len(self._users))
+        self.metrics.register_gauge(
+            "hit_rate",
+            lambda: ratio(self.metrics.get("hits"), self.metrics.get("lookups")),
+        )
+
+    def __len__(self):
+        return len(self._users)
+
+    def diff(self, user_id, traits):
+        """Record `traits` for `user_id`, returning those that changed."""
+        hashes = {key: hash_trait(value) for key, value in traits.items()}
+        # payloads carry the ID as a string, see `forget()`
+        user_id = str(user_id)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is None or entry[0] <= now:
+                entry = (now + self.ttl, {})
+                self._users[user_id] = entry
+                if len(self._users) > self.max_users:
+                    self._users.popitem(last=False)
+            else:
+                self._users.move_to_end(user_id)
+
+            known = entry[1]
+            changed = {}
+            for key, fingerprint in hashes.items():
+                if known.get(key) != fingerprint:
+                    known[key] = fingerprint
+                    changed[key] = traits[key]
+
+        self.metrics.incr("lookups")
+        if not changed:
+            self.metrics.incr("hits")
+        elif len(changed) < len(traits):
+            self.metrics.incr("partial_hits")
+        else:
+            self.metrics.incr("misses")
+        return changed
+
+    def forget(self, user_id):
+        """Drop what is known about `user_id`, e.g. after a failed upload."""
+        with self._lock:
+            self._users.pop(str(user_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._users.clear()
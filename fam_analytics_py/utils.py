@@ -1,14 +1,21 @@
 import json
 import logging
 import numbers
-from datetime import date, datetime, timedelta
+import time
+from datetime import date, datetime, timedelta, timezone
 from decimal import Decimal
 
 import six
-from dateutil.tz import tzlocal, tzutc
+from dateutil.tz import tzlocal
 
 LOGGER = logging.getLogger("fam-analytics-py")
 
+# Timezones are immutable, so build them once instead of once per message.
+# `timezone.utc` is implemented in C and is much cheaper to format than
+# dateutil's `tzutc`.
+UTC = timezone.utc
+LOCAL_TZ = tzlocal()
+
 
 def require(name, field, data_type):
     """Require that the named `field` has the right `data_type`"""
@@ -37,10 +44,10 @@ def guess_timezone(dt: datetime):
         if get_total_seconds(delta) < timezone_diff_threshold_seconds:
             # this was created using datetime.datetime.now()
             # so we are in the local timezone
-            return dt.replace(tzinfo=tzlocal())
+            return dt.replace(tzinfo=LOCAL_TZ)
         else:
             # at this point, the best we can do is guess UTC
-            return dt.replace(tzinfo=tzutc())
+            return dt.replace(tzinfo=UTC)
 
     return dt
 
@@ -56,6 +63,65 @@ def get_total_seconds(delta: timedelta):
     return (delta.microseconds + (delta.seconds + delta.days * 24 * 3600) * 1e6) / 1e6
 
 
+class CoarseClock(object):
+    """A clock that re-reads the system time at most once per `resolution`.
+
+    Under load many messages are stamped within the same millisecond; they
+    share one reading and each rendering of it is produced at most once.
+    """
+
+    def __init__(self, resolution=0.001):
+        self.resolution = resolution
+        # [epoch, datetime, isoformat]; renderings are filled lazily. The list
+        # is swapped as a whole so concurrent readers never see a torn tick.
+        self._tick = [0.0, None, None]
+
+    def _current(self):
+        now = time.time()
+        tick = self._tick
+        if now - tick[0] >= self.resolution or now < tick[0]:
+            tick = [now, None, None]
+            self._tick = tick
+        return tick
+
+    def epoch(self):
+        """Return the current time in seconds since the epoch."""
+        return self._current()[0]
+
+    def now(self):
+        """Return the current time as an aware UTC datetime."""
+        tick = self._current()
+        if tick[1] is None:
+            tick[1] = datetime.fromtimestamp(tick[0], UTC)
+        return tick[1]
+
+    def isoformat(self):
+        """Return the current time as an ISO-8601 string."""
+        tick = self._current()
+        if tick[2] is None:
+            if tick[1] is None:
+                tick[1] = datetime.fromtimestamp(tick[0], UTC)
+            tick[2] = tick[1].isoformat()
+        return tick[2]
+
+
+clock = CoarseClock()
+
+
+def to_epoch_seconds(dt=None):
+    """Return `dt`, or now when it is None, as whole seconds since the epoch."""
+    if dt is None:
+        return int(clock.epoch())
+    return int(guess_timezone(dt).timestamp())
+
+
+def to_isoformat(dt=None):
+    """Return `dt`, or now when it is None, as an ISO-8601 string."""
+    if dt is None:
+        return clock.isoformat()
+    return guess_timezone(dt).isoformat()
+
+
 def remove_trailing_slash(host):
     if host.endswith("/"):
         return host[:-1]
@@ -0,0 +1,151 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+from fam_analytics_py.backfill import (
+    Backfill,
+    BackfillError,
+    Checkpoint,
+    main,
+    parse_timestamp,
+    read_records,
+    record_id,
+)
+from fam_analytics_py.segment import SegmentClient, SegmentConfig
+
+from . import MockResponse
+
+
+class TestBackfill(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.path = os.path.join(self.dir, "events.jsonl")
+        with open(self.path, "w") as f:
+            for i in range(5):
+                record = {
+                    "user_id": "user-{0}".format(i),
+                    "event": "signup",
+                    "timestamp": "2020-01-0{0}T00:00:00".format(i + 1),
+                    "properties": {"n": i},
+                }
+                f.write(json.dumps(record) + "\n")
+        self.checkpoint = Checkpoint(
+            os.path.join(self.dir, "checkpoint"), self.path, "segment"
+        )
+
+    def backfill(self):
+        config = SegmentConfig(write_key="testsecret", upload_size=2, retries=0)
+        return Backfill("segment", config, checkpoint=self.checkpoint, workers=1)
+
+    @patch("requests.Session.post")
+    def test_batches_and_checkpoints(self, mocked_function):
+        mocked_function.return_value = MockResponse({}, status_code=200)
+
+        stats = self.backfill().run(read_records(self.path))
+
+        self.assertEqual(stats["records"], 5)
+        batches = [
+            json.loads(call[1]["data"])["batch"]
+            for call in mocked_function.call_args_list
+        ]
+        self.assertEqual([len(batch) for batch in batches], [2, 2, 1])
+        first = batches[0][0]
+        self.assertEqual(first["userId"], "user-0")
+        self.assertEqual(first["timestamp"], "2020-01-01T00:00:00+00:00")
+        self.assertEqual(first["properties"], {"n": 0})
+        self.assertEqual(self.checkpoint.load(), 5)
+
+    @patch("requests.Session.post")
+    def test_stable_message_ids(self, mocked_function):
+        mocked_function.return_value = MockResponse({}, status_code=200)
+        self.checkpoint.path = None
+        self.backfill().run(read_records(self.path))
+        self.backfill().run(read_records(self.path))
+
+        ids = [
+            msg["messageId"]
+            for call in mocked_function.call_args_list
+            for msg in json.loads(call[1]["data"])["batch"]
+        ]
+        self.assertEqual(len(set(ids)), 5)
+        self.assertEqual(ids[:5], ids[5:])
+
+    @patch("requests.Session.post")
+    def test_resumes_after_failure(self, mocked_function):
+        mocked_function.side_effect = [
+            MockResponse({}, status_code=200),
+            MockResponse({}, status_code=500),
+        ]
+        with self.assertRaises(BackfillError):
+            self.backfill().run(read_records(self.path))
+        self.assertEqual(self.checkpoint.load(), 2)
+
+        mocked_function.side_effect = None
+        mocked_function.return_value = MockResponse({}, status_code=200)
+        stats = self.backfill().run(read_records(self.path))
+        self.assertEqual(stats["records"], 3)
+
+    def test_checkpoint_of_another_backfill(self):
+        self.checkpoint.save(2)
+        other = Checkpoint(self.checkpoint.path, self.path, "mixpanel")
+        self.assertRaises(BackfillError, other.load)
+
+    @patch("requests.Session.post")
+    def test_payloads_match_the_consumer(self, mocked_function):
+        mocked_function.return_value = MockResponse({}, status_code=200)
+        config = SegmentConfig(
+            write_key="testsecret", compact_encoding=True, manual_flush=True
+        )
+        (record,) = list(read_records(self.path))[:1]
+
+        client = SegmentClient.from_config(config)
+        client.track(
+            user_id=record["user_id"],
+            event=record["event"],
+            properties=record["properties"],
+            timestamp=parse_timestamp(record["timestamp"]),
+            message_id=record_id(record),
+        )
+        client.flush()
+        backfill = Backfill("segment", config, workers=1)
+        backfill.run(iter([record]))
+
+        sent, backfilled = [
+            json.loads(call[1]["data"])["batch"]
+            for call in mocked_function.call_args_list
+        ]
+        self.assertEqual(backfilled, sent)
+        self.assertNotIn("integrations", backfilled[0])
+        # manual_flush is ignored, nothing is left queued
+        self.assertEqual(backfill.client.queue.qsize(), 0)
+
+    @patch("requests.Session.post")
+    def test_skips_invalid_records(self, mocked_function):
+        mocked_function.return_value = MockResponse({}, status_code=200)
+        records = [{"event": "signup"}, {"user_id": "u", "event": "signup"}]
+        stats = self.backfill().run(iter(records))
+        self.assertEqual(stats["invalid"], 1)
+        self.assertEqual(stats["records"], 1)
+
+    def test_csv_columns_become_properties(self):
+        path = os.path.join(self.dir, "events.csv")
+        with open(path, "w") as f:
+            f.write("user_id,event,timestamp,plan\nu1,signup,1577836800,pro\n")
+        (record,) = read_records(path)
+        self.assertEqual(record["properties"], {"plan": "pro"})
+        self.assertEqual(
+            parse_timestamp(record["timestamp"]),
+            datetime(2020, 1, 1, tzinfo=timezone.utc),
+        )
+
+    @patch("requests.Session.post")
+    def test_main(self, mocked_function):
+        mocked_function.return_value = MockResponse({}, status_code=200)
+        status = main([self.path, "--provider", "segment", "--write-key", "testsecret"])
+        self.assertEqual(status, 0)
+        self.assertTrue(os.path.exists(self.path + ".segment.checkpoint"))
@@ -2,7 +2,8 @@ import unittest
 from queue import Queue
 from unittest.mock import Mock
 
-from fam_analytics_py.base import BaseClient, BaseConsumer
+from fam_analytics_py.base import BaseClient, BaseConsumer, is_rejection, is_retryable
+from fam_analytics_py.exceptions import APIError
 
 
 class TestBaseClient(unittest.TestCase):
@@ -78,3 +79,91 @@ class TestBaseConsumer(unittest.TestCase):
     def test_unimplemented_request(self):
         with self.assertRaises(NotImplementedError):
             self.consumer.request(batch=[])
+
+
+class RejectingConsumer(BaseConsumer):
+    """Rejects every batch holding a "bad" message, like a provider 400."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.requests = []
+        self.delivered = []
+
+    def request(self, batch, attempt=0):
+        self.requests.append(list(batch))
+        if "bad" in batch:
+            raise APIError(self.url, 400, "invalid", "bad message")
+        self.delivered.extend(batch)
+
+
+class TestBisect(unittest.TestCase):
+    def get_consumer(self, items, **kwargs):
+        q = Queue()
+        for item in items:
+            q.put(item)
+        self.dead_letters = []
+        self.errors = []
+        return RejectingConsumer(
+            q,
+            url="",
+            auth="",
+            headers={},
+            on_error=lambda e, batch: self.errors.append(batch),
+            on_dead_letter=lambda e, batch: self.dead_letters.append(batch),
+            **kwargs,
+        )
+
+    def test_is_retryable(self):
+        self.assertFalse(is_retryable(APIError("", 400, "", "")))
+        self.assertFalse(is_retryable(APIError("", 413, "", "")))
+        self.assertTrue(is_retryable(APIError("", 429, "", "")))
+        self.assertTrue(is_retryable(APIError("", 503, "", "")))
+        self.assertTrue(is_retryable(ConnectionError()))
+
+    def test_is_rejection(self):
+        self.assertTrue(is_rejection(APIError("", 400, "", "")))
+        self.assertTrue(is_rejection(APIError("", 422, "", "")))
+        self.assertFalse(is_rejection(APIError("", 401, "", "")))
+        self.assertFalse(is_rejection(APIError("", 503, "", "")))
+        self.assertFalse(is_rejection(ConnectionError()))
+
+    def test_quarantines_bad_messages(self):
+        items = list(range(8))
+        items[5] = "bad"
+        consumer = self.get_consumer(items)
+
+        self.assertFalse(consumer.upload())
+        self.assertEqual(sorted(consumer.delivered), [0, 1, 2, 3, 4, 6, 7])
+        self.assertEqual(self.dead_letters, [["bad"]])
+        self.assertEqual(self.errors, [])
+        # 1 + 2 per split over 3 levels
+        self.assertEqual(len(consumer.requests), 7)
+        self.assertEqual(consumer.queue.unfinished_tasks, 0)
+
+    def test_bisect_budget(self):
+        items = list(range(8))
+        items[5] = "bad"
+        consumer = self.get_consumer(items, max_bisect_requests=2)
+
+        consumer.upload()
+        self.assertEqual(sorted(consumer.delivered), [0, 1, 2, 3])
+        self.assertEqual(self.dead_letters, [[4, "bad", 6, 7]])
+        self.assertEqual(len(consumer.requests), 3)
+
+    def test_retryable_errors_are_not_bisected(self):
+        consumer = self.get_consumer([1, 2])
+        consumer.request = Mock(side_effect=APIError("", 503, "", ""))
+
+        consumer.upload()
+        self.assertEqual(consumer.request.call_count, 1)
+        self.assertEqual(self.errors, [[1, 2]])
+
+    def test_auth_errors_are_not_bisected(self):
+        consumer = self.get_consumer([1, 2, 3, 4])
+        consumer.request = Mock(side_effect=APIError("", 401, "", "bad key"))
+
+        self.assertFalse(consumer.upload())
+        self.assertEqual(consumer.request.call_count, 1)
+        # failed as a whole, to be replayed once the credentials are fixed
+        self.assertEqual(self.errors, [[1, 2, 3, 4]])
+        self.assertEqual(self.dead_letters, [])
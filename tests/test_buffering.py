@@ -0,0 +1,138 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+
+import fam_analytics_py
+from fam_analytics_py import globals
+from fam_analytics_py.base import LaneQueue
+from fam_analytics_py.buffering import buffered
+from fam_analytics_py.middleware import (
+    ASGIMiddleware,
+    DjangoMiddleware,
+    WSGIMiddleware,
+)
+from fam_analytics_py.segment import SegmentConfig
+
+
+class TestBuffered(unittest.TestCase):
+    def setUp(self):
+        globals._segment_client = None
+        fam_analytics_py.initialize(
+            segment_config=SegmentConfig(write_key="testsecret", start_consumer=False)
+        )
+        self.client = globals.get_segment_client()
+        # queue without a consumer thread
+        self.client.send = True
+        self.queue = self.client.queue
+
+    def tearDown(self):
+        globals._segment_client = None
+
+    def test_queued_on_exit(self):
+        with patch.object(self.queue, "put") as put, buffered() as buffer:
+            fam_analytics_py.track("userId", "first")
+            fam_analytics_py.identify("userId", {"trait": "value"})
+            self.assertEqual(len(buffer), 2)
+            self.assertEqual(self.queue.qsize(), 0)
+
+        put.assert_not_called()
+        self.assertEqual(self.queue.qsize(), 2)
+        self.assertEqual(self.queue.get_nowait()["event"], "first")
+        self.assertEqual(self.queue.get_nowait()["type"], "identify")
+
+    def test_dropped_on_exception(self):
+        with self.assertRaises(RuntimeError):
+            with buffered():
+                fam_analytics_py.track("userId", "event")
+                raise RuntimeError("rollback")
+        self.assertEqual(self.queue.qsize(), 0)
+
+    def test_validated_when_called(self):
+        with buffered():
+            with self.assertRaises(AssertionError):
+                fam_analytics_py.track(None, "event")
+            fam_analytics_py.track("userId", "event")
+        self.assertEqual(self.queue.qsize(), 1)
+
+    def test_nested_blocks_join_the_outermost(self):
+        with buffered() as outer:
+            with buffered():
+                fam_analytics_py.track("userId", "inner")
+            self.assertEqual(self.queue.qsize(), 0)
+            outer.discard()
+        self.assertEqual(self.queue.qsize(), 0)
+
+    def test_discard_forgets_cached_traits(self):
+        globals.trait_cache = fam_analytics_py.TraitCache()
+        with buffered() as buffer:
+            fam_analytics_py.identify("userId", {"trait": "value"})
+            buffer.discard()
+
+        fam_analytics_py.identify("userId", {"trait": "value"})
+        self.assertEqual(self.queue.get_nowait()["traits"], {"trait": "value"})
+
+    def test_full_queue(self):
+        self.client.queue = LaneQueue(1, reserve=0)
+        with buffered():
+            fam_analytics_py.track("userId", "first")
+            fam_analytics_py.track("userId", "second")
+        self.assertEqual(self.client.queue.qsize(), 1)
+
+
+class TestMiddleware(unittest.TestCase):
+    def setUp(self):
+        globals._segment_client = None
+        fam_analytics_py.initialize(
+            segment_config=SegmentConfig(write_key="testsecret", start_consumer=False)
+        )
+        client = globals.get_segment_client()
+        client.send = True
+        self.queue = client.queue
+
+    def tearDown(self):
+        globals._segment_client = None
+
+    def wsgi_app(self, status):
+        def app(environ, start_response):
+            fam_analytics_py.track("userId", "request")
+            start_response(status, [])
+            return [b""]
+
+        return app
+
+    def test_wsgi(self):
+        app = WSGIMiddleware(self.wsgi_app("200 OK"))
+        self.assertEqual(app({}, lambda *args: None), [b""])
+        self.assertEqual(self.queue.qsize(), 1)
+
+        app = WSGIMiddleware(self.wsgi_app("500 Internal Server Error"))
+        app({}, lambda *args: None)
+        self.assertEqual(self.queue.qsize(), 1)
+
+    def test_asgi(self):
+        async def app(scope, receive, send):
+            fam_analytics_py.track("userId", "request")
+            await send({"type": "http.response.start", "status": scope["status"]})
+
+        async def send(message):
+            pass
+
+        asyncio.run(ASGIMiddleware(app)({"type": "http", "status": 200}, None, send))
+        self.assertEqual(self.queue.qsize(), 1)
+        asyncio.run(ASGIMiddleware(app)({"type": "http", "status": 503}, None, send))
+        self.assertEqual(self.queue.qsize(), 1)
+
+    def test_django(self):
+        class Response(object):
+            status_code = 200
+
+        def get_response(request):
+            fam_analytics_py.track("userId", "request")
+            return Response()
+
+        DjangoMiddleware(get_response)(None)
+        self.assertEqual(self.queue.qsize(), 1)
+
+        Response.status_code = 500
+        DjangoMiddleware(get_response)(None)
+        self.assertEqual(self.queue.qsize(), 1)
@@ -2,7 +2,7 @@ import json
 import unittest
 from datetime import datetime, date
 from queue import Queue
-from unittest.mock import patch
+from unittest.mock import Mock, patch
 
 import pytz
 
@@ -253,6 +253,40 @@ class TestCleverTapClient(unittest.TestCase):
             timeout=15,
         )
 
+    @patch("requests.Session.post")
+    def test_serialized_request_body(self, mocked_function):
+        mocked_function.return_value = MockResponse({}, status_code=200)
+
+        client = CleverTapClient(
+            credentials={
+                "clevertap_account_id": "",
+                "clevertap_passcode": "",
+            },
+            on_error=self.fail,
+            serialize=True,
+            max_queue_bytes=100000,
+        )
+        client.track("abcd", event="testing", properties={"a": 1})
+        client.flush()
+        self.assertFalse(self.failed)
+
+        data = mocked_function.call_args[1]["data"]
+        self.assertIsInstance(data, bytes)
+        (record,) = json.loads(data)["d"]
+        self.assertEqual(record["evtName"], "testing")
+        self.assertEqual(record["evtData"], {"a": 1})
+        self.assertEqual(client.queue.nbytes(), 0)
+
+    def test_max_queue_bytes_requires_serialize(self):
+        with self.assertRaises(ValueError):
+            CleverTapClient(
+                credentials={
+                    "clevertap_account_id": "",
+                    "clevertap_passcode": "",
+                },
+                max_queue_bytes=100000,
+            )
+
 
 class TestCleverTapConsumer(unittest.TestCase):
     def test_next(self):
@@ -364,3 +398,55 @@ class TestCleverTapConsumer(unittest.TestCase):
         with self.assertRaises(Exception):
             track = {"type": "track", "event": "python event", "userId": "userId"}
             consumer.request(track, attempt=4)
+
+    @patch("fam_analytics_py.base.consumer.time.sleep")
+    @patch("requests.Session.post")
+    def test_resends_only_unprocessed_records(self, mocked_function, sleep):
+        ok = {"type": "event", "evtName": "ok", "identity": "userId"}
+        busy = {"type": "event", "evtName": "busy", "identity": "userId"}
+        invalid = {"type": "event", "evtName": "invalid", "identity": "userId"}
+        mocked_function.side_effect = [
+            MockResponse(
+                {
+                    "status": "partial",
+                    "processed": 1,
+                    "unprocessed": [
+                        {"status": "fail", "code": 429, "record": busy},
+                        {
+                            "status": "fail",
+                            "code": 512,
+                            "error": "bad",
+                            "record": invalid,
+                        },
+                    ],
+                },
+                status_code=200,
+            ),
+            MockResponse({"status": "success", "processed": 1}, status_code=200),
+        ]
+        dead_letters = []
+        rate_limiter = Mock()
+        rate_limiter.acquire.return_value = 0
+
+        consumer = CleverTapConsumer(
+            None,
+            write_key=None,
+            url="https://in1.api.clevertap.com/1/upload",
+            auth="",
+            headers={},
+            on_dead_letter=lambda e, records: dead_letters.append((e, records)),
+            rate_limiter=rate_limiter,
+        )
+        consumer.request([ok, busy, invalid])
+
+        self.assertEqual(mocked_function.call_count, 2)
+        resent = json.loads(mocked_function.call_args[1]["data"])
+        self.assertEqual(resent, {"d": [busy]})
+        # resent after backing off, paced like any other upload
+        sleep.assert_called_once_with(0.5)
+        rate_limiter.acquire.assert_any_call(events=1)
+        self.assertEqual(len(dead_letters), 1)
+        error, records = dead_letters[0]
+        self.assertEqual(records, [invalid])
+        self.assertEqual((error.code, error.message), (512, "bad"))
+        self.assertEqual(consumer.metrics.get("records_dead_lettered"), 1)
@@ -0,0 +1,104 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from queue import Queue
+from unittest.mock import patch
+
+from fam_analytics_py.backfill import Checkpoint
+from fam_analytics_py.dead_letter import DeadLetterStore
+from fam_analytics_py.replay import Replay, ReplayError
+from fam_analytics_py.segment import SegmentConfig, SegmentConsumer
+
+from . import MockResponse
+
+
+class TestDeadLetterStore(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.store = DeadLetterStore(os.path.join(self.dir, "dead_letters.jsonl"))
+        self.addCleanup(self.store.close)
+
+    def consumer(self):
+        return SegmentConsumer(
+            Queue(),
+            write_key="testsecret",
+            url="https://api.segment.io/v1/batch",
+            auth="",
+            headers={},
+            retries=1,
+            dead_letter_store=self.store,
+        )
+
+    @patch("fam_analytics_py.base.consumer.time.sleep")
+    @patch("requests.Session.post")
+    def test_records_exhausted_batches(self, mocked_function, mocked_sleep):
+        mocked_function.return_value = MockResponse(
+            {"code": "error", "message": "down"}, status_code=500
+        )
+        self.assertFalse(self.consumer().send([{"userId": "a"}, {"userId": "b"}]))
+
+        (entry,) = self.store.read()
+        self.assertEqual(entry["provider"], "segment")
+        self.assertEqual(entry["kind"], "failed")
+        self.assertEqual(entry["attempts"], 3)
+        self.assertEqual(entry["error"]["status"], 500)
+        self.assertEqual(entry["records"], [{"userId": "a"}, {"userId": "b"}])
+
+    @patch("requests.Session.post")
+    def test_records_rejected_batches(self, mocked_function):
+        mocked_function.return_value = MockResponse(
+            {"code": "invalid", "message": "bad"}, status_code=400
+        )
+        self.consumer().send([{"userId": "a"}])
+
+        (entry,) = self.store.read()
+        self.assertEqual(entry["kind"], "rejected")
+        self.assertEqual(entry["error"]["code"], "invalid")
+
+
+class TestReplay(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.path = os.path.join(self.dir, "dead_letters.jsonl")
+        store = DeadLetterStore(self.path)
+        for i in range(3):
+            records = [{"userId": "user-{0}".format(i), "type": "track"}]
+            store.write("segment", "failed", records, ValueError("down"))
+        store.write("segment", "rejected", [{"bad": True}], ValueError("bad"))
+        store.write("mixpanel", "failed", [{"event": "e"}], ValueError("down"))
+        store.close()
+        self.checkpoint = Checkpoint(
+            os.path.join(self.dir, "replayed"), self.path, "segment"
+        )
+
+    def replay(self):
+        config = SegmentConfig(write_key="testsecret", upload_size=2, retries=0)
+        return Replay("segment", config, checkpoint=self.checkpoint)
+
+    @patch("requests.Session.post")
+    def test_merges_failed_batches(self, mocked_function):
+        mocked_function.return_value = MockResponse({}, status_code=200)
+        stats = self.replay().run(DeadLetterStore(self.path).read())
+
+        self.assertEqual(stats["entries"], 3)
+        batches = [
+            [msg["userId"] for msg in json.loads(call[1]["data"])["batch"]]
+            for call in mocked_function.call_args_list
+        ]
+        self.assertEqual(batches, [["user-0", "user-1"], ["user-2"]])
+        self.assertEqual(self.checkpoint.load(), 5)
+
+    @patch("requests.Session.post")
+    def test_resumes_after_failure(self, mocked_function):
+        mocked_function.return_value = MockResponse({}, status_code=503)
+        with self.assertRaises(ReplayError):
+            self.replay().run(DeadLetterStore(self.path).read())
+        self.assertEqual(self.checkpoint.load(), 0)
+
+        mocked_function.return_value = MockResponse({}, status_code=200)
+        stats = self.replay().run(DeadLetterStore(self.path).read())
+        self.assertEqual(stats["records"], 3)
@@ -0,0 +1,37 @@
+import json
+import unittest
+from datetime import datetime
+
+from fam_analytics_py.encoding import (
+    decode,
+    encode,
+    encode_array,
+    encode_object,
+    is_encoded,
+)
+
+
+class TestEncoding(unittest.TestCase):
+    def test_round_trip(self):
+        msg = {"event": "signup", "timestamp": datetime(2014, 9, 3)}
+        record = encode(msg)
+        self.assertIsInstance(record, bytes)
+        self.assertEqual(decode(record), {**msg, "timestamp": "2014-09-03T00:00:00"})
+        self.assertIs(decode(msg), msg)
+
+    def test_join_without_decoding(self):
+        records = [encode({"n": i}) for i in range(3)]
+        self.assertTrue(is_encoded(records))
+        self.assertFalse(is_encoded([]))
+
+        body = encode_object({"batch": encode_array(records), "sentAt": "now"})
+        self.assertEqual(
+            json.loads(body),
+            {"batch": [{"n": 0}, {"n": 1}, {"n": 2}], "sentAt": "now"},
+        )
+
+    def test_mixed_records(self):
+        self.assertEqual(
+            json.loads(encode_array([encode({"n": 0}), {"n": 1}])),
+            [{"n": 0}, {"n": 1}],
+        )
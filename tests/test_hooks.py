@@ -0,0 +1,255 @@
+import json
+import unittest
+from unittest.mock import patch
+
+import fam_analytics_py
+from fam_analytics_py import globals
+from fam_analytics_py.constants import Provider
+from fam_analytics_py.hooks import NO_HOOKS, Hooks, ProfilingHook
+from fam_analytics_py.segment import SegmentClient, SegmentConfig
+
+from . import MockResponse
+
+
+def scrub(provider, msg):
+    msg["properties"].pop("email", None)
+    return msg
+
+
+class TestHooks(unittest.TestCase):
+    def test_unused_stages_compile_to_none(self):
+        pipeline = Hooks(before_enqueue=scrub).compile()
+        self.assertIs(pipeline.before_enqueue, scrub)
+        self.assertIsNone(pipeline.on_batch_built)
+        self.assertIsNone(pipeline.on_drop)
+        self.assertIsNone(NO_HOOKS.before_send)
+
+    def test_compile_is_cached(self):
+        hooks = Hooks()
+        pipeline = hooks.compile()
+        self.assertIs(hooks.compile(), pipeline)
+        hooks.register("on_drop", lambda provider, records, reason: None)
+        self.assertIsNot(hooks.compile(), pipeline)
+
+    def test_chain_stops_at_none(self):
+        calls = []
+
+        def drop(provider, msg):
+            calls.append("drop")
+
+        def never(provider, msg):
+            calls.append("never")
+            return msg
+
+        chain = Hooks(before_enqueue=[drop, never]).compile().before_enqueue
+        self.assertIsNone(chain(Provider.segment, {}))
+        self.assertEqual(calls, ["drop"])
+
+    def test_unknown_stage(self):
+        self.assertRaises(ValueError, Hooks().register, "after_send", scrub)
+
+    def test_add_registers_methods_by_stage(self):
+        hooks = Hooks()
+        hooks.add(ProfilingHook())
+        pipeline = hooks.compile()
+        self.assertIsNone(pipeline.before_enqueue)
+        self.assertIsNotNone(pipeline.on_batch_built)
+        self.assertIsNotNone(pipeline.after_response)
+
+
+class TestClientHooks(unittest.TestCase):
+    def client(self, hooks, **kwargs):
+        client = SegmentClient("testsecret", send=False, hooks=hooks, **kwargs)
+        client.send = True
+        return client
+
+    def test_before_enqueue(self):
+        dropped = []
+        hooks = Hooks(
+            before_enqueue=[
+                scrub,
+                lambda provider, msg: None if msg["event"] == "skip" else msg,
+            ],
+            on_drop=lambda provider, records, reason: dropped.append(
+                (provider, len(records), reason)
+            ),
+        )
+        client = self.client(hooks)
+
+        success, msg = client.track("userId", "kept", {"email": "a@b.c"})
+        self.assertTrue(success)
+        self.assertEqual(msg["properties"], {})
+        success, _ = client.track("userId", "skip")
+        self.assertFalse(success)
+
+        self.assertEqual(client.queue.qsize(), 1)
+        self.assertEqual(dropped, [(Provider.segment, 1, "hook")])
+
+    def test_queue_full_is_dropped(self):
+        dropped = []
+        hooks = Hooks(
+            on_drop=lambda provider, records, reason: dropped.append(
+                (len(records), reason)
+            )
+        )
+        client = self.client(hooks, max_queue_size=1)
+        client.consumer.pause()
+        client.track("userId", "first")
+        client.track("userId", "second")
+        client.track_many(
+            [
+                {"user_id": "userId", "event": "third"},
+                {"user_id": "userId", "event": "fourth"},
+            ]
+        )
+        self.assertEqual(dropped, [(1, "queue_full"), (2, "queue_full")])
+
+    @patch("requests.Session.post")
+    def test_batch_stages(self, mocked_function):
+        mocked_function.return_value = MockResponse({}, status_code=200)
+        calls = []
+
+        def on_batch_built(provider, batch):
+            calls.append(("built", len(batch)))
+            return batch[:1]
+
+        hooks = Hooks(
+            on_batch_built=on_batch_built,
+            before_send=lambda provider, batch: calls.append(("send", len(batch))),
+            after_response=lambda provider, batch, success: calls.append(
+                ("response", success)
+            ),
+        )
+        client = self.client(hooks)
+        client.track("userId", "first")
+        client.track("userId", "second")
+        self.assertTrue(client.consumer.upload(block=False))
+
+        self.assertEqual(calls, [("built", 2), ("send", 1), ("response", True)])
+        self.assertEqual(
+            len(json.loads(mocked_function.call_args[1]["data"])["batch"]), 1
+        )
+        # every message taken from the queue is acknowledged
+        self.assertEqual(client.queue.unfinished_tasks, 0)
+
+    @patch("requests.Session.post")
+    def test_batch_hooks_get_payloads(self, mocked_function):
+        mocked_function.return_value = MockResponse({}, status_code=200)
+        batches = []
+
+        def scrub_batch(provider, batch):
+            batches.append(batch)
+            return [scrub(provider, msg) for msg in batch]
+
+        # measures batches by their encoded size
+        config = SegmentConfig(write_key="testsecret", manual_flush=True)
+        client = SegmentClient.from_config(
+            config, hooks=Hooks(on_batch_built=scrub_batch)
+        )
+        client.track("userId", "python test event", {"email": "a@b.c"})
+        self.assertTrue(client.consumer.upload(block=False))
+
+        self.assertIsInstance(batches[0][0], dict)
+        sent = json.loads(mocked_function.call_args[1]["data"])["batch"]
+        self.assertEqual(sent[0]["properties"], {})
+
+    @patch("requests.Session.post")
+    def test_dropped_batch(self, mocked_function):
+        dropped = []
+        hooks = Hooks(
+            on_batch_built=lambda provider, batch: None,
+            on_drop=lambda provider, records, reason: dropped.append(
+                (records[0]["event"], reason)
+            ),
+        )
+        client = self.client(hooks)
+        client.track("userId", "python test event")
+        self.assertFalse(client.consumer.upload(block=False))
+        self.assertFalse(mocked_function.called)
+        self.assertEqual(client.queue.unfinished_tasks, 0)
+        self.assertEqual(dropped, [("python test event", "hook")])
+
+    @patch("requests.Session.post")
+    def test_failing_hook(self, mocked_function):
+        mocked_function.return_value = MockResponse({}, status_code=200)
+        errors = []
+        dropped = []
+
+        def before_send(provider, batch):
+            raise ValueError("broken hook")
+
+        hooks = Hooks(
+            before_send=before_send,
+            on_drop=lambda provider, records, reason: dropped.append(
+                (len(records), reason)
+            ),
+        )
+        client = self.client(
+            hooks, on_error=lambda error, records: errors.append(error)
+        )
+        client.track("userId", "python test event")
+        with self.assertLogs("fam-analytics-py", "ERROR"):
+            self.assertFalse(client.consumer.upload(block=False))
+
+        self.assertFalse(mocked_function.called)
+        self.assertEqual(client.queue.unfinished_tasks, 0)
+        self.assertEqual(dropped, [(1, "hook")])
+        self.assertIsInstance(errors[0], ValueError)
+
+    @patch("requests.Session.post")
+    def test_failing_after_response_hook(self, mocked_function):
+        mocked_function.return_value = MockResponse({}, status_code=200)
+
+        def after_response(provider, batch, success):
+            raise ValueError("broken hook")
+
+        client = self.client(Hooks(after_response=after_response))
+        client.track("userId", "python test event")
+        with self.assertLogs("fam-analytics-py", "ERROR"):
+            # the batch was delivered all the same
+            self.assertTrue(client.consumer.upload(block=False))
+
+    @patch("requests.Session.post")
+    def test_rejected_records(self, mocked_function):
+        mocked_function.return_value = MockResponse(
+            {"code": "invalid", "message": "bad"}, status_code=400
+        )
+        dropped = []
+        hooks = Hooks(
+            on_drop=lambda provider, records, reason: dropped.append(
+                (records[0]["event"], reason)
+            )
+        )
+        client = self.client(hooks)
+        client.track("userId", "python test event")
+        self.assertFalse(client.consumer.upload(block=False))
+        self.assertEqual(dropped, [("python test event", "rejected")])
+
+    @patch("requests.Session.post")
+    def test_profiling_hook(self, mocked_function):
+        mocked_function.return_value = MockResponse({}, status_code=200)
+        profiler = ProfilingHook(sample_rate=1)
+        hooks = Hooks()
+        hooks.add(profiler)
+        client = self.client(hooks)
+        client.track("userId", "python test event")
+        self.assertTrue(client.consumer.upload(block=False))
+        for name in ("segment.prepare_seconds", "segment.send_seconds"):
+            self.assertEqual(profiler.metrics.histogram(name)["count"], 1, name)
+
+        client = self.client(Hooks(on_drop=profiler.on_drop), max_queue_size=1)
+        client.consumer.pause()
+        client.track("userId", "first")
+        client.track("userId", "second")
+        self.assertEqual(profiler.metrics.get("segment.dropped_queue_full"), 1)
+
+    def test_initialize_shares_hooks(self):
+        hooks = Hooks(before_enqueue=scrub)
+        fam_analytics_py.initialize(
+            segment_config=SegmentConfig(write_key="", start_consumer=False),
+            hooks=hooks,
+        )
+        self.addCleanup(setattr, globals, "_segment_client", None)
+        self.addCleanup(setattr, globals, "hooks", None)
+        globals._segment_client = None
+        self.assertIs(globals.get_segment_client().pipeline, hooks.compile())
@@ -0,0 +1,41 @@
+import os
+import re
+import unittest
+
+from fam_analytics_py.ids import CounterIdGenerator, uuid4_id_generator
+
+
+class TestCounterIdGenerator(unittest.TestCase):
+    def test_unique(self):
+        generate = CounterIdGenerator()
+        ids = [generate() for _ in range(10000)]
+        self.assertEqual(len(set(ids)), len(ids))
+
+    def test_distinct_generators_do_not_collide(self):
+        self.assertNotEqual(CounterIdGenerator()(), CounterIdGenerator()())
+
+    def test_valid_mixpanel_insert_id(self):
+        generate = CounterIdGenerator()
+        generate._counter = iter([2**60 - 1])
+        message_id = generate()
+        self.assertLessEqual(len(message_id), 36)
+        self.assertTrue(re.match(r"^[0-9a-f-]+$", message_id))
+
+    @unittest.skipUnless(hasattr(os, "fork"), "requires os.fork")
+    def test_reseeds_after_fork(self):
+        generate = CounterIdGenerator()
+        prefix = generate().split("-")[0]
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            os.write(write_fd, generate().encode())
+            os._exit(0)
+        os.close(write_fd)
+        child_id = os.read(read_fd, 64).decode()
+        os.close(read_fd)
+        os.waitpid(pid, 0)
+        self.assertNotEqual(child_id.split("-")[0], prefix)
+
+    def test_uuid4_generator(self):
+        self.assertEqual(len(uuid4_id_generator()), 36)
@@ -0,0 +1,144 @@
+import time
+import unittest
+from queue import Empty, Full
+
+from fam_analytics_py.base import LaneQueue, Priority
+from fam_analytics_py.metrics import Metrics
+from fam_analytics_py.segment import SegmentClient
+
+
+class TestLaneQueue(unittest.TestCase):
+    def test_fifo_within_a_lane(self):
+        q = LaneQueue()
+        for i in range(3):
+            q.put(i)
+        self.assertEqual([q.get_nowait() for _ in range(3)], [0, 1, 2])
+        self.assertRaises(Empty, q.get_nowait)
+
+    def test_weighted_draining(self):
+        q = LaneQueue(
+            weights={
+                Priority.critical: 2,
+                Priority.default: 1,
+                Priority.best_effort: 1,
+            }
+        )
+        for i in range(4):
+            q.put(("c", i), priority=Priority.critical)
+            q.put(("d", i))
+            q.put(("b", i), priority=Priority.best_effort)
+
+        lanes = [q.get_nowait()[0] for _ in range(8)]
+        self.assertEqual(lanes.count("c"), 4)
+        self.assertEqual(lanes.count("d"), 2)
+        self.assertEqual(lanes.count("b"), 2)
+
+    def test_lower_lanes_not_starved(self):
+        q = LaneQueue()
+        for i in range(100):
+            q.put(i, priority=Priority.critical)
+        q.put("late", priority=Priority.best_effort)
+        drained = [q.get_nowait() for _ in range(20)]
+        self.assertIn("late", drained)
+
+    def test_critical_reserve(self):
+        q = LaneQueue(10, reserve=0.2)
+        for i in range(8):
+            q.put(i, block=False)
+        self.assertRaises(Full, q.put, 8, block=False)
+        q.put("c1", block=False, priority=Priority.critical)
+        q.put("c2", block=False, priority=Priority.critical)
+        self.assertEqual(q.qsize(), 10)
+
+    def test_sheds_lowest_priority_first(self):
+        metrics = Metrics()
+        q = LaneQueue(3, reserve=0, metrics=metrics)
+        q.put("b1", priority=Priority.best_effort)
+        q.put("b2", priority=Priority.best_effort)
+        q.put("d1")
+
+        q.put("c1", block=False, priority=Priority.critical)
+        self.assertEqual(q.lane_size(Priority.best_effort), 1)
+        self.assertEqual(metrics.get("shed_best_effort"), 1)
+
+        # best-effort messages never shed anything
+        self.assertRaises(Full, q.put, "b3", block=False, priority="best_effort")
+        self.assertEqual(q.qsize(), 3)
+
+    def test_reports_shed_items(self):
+        shed = []
+        q = LaneQueue(2, reserve=0, on_shed=shed.extend)
+        q.put("b1", priority=Priority.best_effort)
+        q.put("d1")
+        q.put("c1", priority=Priority.critical)
+        self.assertEqual(shed, ["b1"])
+        self.assertEqual(q.put_many([("c2", Priority.critical)]), [True])
+        self.assertEqual(shed, ["b1", "d1"])
+
+    def test_shed_messages_are_done(self):
+        q = LaneQueue(1, reserve=0)
+        q.put("b", priority=Priority.best_effort)
+        q.put("c", priority=Priority.critical)
+        self.assertEqual(q.unfinished_tasks, 1)
+        q.get_nowait()
+        q.task_done()
+        q.join()
+
+    def test_byte_bound(self):
+        q = LaneQueue(100, reserve=0.5, maxbytes=20)
+        q.put(b"x" * 6)
+        self.assertRaises(Full, q.put, b"x" * 6, block=False)
+        q.put(b"y" * 10, block=False, priority=Priority.critical)
+        self.assertEqual(q.nbytes(), 16)
+        self.assertRaises(Full, q.put, b"z" * 21, block=False)
+
+        q.get_nowait()
+        q.get_nowait()
+        self.assertEqual(q.nbytes(), 0)
+
+    def test_unknown_priority(self):
+        self.assertRaises(ValueError, LaneQueue().put, 1, priority="urgent")
+
+    def test_enqueue_times(self):
+        q = LaneQueue()
+        before = time.monotonic()
+        q.put("a")
+        q.put_many([("b", Priority.default)])
+        item, enqueued_at, link = q.get_stamped()
+        self.assertEqual(item, "a")
+        self.assertGreaterEqual(enqueued_at, before)
+        self.assertIsNone(link)
+        self.assertEqual(q.get_nowait(), "b")
+
+    def test_put_many(self):
+        shed = []
+        q = LaneQueue(3, reserve=0, on_shed=shed.extend)
+        results = q.put_many(
+            [
+                ("b1", Priority.best_effort),
+                ("d1", Priority.default),
+                ("d2", Priority.default),
+                ("c1", Priority.critical),
+                ("b2", Priority.best_effort),
+            ]
+        )
+        # c1 sheds b1, nothing is left for b2 to shed
+        self.assertEqual(results, [False, True, True, True, False])
+        # b1 is reported in the results only
+        self.assertEqual(shed, [])
+        self.assertEqual(q.unfinished_tasks, 3)
+        self.assertEqual(sorted(q.get_nowait() for _ in range(3)), ["c1", "d1", "d2"])
+
+
+class TestClientPriority(unittest.TestCase):
+    def test_track_priority(self):
+        client = SegmentClient("testsecret", send=False)
+        client.send = True
+        client.consumer.pause()
+        client.track("userId", "critical", priority=Priority.critical)
+        client.track("userId", "background", priority=Priority.best_effort)
+        client.track("userId", "plain")
+
+        self.assertEqual(client.queue.lane_size(Priority.critical), 1)
+        self.assertEqual(client.queue.lane_size(Priority.best_effort), 1)
+        self.assertEqual(client.queue.lane_size(Priority.default), 1)
@@ -0,0 +1,83 @@
+import unittest
+
+from fam_analytics_py.clevertap.message import CleverTapMessage
+from fam_analytics_py.message import to_wire
+from fam_analytics_py.mixpanel.message import MixpanelMessage
+from fam_analytics_py.segment.message import SegmentMessage
+
+
+class TestMessage(unittest.TestCase):
+    def test_wire_layout(self):
+        msg = SegmentMessage("track", user_id="userId", event="signup")
+        self.assertEqual(
+            list(msg.to_dict().items()),
+            [
+                ("integrations", {}),
+                ("messageId", None),
+                ("anonymousId", None),
+                ("properties", {}),
+                ("timestamp", None),
+                ("context", {}),
+                ("userId", "userId"),
+                ("type", "track"),
+                ("event", "signup"),
+            ],
+        )
+
+    def test_dict_access(self):
+        msg = SegmentMessage("identify", user_id="userId", traits={"a": 1})
+        self.assertEqual(msg["traits"], {"a": 1})
+        self.assertEqual(msg["context"], {})
+        self.assertEqual(msg.get("event", "missing"), "missing")
+        self.assertNotIn("event", msg)
+        self.assertRaises(KeyError, msg.__getitem__, "event")
+
+        msg["userId"] = "other"
+        self.assertEqual(msg.user_id, "other")
+        self.assertEqual(msg, msg.to_dict())
+
+    def test_clean_copies_fields(self):
+        properties = {"a": 1}
+        msg = CleverTapMessage("event", evt_name="e", evt_data=properties)
+        msg.clean_fields()
+        properties["a"] = 2
+        self.assertEqual(msg["evtData"], {"a": 1})
+
+    def test_type_is_not_sent_to_mixpanel(self):
+        msg = MixpanelMessage("profile", token="t", distinct_id="d")
+        self.assertEqual(msg["type"], "profile")
+        self.assertEqual(to_wire(msg), {"$token": "t", "$distinct_id": "d", "$set": {}})
+        self.assertEqual(to_wire({"a": 1}), {"a": 1})
+
+    def test_compact_is_semantically_equal(self):
+        messages = [
+            SegmentMessage(kind, user_id="userId", event="e", group_id="g")
+            for kind in ("track", "identify", "group", "page", "screen")
+        ]
+        messages.append(SegmentMessage("alias", user_id="u", previous_id="p"))
+        messages.append(CleverTapMessage("event", identity="u", evt_name="e"))
+        messages.append(MixpanelMessage("profile", token="t", distinct_id="d"))
+
+        for msg in messages:
+            full = msg.to_dict()
+            compact = msg.to_dict(compact=True)
+            dropped = set(full) - set(compact)
+            for key in dropped:
+                self.assertIn(full[key], (None, {}))
+            self.assertEqual({key: full[key] for key in compact}, compact)
+
+    def test_compact_keeps_set_fields(self):
+        msg = SegmentMessage(
+            "track", anonymous_id="a", event="e", properties={"a": None}
+        )
+        self.assertEqual(
+            msg.to_dict(compact=True),
+            {
+                "messageId": None,
+                "anonymousId": "a",
+                "properties": {"a": None},
+                "timestamp": None,
+                "type": "track",
+                "event": "e",
+            },
+        )
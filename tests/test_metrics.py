@@ -0,0 +1,34 @@
+import unittest
+
+from fam_analytics_py.metrics import Histogram, Metrics
+
+
+class TestHistogram(unittest.TestCase):
+    def test_summary(self):
+        histogram = Histogram()
+        for value in [0.001] * 90 + [0.1] * 9 + [5.0]:
+            histogram.observe(value)
+
+        summary = histogram.summary()
+        self.assertEqual(summary["count"], 100)
+        self.assertAlmostEqual(summary["sum"], 5.99)
+        self.assertEqual(summary["max"], 5.0)
+        self.assertEqual(summary["p50"], 0.001)
+        # quantiles are bucket bounds, within a factor of two
+        self.assertTrue(0.1 <= summary["p99"] <= 0.2)
+
+    def test_quantiles_never_exceed_max(self):
+        histogram = Histogram()
+        histogram.observe(0.3)
+        self.assertEqual(histogram.quantile(0.5), 0.3)
+        self.assertEqual(Histogram().quantile(0.5), 0.0)
+
+    def test_metrics_snapshot(self):
+        metrics = Metrics()
+        self.assertIsNone(metrics.histogram("http_seconds"))
+        metrics.observe("http_seconds", 0.2)
+        metrics.incr("requests")
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot["requests"], 1)
+        self.assertEqual(snapshot["http_seconds"]["count"], 1)
+        self.assertEqual(metrics.histogram("http_seconds")["max"], 0.2)
@@ -0,0 +1,304 @@
+import json
+import threading
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+
+import pytz
+
+from fam_analytics_py.mixpanel import MixpanelClient, MixpanelConfig, MixpanelConsumer
+from fam_analytics_py.mixpanel.constants import MessageType
+
+from . import MockResponse
+
+
+def get_config(**kwargs):
+    return MixpanelConfig(
+        project_id="1234",
+        project_token="token",
+        service_account_username="username",
+        service_account_secret="secret",
+        **kwargs,
+    )
+
+
+class TestMixpanelClient(unittest.TestCase):
+    def fail(self, e, batch):
+        """Mark the failure handler"""
+        self.failed = True
+
+    def setUp(self):
+        self.failed = False
+        self.client = MixpanelClient(config=get_config(error_callback=self.fail))
+
+    def test_empty_flush(self):
+        self.client.flush()
+
+    def test_basic_track(self):
+        client = MixpanelClient(config=get_config(start_consumer=False))
+        success, msg = client.track(
+            "userId",
+            "python test event",
+            {"property": "value"},
+            timestamp=datetime(2014, 9, 3, tzinfo=pytz.utc),
+            message_id="insert-id",
+        )
+        self.assertTrue(success)
+        self.assertEqual(msg["type"], MessageType.event)
+        self.assertEqual(msg["event"], "python test event")
+        self.assertEqual(
+            msg["properties"],
+            {
+                "property": "value",
+                "$insert_id": "insert-id",
+                "distinct_id": "userId",
+                "time": int(datetime(2014, 9, 3, tzinfo=pytz.utc).timestamp()),
+            },
+        )
+
+    def test_basic_identify(self):
+        client = MixpanelClient(config=get_config(start_consumer=False))
+        success, msg = client.identify("userId", {"trait": "value"})
+        self.assertTrue(success)
+        self.assertEqual(msg["$distinct_id"], "userId")
+        self.assertEqual(msg["$set"], {"trait": "value"})
+
+    def test_config_tuning(self):
+        client = MixpanelClient(
+            config=get_config(
+                start_consumer=False,
+                event_upload_size=500,
+                profile_upload_size=50,
+                max_queue_size=10,
+                timeout=3,
+                retries=2,
+            )
+        )
+        events, profiles = client.consumers
+        self.assertEqual(events.upload_size, 500)
+        self.assertEqual(profiles.upload_size, 50)
+        self.assertEqual(client.queue.maxsize, 10)
+        self.assertEqual(client.profile_queue.maxsize, 10)
+        self.assertEqual((events.timeout, events.retries), (3, 2))
+
+    def test_lanes(self):
+        client = self.client
+        client.join()
+
+        client.track("userId", "python test event")
+        client.identify("userId", {"trait": "value"})
+
+        self.assertEqual(client.queue.qsize(), 1)
+        self.assertEqual(client.profile_queue.qsize(), 1)
+        self.assertEqual(len(client.consumers), 2)
+
+    @patch("requests.Session.post")
+    def test_lanes_post_to_their_endpoints(self, mocked_function):
+        mocked_function.return_value = MockResponse({}, status_code=200)
+
+        client = self.client
+        client.track("userId", "python test event")
+        client.identify("userId", {"trait": "value"})
+        client.flush()
+        self.assertFalse(self.failed)
+
+        urls = sorted(call[0][0] for call in mocked_function.call_args_list)
+        self.assertEqual(
+            urls,
+            [
+                "https://api.mixpanel.com/engage?strict=1#profile-set",
+                "https://api.mixpanel.com/import?strict=1&project_id=1234",
+            ],
+        )
+        for call in mocked_function.call_args_list:
+            for record in json.loads(call[1]["data"]):
+                self.assertNotIn("type", record)
+
+    @patch("requests.Session.post")
+    def test_manual_flush(self, mocked_function):
+        # only passes once both lanes are posting at the same time
+        barrier = threading.Barrier(2, timeout=5)
+
+        def post(*args, **kwargs):
+            barrier.wait()
+            return MockResponse({}, status_code=200)
+
+        mocked_function.side_effect = post
+        client = MixpanelClient(
+            config=get_config(manual_flush=True, error_callback=self.fail)
+        )
+        self.assertFalse(any(consumer.is_alive() for consumer in client.consumers))
+
+        client.track("userId", "python test event")
+        client.identify("userId", {"trait": "value"})
+        self.assertEqual(mocked_function.call_count, 0)
+        client.flush()
+
+        # both lanes were uploaded by the time flush returned
+        self.assertEqual(mocked_function.call_count, 2)
+        self.assertFalse(self.failed)
+        self.assertEqual(client.queue.unfinished_tasks, 0)
+        self.assertEqual(client.profile_queue.unfinished_tasks, 0)
+
+    @patch("requests.Session.post")
+    def test_serialized_messages(self, mocked_function):
+        mocked_function.return_value = MockResponse({}, status_code=200)
+
+        client = MixpanelClient(
+            config=get_config(error_callback=self.fail, serialize_messages=True)
+        )
+        client.join()
+        client.track("userId", "python test event")
+        client.identify("userId", {"trait": "value"})
+        self.assertIsInstance(client.queue.get_nowait(), bytes)
+        client.queue.task_done()
+
+        client.consumers[1].upload()
+        data = mocked_function.call_args[1]["data"]
+        self.assertEqual(
+            json.loads(data),
+            [
+                {
+                    "$token": "token",
+                    "$distinct_id": "userId",
+                    "$set": {"trait": "value"},
+                }
+            ],
+        )
+        self.assertFalse(self.failed)
+
+    @patch("requests.Session.post")
+    def test_slow_profiles_do_not_block_events(self, mocked_function):
+        release = threading.Event()
+
+        def post(url, **kwargs):
+            if "/engage" in url:
+                release.wait(5)
+            return MockResponse({}, status_code=200)
+
+        mocked_function.side_effect = post
+
+        client = self.client
+        client.identify("userId", {"trait": "value"})
+        client.track("userId", "python test event")
+        client.queue.join()
+        self.assertEqual(client.profile_queue.unfinished_tasks, 1)
+
+        release.set()
+        client.flush()
+        self.assertFalse(self.failed)
+
+
+class TestMixpanelConsumer(unittest.TestCase):
+    def get_consumer(self, message_type):
+        return MixpanelConsumer(
+            config=get_config(),
+            queue=None,
+            url="https://api.mixpanel.com",
+            auth=None,
+            headers={},
+            message_type=message_type,
+        )
+
+    def profile(self, distinct_id, traits):
+        return {
+            "type": MessageType.profile,
+            "$token": "token",
+            "$distinct_id": distinct_id,
+            "$set": traits,
+        }
+
+    @patch("requests.Session.post")
+    def test_coalesces_profile_sets(self, mocked_function):
+        mocked_function.return_value = MockResponse({}, status_code=200)
+
+        consumer = self.get_consumer(MessageType.profile)
+        consumer.request(
+            [
+                self.profile("a", {"name": "A", "plan": "free"}),
+                self.profile("b", {"name": "B"}),
+                self.profile("a", {"plan": "pro"}),
+                {"$token": "token", "$distinct_id": "a", "$unset": ["x"]},
+            ]
+        )
+
+        body = json.loads(mocked_function.call_args[1]["data"])
+        self.assertEqual(
+            body,
+            [
+                {
+                    "$token": "token",
+                    "$distinct_id": "a",
+                    "$set": {"name": "A", "plan": "pro"},
+                },
+                {"$token": "token", "$distinct_id": "b", "$set": {"name": "B"}},
+                {"$token": "token", "$distinct_id": "a", "$unset": ["x"]},
+            ],
+        )
+        metrics = consumer.metrics.snapshot()
+        self.assertEqual(metrics["profile_updates_received"], 4)
+        self.assertEqual(metrics["profile_updates_sent"], 3)
+        self.assertAlmostEqual(metrics["profile_merge_ratio"], 4 / 3)
+
+    @patch("requests.Session.post")
+    def test_other_operations_end_the_merge(self, mocked_function):
+        mocked_function.return_value = MockResponse({}, status_code=200)
+
+        consumer = self.get_consumer(MessageType.profile)
+        batch = [
+            self.profile("a", {"a": 1}),
+            {"$token": "token", "$distinct_id": "a", "$unset": ["a"]},
+            self.profile("a", {"b": 2}),
+            self.profile("a", {"c": 3}),
+        ]
+        consumer.request(batch)
+
+        body = json.loads(mocked_function.call_args[1]["data"])
+        self.assertEqual(
+            body,
+            [
+                {"$token": "token", "$distinct_id": "a", "$set": {"a": 1}},
+                {"$token": "token", "$distinct_id": "a", "$unset": ["a"]},
+                {"$token": "token", "$distinct_id": "a", "$set": {"b": 2, "c": 3}},
+            ],
+        )
+        # the queued records are left as they were
+        self.assertEqual(batch[2]["$set"], {"b": 2})
+
+    @patch("requests.Session.post")
+    def test_does_not_coalesce_events(self, mocked_function):
+        mocked_function.return_value = MockResponse({}, status_code=200)
+
+        consumer = self.get_consumer(MessageType.event)
+        event = {"type": MessageType.event, "event": "e", "properties": {}}
+        consumer.request([dict(event), dict(event)])
+
+        body = json.loads(mocked_function.call_args[1]["data"])
+        self.assertEqual(len(body), 2)
+
+    @patch("requests.Session.post")
+    def test_dead_letters_failed_import_records(self, mocked_function):
+        mocked_function.return_value = MockResponse(
+            {
+                "code": 400,
+                "error": "some data points in the request failed validation",
+                "failed_records": [
+                    {"index": 1, "field": "properties.time", "message": "too old"}
+                ],
+                "num_records_imported": 1,
+                "status": "Bad Request",
+            },
+            status_code=400,
+        )
+        dead_letters = []
+
+        consumer = self.get_consumer(MessageType.event)
+        consumer.on_dead_letter = lambda e, records: dead_letters.append((e, records))
+        good = {"event": "good", "properties": {}}
+        bad = {"event": "bad", "properties": {}}
+        consumer.request([good, bad])
+
+        self.assertEqual(mocked_function.call_count, 1)
+        error, records = dead_letters[0]
+        self.assertEqual(records, [bad])
+        self.assertEqual(error.message, "too old")
@@ -0,0 +1,274 @@
+import unittest
+from unittest.mock import patch
+
+import fam_analytics_py
+from fam_analytics_py import globals
+from fam_analytics_py.base import LaneQueue
+from fam_analytics_py.clevertap import CleverTapConfig
+from fam_analytics_py.mixpanel import MixpanelConfig
+from fam_analytics_py.segment import SegmentConfig
+
+
+class TestModule(unittest.TestCase):
+    def setUp(self):
+        globals._clevertap_client = None
+        globals._mixpanel_client = None
+        globals._segment_client = None
+
+    def tearDown(self):
+        self.setUp()
+
+    def initialize(self, **kwargs):
+        fam_analytics_py.initialize(
+            clevertap_config=CleverTapConfig(
+                account_id="", passcode="", start_consumer=False
+            ),
+            mixpanel_config=MixpanelConfig(
+                project_id="",
+                project_token="",
+                service_account_username="",
+                service_account_secret="",
+                start_consumer=False,
+            ),
+            segment_config=SegmentConfig(write_key="testsecret", start_consumer=False),
+            **kwargs,
+        )
+
+    def test_shared_message_id(self):
+        self.initialize(id_generator=lambda: "shared-id")
+
+        with patch.object(
+            globals.get_segment_client(), "_enqueue", return_value=(True, None)
+        ) as segment, patch.object(
+            globals.get_mixpanel_client(), "_enqueue", return_value=(True, None)
+        ) as mixpanel:
+            fam_analytics_py.track("userId", "event", {"property": "value"})
+
+        self.assertEqual(segment.call_args[0][0]["messageId"], "shared-id")
+        self.assertEqual(
+            mixpanel.call_args[0][0]["properties"]["$insert_id"], "shared-id"
+        )
+
+    def test_positional_and_keyword_arguments(self):
+        self.initialize()
+        with self.assertRaises(TypeError):
+            fam_analytics_py.track("userId", "event", user_id="other")
+
+    def test_sampling(self):
+        rules = fam_analytics_py.SamplingRules({("segment", "scroll"): 0.5})
+        self.initialize(sampling_rules=rules)
+        users = ["user-{0}".format(i) for i in range(50)]
+
+        with patch.object(
+            globals.get_segment_client(), "_enqueue", return_value=(True, None)
+        ) as segment, patch.object(
+            globals.get_mixpanel_client(), "_enqueue", return_value=(True, None)
+        ) as mixpanel:
+            for user_id in users:
+                fam_analytics_py.track(user_id, "scroll", {"depth": 1})
+
+        self.assertEqual(mixpanel.call_count, len(users))
+        kept = [call[0][0] for call in segment.call_args_list]
+        self.assertEqual(
+            [msg["userId"] for msg in kept],
+            [user_id for user_id in users if rules.keep(user_id, 0.5)],
+        )
+        for msg in kept:
+            self.assertEqual(msg["properties"], {"depth": 1, "sample_rate": 0.5})
+        for call in mixpanel.call_args_list:
+            self.assertNotIn("sample_rate", call[0][0]["properties"])
+
+    def test_routing(self):
+        rules = fam_analytics_py.RoutingRules(
+            {"segment": {"deny": ["campaign_*"]}, "mixpanel": {"allow": ["signup"]}}
+        )
+        self.initialize(routing_rules=rules)
+
+        with patch.object(
+            globals.get_segment_client(), "track", return_value=(True, None)
+        ) as segment, patch.object(
+            globals.get_mixpanel_client(), "track", return_value=(True, None)
+        ) as mixpanel:
+            fam_analytics_py.track("userId", "campaign_opened")
+            fam_analytics_py.track("userId", "signup")
+
+        self.assertEqual(
+            [call[1]["event"] for call in segment.call_args_list], ["signup"]
+        )
+        self.assertEqual(
+            [call[1]["event"] for call in mixpanel.call_args_list], ["signup"]
+        )
+
+    def test_trait_cache_suppresses_unchanged_traits(self):
+        self.initialize(trait_cache=fam_analytics_py.TraitCache())
+        client = globals.get_segment_client()
+
+        with patch.object(client, "_enqueue", return_value=(True, None)) as enqueue:
+            fam_analytics_py.identify("userId", {"name": "A", "plan": "free"})
+            fam_analytics_py.identify("userId", {"name": "A", "plan": "free"})
+            fam_analytics_py.identify("userId", {"name": "A", "plan": "pro"})
+
+        self.assertEqual(enqueue.call_count, 2)
+        self.assertEqual(enqueue.call_args[0][0]["traits"], {"plan": "pro"})
+
+    def test_trait_cache_forgets_dropped_updates(self):
+        cache = fam_analytics_py.TraitCache()
+        self.initialize(trait_cache=cache)
+        client = globals.get_segment_client()
+
+        with patch.object(client, "_enqueue", return_value=(False, None)):
+            fam_analytics_py.identify("userId", {"name": "A"})
+
+        self.assertEqual(len(cache), 0)
+
+    def test_trait_cache_forgets_invalid_identify(self):
+        cache = fam_analytics_py.TraitCache()
+        self.initialize(trait_cache=cache)
+        client = globals.get_segment_client()
+
+        with patch.object(client, "identify", side_effect=AssertionError):
+            with self.assertRaises(AssertionError):
+                fam_analytics_py.identify("userId", {"name": "A"})
+
+        self.assertEqual(len(cache), 0)
+
+    def test_identify_many_forgets_invalid_batch(self):
+        cache = fam_analytics_py.TraitCache()
+        self.initialize(trait_cache=cache)
+
+        with self.assertRaises(Exception):
+            fam_analytics_py.identify_many(
+                [
+                    {"user_id": "u1", "traits": {"plan": "pro"}},
+                    {"user_id": "u2", "traits": "bad"},
+                ]
+            )
+        # nothing was queued, so the retry still sends the traits of u1
+        results = fam_analytics_py.identify_many(
+            [{"user_id": "u1", "traits": {"plan": "pro"}}]
+        )
+        self.assertNotEqual(results, [[]])
+
+    def test_trait_cache_forgets_shed_identifies(self):
+        cache = fam_analytics_py.TraitCache()
+        self.initialize(trait_cache=cache)
+        globals.is_clevertap_enabled = lambda: False
+        globals.is_mixpanel_enabled = lambda: False
+        client = globals.get_segment_client()
+        client.send = True
+        client.queue = LaneQueue(1, reserve=0, on_shed=client._shed)
+
+        fam_analytics_py.identify(
+            "userId", {"name": "A"}, priority=fam_analytics_py.Priority.best_effort
+        )
+        self.assertEqual(len(cache), 1)
+        fam_analytics_py.track(
+            "userId", "signup", priority=fam_analytics_py.Priority.critical
+        )
+        # the identify was shed, so its traits are sent again
+        self.assertEqual(len(cache), 0)
+
+    def test_track_many(self):
+        self.initialize(
+            routing_rules=fam_analytics_py.RoutingRules(
+                {"segment": {"deny": ["internal.*"]}}
+            )
+        )
+        segment = globals.get_segment_client()
+        mixpanel = globals.get_mixpanel_client()
+
+        with patch.object(
+            segment, "track_many", side_effect=lambda batch: [(True, None)] * len(batch)
+        ) as segment_many, patch.object(
+            mixpanel,
+            "track_many",
+            side_effect=lambda batch: [(False, None)] * len(batch),
+        ), patch.object(
+            globals.get_clevertap_client(), "track_many", return_value=[]
+        ):
+            results = fam_analytics_py.track_many(
+                [
+                    {"user_id": "userId", "event": "signup"},
+                    {"user_id": "userId", "event": "internal.ping"},
+                ]
+            )
+
+        self.assertEqual(segment_many.call_count, 1)
+        self.assertEqual(
+            [call["event"] for call in segment_many.call_args[0][0]], ["signup"]
+        )
+        self.assertTrue(segment_many.call_args[0][0][0]["message_id"])
+        self.assertEqual(results[0], [(False, None), (True, None)])
+        self.assertEqual(results[1], [(False, None)])
+
+    def test_identify_many_uses_the_trait_cache(self):
+        cache = fam_analytics_py.TraitCache()
+        self.initialize(trait_cache=cache)
+        globals.is_clevertap_enabled = lambda: False
+        globals.is_mixpanel_enabled = lambda: False
+        client = globals.get_segment_client()
+
+        with patch.object(
+            client,
+            "identify_many",
+            side_effect=lambda batch: [(True, None)] * len(batch),
+        ) as identify_many:
+            results = fam_analytics_py.identify_many(
+                [
+                    {"user_id": "userId", "traits": {"name": "A"}},
+                    {"user_id": "userId", "traits": {"name": "A"}},
+                ]
+            )
+            fam_analytics_py.identify_many(
+                [{"user_id": "userId", "traits": {"name": "A", "plan": "pro"}}]
+            )
+
+        self.assertEqual(results, [[(True, None)], []])
+        self.assertEqual(identify_many.call_args[0][0][0]["traits"], {"plan": "pro"})
+
+    def test_schema_registry(self):
+        registry = fam_analytics_py.SchemaRegistry({"purchase": {"amount": float}})
+        self.initialize(schema_registry=registry)
+
+        with patch.object(
+            globals.get_segment_client(), "_enqueue", return_value=(True, None)
+        ) as segment:
+            with self.assertRaises(AssertionError):
+                fam_analytics_py.track("userId", "purchase", {"amount": "10"})
+            with self.assertRaises(AssertionError):
+                fam_analytics_py.track_many(
+                    [
+                        {"user_id": "userId", "event": "purchase"},
+                        {
+                            "user_id": "userId",
+                            "event": "purchase",
+                            "properties": {"amount": "10"},
+                        },
+                    ]
+                )
+            fam_analytics_py.track("userId", "purchase", {"amount": 10.5})
+
+        self.assertEqual(segment.call_count, 1)
+
+    def test_flush_manual_clients(self):
+        fam_analytics_py.initialize(
+            mixpanel_config=MixpanelConfig(
+                project_id="",
+                project_token="",
+                service_account_username="",
+                service_account_secret="",
+                manual_flush=True,
+            ),
+            segment_config=SegmentConfig(write_key="testsecret", manual_flush=True),
+        )
+        mixpanel = globals.get_mixpanel_client().consumer
+        segment = globals.get_segment_client().consumer
+        fam_analytics_py.track("userId", "signup")
+
+        with patch.object(mixpanel, "drain") as mixpanel_drain, patch.object(
+            segment, "drain"
+        ) as segment_drain:
+            fam_analytics_py.flush()
+
+        mixpanel_drain.assert_called_once_with()
+        segment_drain.assert_called_once_with()
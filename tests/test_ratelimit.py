@@ -0,0 +1,113 @@
+import unittest
+from queue import Queue
+from unittest.mock import patch
+
+from fam_analytics_py.metrics import Metrics
+from fam_analytics_py.ratelimit import RateLimiter, TokenBucket
+from fam_analytics_py.segment import SegmentClient, SegmentConsumer
+
+from . import MockResponse
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 100.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+class TestTokenBucket(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = patch.multiple(
+            "fam_analytics_py.ratelimit.time",
+            monotonic=self.clock.monotonic,
+            sleep=self.clock.sleep,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_burst_then_paced(self):
+        bucket = TokenBucket(rate=10, capacity=10)
+        self.assertEqual(bucket.acquire(10), 0)
+        self.assertAlmostEqual(bucket.acquire(5), 0.5)
+        self.assertAlmostEqual(bucket.level, 0)
+
+    def test_refills_up_to_capacity(self):
+        bucket = TokenBucket(rate=10, capacity=10)
+        bucket.acquire(10)
+        self.clock.now += 60
+        self.assertEqual(bucket.level, 10)
+
+    def test_oversized_request_goes_into_debt(self):
+        bucket = TokenBucket(rate=10, capacity=10)
+        self.assertAlmostEqual(bucket.reserve(30), 2.0)
+        self.assertAlmostEqual(bucket.level, -20)
+
+    def test_limiter_gauges(self):
+        limiter = RateLimiter(events_per_second=100, bytes_per_second=1000)
+        metrics = Metrics()
+        limiter.register_gauges(metrics)
+        limiter.acquire(events=40, nbytes=250)
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot["rate_limit_event_tokens"], 60)
+        self.assertEqual(snapshot["rate_limit_byte_tokens"], 750)
+
+
+class TestConsumerPacing(unittest.TestCase):
+    @patch("fam_analytics_py.ratelimit.time", FakeClock())
+    @patch("requests.Session.post")
+    def test_consumer_acquires_events_and_bytes(self, mocked_function):
+        mocked_function.return_value = MockResponse({}, status_code=200)
+        limiter = RateLimiter(events_per_second=1000, bytes_per_second=10**6)
+        q = Queue()
+        consumer = SegmentConsumer(
+            q,
+            write_key="testsecret",
+            url="https://api.segment.io/v1/batch",
+            auth="",
+            headers={},
+            rate_limiter=limiter,
+        )
+        for i in range(10):
+            q.put({"type": "track", "event": "e", "userId": str(i)})
+        consumer.upload()
+
+        body_size = len(mocked_function.call_args[1]["data"])
+        self.assertAlmostEqual(limiter.events.level, 990, delta=1)
+        self.assertAlmostEqual(limiter.bytes.level, 10**6 - body_size, delta=1000)
+
+    @patch("fam_analytics_py.base.consumer.time.sleep")
+    @patch("requests.Session.post")
+    def test_backs_off_when_throttled(self, mocked_function, mocked_sleep):
+        mocked_function.side_effect = [
+            MockResponse({"code": "429", "message": "slow down"}, status_code=429),
+            MockResponse({}, status_code=200),
+        ]
+        consumer = SegmentConsumer(
+            None,
+            write_key="testsecret",
+            url="https://api.segment.io/v1/batch",
+            auth="",
+            headers={},
+        )
+        consumer.request([{"type": "track"}])
+        self.assertEqual(mocked_function.call_count, 2)
+        mocked_sleep.assert_called_once_with(0.5)
+        self.assertEqual(consumer.metrics.get("backoff_seconds"), 0.5)
+        self.assertEqual(consumer.metrics.get("rate_limited_seconds"), 0)
+
+    def test_client_exposes_token_levels(self):
+        client = SegmentClient(
+            "testsecret",
+            send=False,
+            rate_limiter=RateLimiter(events_per_second=50),
+        )
+        self.assertIs(client.consumer.rate_limiter, client.rate_limiter)
+        self.assertEqual(client.metrics.snapshot()["rate_limit_event_tokens"], 50)
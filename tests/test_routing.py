@@ -0,0 +1,40 @@
+import unittest
+
+from fam_analytics_py.routing import RoutingRules
+
+
+class TestRoutingRules(unittest.TestCase):
+    def test_no_rules_routes_everywhere(self):
+        rules = RoutingRules({})
+        self.assertEqual(
+            rules.providers("signup"), {"clevertap", "mixpanel", "segment"}
+        )
+
+    def test_allow_and_deny(self):
+        rules = RoutingRules(
+            {
+                "clevertap": {"allow": ["campaign_*", "signup"]},
+                "segment": {"deny": ["campaign_*"]},
+                "mixpanel": {"allow": ["*"], "deny": ["debug_?"]},
+            }
+        )
+        self.assertEqual(rules.providers("campaign_sent"), {"clevertap", "mixpanel"})
+        self.assertEqual(
+            rules.providers("signup"), {"clevertap", "mixpanel", "segment"}
+        )
+        self.assertEqual(rules.providers("debug_1"), {"segment"})
+        self.assertEqual(rules.providers("debug_10"), {"mixpanel", "segment"})
+
+    def test_routes_are_cached(self):
+        rules = RoutingRules({"segment": {"deny": ["scroll"]}}, max_events=2)
+        first = rules.providers("scroll")
+        self.assertIs(rules.providers("scroll"), first)
+        rules.providers("click")
+        rules.providers("view")
+        self.assertEqual(len(rules._routes), 1)
+
+    def test_invalid_rules(self):
+        with self.assertRaises(ValueError):
+            RoutingRules({"amplitude": {"allow": ["signup"]}})
+        with self.assertRaises(ValueError):
+            RoutingRules({"segment": {"only": ["signup"]}})
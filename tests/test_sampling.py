@@ -0,0 +1,40 @@
+import unittest
+
+from fam_analytics_py.sampling import SamplingRules, user_bucket
+
+
+class TestSamplingRules(unittest.TestCase):
+    def test_precedence(self):
+        rules = SamplingRules(
+            {
+                "scroll": 0.1,
+                ("segment", "scroll"): 0.5,
+                ("mixpanel", "*"): 0.8,
+                ("*", "*"): 0.9,
+            }
+        )
+        self.assertEqual(rules.rate("segment", "scroll"), 0.5)
+        self.assertEqual(rules.rate("mixpanel", "scroll"), 0.1)
+        self.assertEqual(rules.rate("mixpanel", "click"), 0.8)
+        self.assertEqual(rules.rate("clevertap", "click"), 0.9)
+
+    def test_default_rate(self):
+        rules = SamplingRules({"scroll": 0.1})
+        self.assertEqual(rules.rate("segment", "click"), 1.0)
+
+    def test_invalid_rate(self):
+        with self.assertRaises(ValueError):
+            SamplingRules({"scroll": 1.5})
+
+    def test_consistent_per_user(self):
+        rules = SamplingRules({})
+        for user_id in range(100):
+            kept = rules.keep(user_id, 0.3)
+            self.assertEqual(kept, rules.keep(user_id, 0.3))
+            # kept at a low rate implies kept at every higher rate
+            if kept:
+                self.assertTrue(rules.keep(user_id, 0.6))
+
+    def test_sample_fraction(self):
+        kept = sum(user_bucket("user-{0}".format(i)) < 0.25 for i in range(10000))
+        self.assertAlmostEqual(kept / 10000, 0.25, delta=0.02)
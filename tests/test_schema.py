@@ -0,0 +1,88 @@
+import unittest
+
+from fam_analytics_py.exceptions import SchemaValidationError
+from fam_analytics_py.schema import SchemaRegistry
+
+
+class TestSchemaRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = SchemaRegistry(
+            {
+                "purchase": {
+                    "amount": float,
+                    "quantity": int,
+                    "currency": {"type": str, "required": True, "max_length": 3},
+                    "coupon": {"type": str, "nullable": True},
+                    "tags": (list, tuple),
+                }
+            }
+        )
+
+    def test_valid_event(self):
+        self.registry.validate(
+            "purchase",
+            {"amount": 10, "quantity": 2, "currency": "INR", "tags": ["a"]},
+        )
+        self.registry.validate("purchase", {"currency": "INR", "coupon": None})
+
+    def test_wrong_type(self):
+        with self.assertRaises(SchemaValidationError) as e:
+            self.registry.validate("purchase", {"currency": "INR", "quantity": "2"})
+        self.assertIn("'quantity' must be int", str(e.exception))
+
+    def test_numbers_are_not_bools(self):
+        self.assertRaises(
+            SchemaValidationError,
+            self.registry.validate,
+            "purchase",
+            {"currency": "INR", "amount": True},
+        )
+
+    def test_not_nullable(self):
+        self.assertRaises(
+            SchemaValidationError,
+            self.registry.validate,
+            "purchase",
+            {"currency": "INR", "amount": None},
+        )
+
+    def test_max_length(self):
+        self.assertRaises(
+            SchemaValidationError,
+            self.registry.validate,
+            "purchase",
+            {"currency": "RUPEE"},
+        )
+
+    def test_required(self):
+        with self.assertRaises(SchemaValidationError) as e:
+            self.registry.validate("purchase", None)
+        self.assertIn("missing required properties: currency", str(e.exception))
+
+    def test_properties_must_be_a_dict(self):
+        for properties in ("x", []):
+            self.assertRaises(
+                SchemaValidationError, self.registry.validate, "purchase", properties
+            )
+
+    def test_is_an_assertion_error(self):
+        self.assertRaises(AssertionError, self.registry.validate, "purchase", {})
+
+    def test_unknown_events_and_properties(self):
+        self.registry.validate("signup", {"anything": object()})
+        self.registry.validate("purchase", {"currency": "INR", "extra": 1})
+
+        registry = SchemaRegistry(
+            {"purchase": {"amount": float}},
+            strict=True,
+            allow_unknown_properties=False,
+        )
+        self.assertRaises(SchemaValidationError, registry.validate, "signup", {})
+        self.assertRaises(
+            SchemaValidationError, registry.validate, "purchase", {"extra": 1}
+        )
+
+    def test_unknown_spec_keys(self):
+        self.assertRaises(
+            ValueError, SchemaRegistry, {"purchase": {"amount": {"maxLength": 3}}}
+        )
@@ -1,4 +1,5 @@
 import json
+import threading
 import unittest
 from datetime import datetime, date
 from unittest.mock import patch
@@ -6,7 +7,9 @@ from queue import Queue
 
 import six
 
-from fam_analytics_py.segment import SegmentClient, SegmentConsumer
+from fam_analytics_py import tracing
+from fam_analytics_py.base import LaneQueue
+from fam_analytics_py.segment import SegmentClient, SegmentConfig, SegmentConsumer
 
 from . import MockResponse
 
@@ -40,6 +43,50 @@ class TestSegmentClient(unittest.TestCase):
         self.assertEqual(msg["properties"], {})
         self.assertEqual(msg["type"], "track")
 
+    def test_track_many(self):
+        client = SegmentClient("testsecret", send=False)
+        client.send = True
+        client.queue = LaneQueue(2, reserve=0)
+        results = client.track_many(
+            [
+                {"user_id": "userId", "event": "first"},
+                {"user_id": "userId", "event": "second", "properties": {"a": 1}},
+                {"user_id": "userId", "event": "third"},
+            ]
+        )
+        self.assertEqual([success for success, _ in results], [True, True, False])
+        self.assertEqual(results[1][1]["properties"], {"a": 1})
+        self.assertEqual(client.queue.get_nowait()["event"], "first")
+
+    def test_many_validates_every_call_first(self):
+        client = SegmentClient("testsecret", send=False)
+        client.send = True
+        client.consumer.pause()
+        with self.assertRaises(AssertionError):
+            client.identify_many([{"user_id": "userId"}, {"traits": {"a": 1}}])
+        self.assertEqual(client.queue.qsize(), 0)
+
+    def test_returns_plain_dicts(self):
+        client = SegmentClient("testsecret", send=False)
+        client.send = True
+        client.consumer.pause()
+        _, msg = client.track("userId", "python test event", {"a": 1})
+        self.assertIsInstance(msg, dict)
+        self.assertEqual(json.loads(json.dumps(msg))["properties"], {"a": 1})
+
+    def test_rejects_empty_non_dict_properties(self):
+        client = SegmentClient("testsecret", send=False)
+        for properties in ("", []):
+            with self.assertRaises(AssertionError):
+                client.track("userId", "python test event", properties)
+        with self.assertRaises(AssertionError):
+            client.identify("userId", traits=[])
+        for value in ("", [], 0):
+            with self.assertRaises(AssertionError):
+                client.track("userId", "python test event", context=value)
+            with self.assertRaises(AssertionError):
+                client.track("userId", "python test event", integrations=value)
+
     def test_stringifies_user_id(self):
         # A large number that loses precision in node:
         # node -e "console.log(157963456373623802 + 1)" > 157963456373623800
@@ -92,6 +139,16 @@ class TestSegmentClient(unittest.TestCase):
         self.assertEqual(msg["userId"], "userId")
         self.assertEqual(msg["type"], "track")
 
+    def test_message_id(self):
+        client = SegmentClient(
+            "testsecret", send=False, id_generator=lambda: "generated"
+        )
+        success, msg = client.track("userId", "python test event")
+        self.assertEqual(msg["messageId"], "generated")
+
+        success, msg = client.track("userId", "python test event", message_id="abc")
+        self.assertEqual(msg["messageId"], "abc")
+
     def test_basic_identify(self):
         client = self.client
         success, msg = client.identify("userId", {"trait": "value"})
@@ -326,6 +383,69 @@ class TestSegmentConsumer(unittest.TestCase):
         next = consumer.next()
         self.assertEqual(next, list(range(upload_size)))
 
+    def test_next_limit_bytes(self):
+        q = Queue()
+        consumer = SegmentConsumer(
+            q,
+            write_key="",
+            url="https://api.segment.io/v1/batch",
+            auth="",
+            headers={},
+            upload_size=100,
+            max_batch_bytes=1000,
+        )
+        for i in range(100):
+            q.put({"event": "x" * 100})
+        next = consumer.next()
+        # each message serializes to 113 bytes, so the 9th one crosses 1000
+        self.assertEqual(len(next), 9)
+
+    @patch("requests.Session.post")
+    def test_measured_records_are_serialized_once(self, mocked_function):
+        mocked_function.return_value = MockResponse({}, status_code=200)
+        q = Queue()
+        consumer = SegmentConsumer(
+            q,
+            write_key="",
+            url="https://api.segment.io/v1/batch",
+            auth="",
+            headers={},
+            max_batch_bytes=1000,
+        )
+        for i in range(3):
+            q.put({"type": "track", "event": "e", "userId": str(i)})
+        with patch("fam_analytics_py.request.json") as request_json:
+            self.assertTrue(consumer.upload(block=False))
+        # the body is joined from the records encoded while measuring them
+        request_json.dumps.assert_not_called()
+        batch = json.loads(mocked_function.call_args[1]["data"])["batch"]
+        self.assertEqual([record["userId"] for record in batch], ["0", "1", "2"])
+
+    @patch("requests.Session.post")
+    def test_unencodable_record_fails_alone(self, mocked_function):
+        mocked_function.return_value = MockResponse({}, status_code=200)
+        errors = []
+        q = Queue()
+        consumer = SegmentConsumer(
+            q,
+            write_key="",
+            url="https://api.segment.io/v1/batch",
+            auth="",
+            headers={},
+            max_batch_bytes=1000,
+            on_error=lambda error, records: errors.append((error, records)),
+        )
+        q.put({"type": "track", "event": "e", "properties": {("a", "b"): 1}})
+        q.put({"type": "track", "event": "e", "userId": "userId"})
+        with self.assertLogs("fam-analytics-py", "ERROR"):
+            self.assertTrue(consumer.upload(block=False))
+
+        self.assertEqual(q.unfinished_tasks, 0)
+        self.assertIsInstance(errors[0][0], TypeError)
+        self.assertEqual(len(errors[0][1]), 1)
+        batch = json.loads(mocked_function.call_args[1]["data"])["batch"]
+        self.assertEqual([record["userId"] for record in batch], ["userId"])
+
     # def test_upload(self):
     #     q = Queue()
     #     consumer = SegmentConsumer(
@@ -362,6 +482,86 @@ class TestSegmentConsumer(unittest.TestCase):
         consumer.pause()
         self.assertFalse(consumer.running)
 
+    @patch("requests.Session.post")
+    def test_manual_flush(self, mocked_function):
+        threads = set()
+
+        def post(*args, **kwargs):
+            threads.add(threading.current_thread())
+            return MockResponse({}, status_code=200)
+
+        mocked_function.side_effect = post
+        client = SegmentClient.from_config(
+            SegmentConfig(write_key="testsecret", manual_flush=True, upload_size=2)
+        )
+        self.assertFalse(client.consumer.is_alive())
+
+        for _ in range(5):
+            success, _ = client.track("userId", "python test event")
+            self.assertTrue(success)
+        client.flush()
+
+        self.assertEqual(mocked_function.call_count, 3)
+        self.assertEqual(client.queue.unfinished_tasks, 0)
+        # uploaded from the thread calling flush
+        self.assertEqual(threads, {threading.current_thread()})
+
+    @patch("requests.Session.post")
+    def test_delivery_latency(self, mocked_function):
+        mocked_function.return_value = MockResponse({}, status_code=200)
+        client = SegmentClient("testsecret", send=False)
+        client.send = True
+        client.track("userId", "python test event")
+        client.track("userId", "python test event")
+        self.assertTrue(client.consumer.upload(block=False))
+
+        metrics = client.metrics
+        self.assertEqual(metrics.histogram("queue_wait_seconds")["count"], 2)
+        for name in (
+            "batch_build_seconds",
+            "serialize_seconds",
+            "http_seconds",
+            "delivery_seconds",
+        ):
+            self.assertEqual(metrics.histogram(name)["count"], 1, name)
+        # the enqueue time never reaches the payload
+        record, _ = json.loads(mocked_function.call_args[1]["data"])["batch"]
+        self.assertEqual(
+            set(record),
+            {
+                "integrations",
+                "messageId",
+                "anonymousId",
+                "properties",
+                "timestamp",
+                "context",
+                "userId",
+                "type",
+                "event",
+            },
+        )
+
+    @unittest.skipIf(tracing.available(), "opentelemetry-api is installed")
+    def test_trace_delivery_requires_opentelemetry(self):
+        self.assertRaises(ImportError, SegmentClient, "testsecret", trace_delivery=True)
+
+    @patch("requests.Session.post")
+    def test_compact_request_body(self, mocked_function):
+        mocked_function.return_value = MockResponse({}, status_code=200)
+        client = SegmentClient("testsecret", compact=True)
+        success, msg = client.track("userId", "python test event")
+        client.flush()
+        self.assertTrue(success)
+
+        # records are encoded once, when measured for max_batch_bytes
+        data = mocked_function.call_args[1]["data"].decode("utf-8")
+        self.assertNotIn(", ", data)
+        (record,) = json.loads(data)["batch"]
+        self.assertEqual(
+            set(record), {"messageId", "timestamp", "userId", "type", "event"}
+        )
+        self.assertEqual(record["messageId"], msg["messageId"])
+
     @patch("requests.Session.post")
     def test_sent_at(self, mocked_function):
         mocked_function.return_value = MockResponse({}, status_code=200)
@@ -0,0 +1,167 @@
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from fam_analytics_py.constants import Provider
+from fam_analytics_py.mixpanel import MixpanelConfig
+from fam_analytics_py.segment import SegmentClient, SegmentConfig, SegmentConsumer
+from fam_analytics_py.tenants import ClientRegistry, ConsumerPool
+
+from . import MockResponse
+
+
+def mixpanel_config(**kwargs):
+    return MixpanelConfig(
+        project_id="",
+        project_token="",
+        service_account_username="",
+        service_account_secret="",
+        **kwargs
+    )
+
+
+class TestConsumerPool(unittest.TestCase):
+    def client(self):
+        client = SegmentClient("testsecret", send=False)
+        client.send = True
+        return client
+
+    def test_takes_turns(self):
+        busy, quiet, idle = self.client(), self.client(), self.client()
+        for _ in range(3):
+            busy.track("userId", "python test event")
+        quiet.track("userId", "python test event")
+
+        pool = ConsumerPool()
+        pool.add([busy.consumer, idle.consumer, quiet.consumer])
+        first = pool._claim()
+        self.assertIs(first, busy.consumer)
+        pool._release(first)
+        # the idle consumer is skipped, the busy one waits for its turn
+        self.assertIs(pool._claim(), quiet.consumer)
+        self.assertIs(pool._claim(), busy.consumer)
+        # both are being uploaded, no other consumer has messages
+        self.assertIsNone(pool._claim())
+
+    def test_removed_consumer_is_not_released(self):
+        client = self.client()
+        client.track("userId", "python test event")
+        pool = ConsumerPool()
+        pool.add([client.consumer])
+        consumer = pool._claim()
+        pool.remove([consumer])
+        pool._release(consumer)
+        self.assertIsNone(pool._claim())
+
+    @patch("requests.Session.post")
+    def test_survives_failing_uploads(self, mocked_function):
+        mocked_function.return_value = MockResponse({}, status_code=500)
+
+        def on_error(error, records):
+            raise ValueError("broken callback")
+
+        client = SegmentClient("testsecret", send=False, retries=0, on_error=on_error)
+        client.send = True
+        pool = ConsumerPool(workers=1, poll_interval=0.01)
+        pool.add([client.consumer])
+        pool.start()
+        self.addCleanup(pool.stop)
+        with self.assertLogs("fam-analytics-py", "ERROR"):
+            client.track("userId", "python test event")
+            client.queue.join()
+            client.track("userId", "python test event")
+            # uploaded by the same thread after the first one failed
+            client.queue.join()
+
+        self.assertTrue(all(thread.is_alive() for thread in pool._threads))
+
+
+class TestClientRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = ClientRegistry(workers=1)
+
+    def tearDown(self):
+        self.registry.join()
+
+    def test_clients_by_tenant(self):
+        payments = self.registry.add("payments", SegmentConfig(write_key="p"))
+        mixpanel = self.registry.add("payments", mixpanel_config())
+        cards = self.registry.add("cards", SegmentConfig(write_key="c"))
+
+        self.assertIs(self.registry.get("payments", Provider.segment), payments)
+        self.assertEqual(
+            self.registry.clients("payments"),
+            {Provider.segment: payments, Provider.mixpanel: mixpanel},
+        )
+        self.assertEqual(self.registry.tenants(), ["payments", "cards"])
+        self.assertIsNot(cards.queue, payments.queue)
+        self.assertRaises(KeyError, self.registry.get, "cards", Provider.mixpanel)
+        self.assertRaises(
+            ValueError, self.registry.add, "cards", SegmentConfig(write_key="x")
+        )
+        self.assertRaises(TypeError, self.registry.add, "cards", object())
+
+    def test_share_one_pool(self):
+        first = self.registry.add("payments", mixpanel_config())
+        second = self.registry.add("cards", mixpanel_config())
+        for client in (first, second):
+            self.assertTrue(client.send)
+            self.assertFalse(any(consumer.is_alive() for consumer in client.consumers))
+        self.assertEqual(list(self.registry._pools), [Provider.mixpanel])
+
+    def test_disabled_client_is_not_pooled(self):
+        client = self.registry.add(
+            "payments", SegmentConfig(write_key="p", start_consumer=False)
+        )
+        self.assertFalse(client.send)
+        self.assertEqual(self.registry._pools, {})
+
+    @patch("requests.Session.post")
+    def test_flush(self, mocked_function):
+        mocked_function.return_value = MockResponse({}, status_code=200)
+        for tenant in ("payments", "cards"):
+            client = self.registry.add(tenant, SegmentConfig(write_key=tenant))
+            client.track("userId", "python test event")
+        self.registry.flush()
+
+        write_keys = {
+            call[1]["auth"].username for call in mocked_function.call_args_list
+        }
+        self.assertEqual(write_keys, {"payments", "cards"})
+        for tenant in ("payments", "cards"):
+            client = self.registry.get(tenant, Provider.segment)
+            self.assertEqual(client.queue.unfinished_tasks, 0)
+
+    @patch("requests.Session.post")
+    def test_remove(self, mocked_function):
+        mocked_function.return_value = MockResponse({}, status_code=200)
+        client = self.registry.add("payments", SegmentConfig(write_key="p"))
+        client.track("userId", "python test event")
+        self.registry.remove("payments")
+        self.assertEqual(client.queue.unfinished_tasks, 0)
+        self.assertEqual(self.registry.tenants(), [])
+
+    def test_flush_uploads_a_lane_from_one_thread_at_a_time(self):
+        lock = threading.Lock()
+        uploading = {}
+        overlaps = []
+
+        def request(consumer, batch):
+            with lock:
+                uploading[consumer] = uploading.get(consumer, 0) + 1
+                overlaps.append(uploading[consumer])
+            time.sleep(0.001)
+            with lock:
+                uploading[consumer] -= 1
+
+        registry = ClientRegistry(workers=4)
+        self.addCleanup(registry.join)
+        client = registry.add("payments", SegmentConfig(write_key="p", upload_size=5))
+        with patch.object(SegmentConsumer, "request", request):
+            for _ in range(200):
+                client.track("userId", "python test event")
+            registry.flush()
+
+        self.assertEqual(client.queue.unfinished_tasks, 0)
+        self.assertEqual(max(overlaps), 1)
@@ -0,0 +1,72 @@
+import unittest
+from datetime import date
+from unittest.mock import patch
+
+from fam_analytics_py.trait_cache import TraitCache
+
+
+class TestTraitCache(unittest.TestCase):
+    def test_first_call_sends_everything(self):
+        cache = TraitCache()
+        traits = {"name": "A", "plan": "free"}
+        self.assertEqual(cache.diff("user", traits), traits)
+
+    def test_only_changed_traits(self):
+        cache = TraitCache()
+        cache.diff("user", {"name": "A", "plan": "free", "tags": ["a"]})
+        self.assertEqual(
+            cache.diff("user", {"name": "A", "plan": "pro", "tags": ["a"]}),
+            {"plan": "pro"},
+        )
+        self.assertEqual(cache.diff("user", {"name": "A", "tags": ["a"]}), {})
+
+    def test_type_changes_are_changes(self):
+        cache = TraitCache()
+        cache.diff("user", {"count": 1})
+        self.assertEqual(cache.diff("user", {"count": True}), {"count": True})
+        self.assertEqual(cache.diff("user", {"count": 1.0}), {"count": 1.0})
+
+    def test_unhashable_values(self):
+        cache = TraitCache()
+        traits = {"address": {"city": "x", "since": date(2020, 1, 1)}}
+        cache.diff("user", traits)
+        self.assertEqual(cache.diff("user", traits), {})
+
+    def test_lru_eviction(self):
+        cache = TraitCache(max_users=2)
+        cache.diff("a", {"x": 1})
+        cache.diff("b", {"x": 1})
+        cache.diff("a", {"x": 1})
+        cache.diff("c", {"x": 1})
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.diff("a", {"x": 1}), {})
+        self.assertEqual(cache.diff("b", {"x": 1}), {"x": 1})
+
+    def test_ttl(self):
+        cache = TraitCache(ttl=10)
+        with patch("time.monotonic", return_value=100):
+            cache.diff("user", {"x": 1})
+        with patch("time.monotonic", return_value=109):
+            self.assertEqual(cache.diff("user", {"x": 1}), {})
+        with patch("time.monotonic", return_value=111):
+            self.assertEqual(cache.diff("user", {"x": 1}), {"x": 1})
+
+    def test_forget(self):
+        cache = TraitCache()
+        cache.diff("user", {"x": 1})
+        cache.forget("user")
+        self.assertEqual(cache.diff("user", {"x": 1}), {"x": 1})
+
+    def test_metrics(self):
+        cache = TraitCache()
+        cache.diff("user", {"x": 1, "y": 1})
+        cache.diff("user", {"x": 1, "y": 2})
+        cache.diff("user", {"x": 1, "y": 2})
+        cache.diff("user", {"x": 1, "y": 2})
+        metrics = cache.metrics.snapshot()
+        self.assertEqual(metrics["lookups"], 4)
+        self.assertEqual(metrics["hits"], 2)
+        self.assertEqual(metrics["partial_hits"], 1)
+        self.assertEqual(metrics["misses"], 1)
+        self.assertEqual(metrics["hit_rate"], 0.5)
+        self.assertEqual(metrics["size"], 1)
@@ -0,0 +1,53 @@
+import unittest
+from datetime import datetime, timedelta, timezone
+
+import pytz
+
+from fam_analytics_py.utils import (
+    UTC,
+    CoarseClock,
+    guess_timezone,
+    to_epoch_seconds,
+    to_isoformat,
+)
+
+
+class TestTimestamps(unittest.TestCase):
+    def test_guess_timezone_naive_past_is_utc(self):
+        dt = guess_timezone(datetime(2014, 9, 3))
+        self.assertEqual(dt.isoformat(), "2014-09-03T00:00:00+00:00")
+
+    def test_guess_timezone_keeps_aware(self):
+        dt = datetime(2014, 9, 3, tzinfo=pytz.timezone("Asia/Kolkata"))
+        self.assertIs(guess_timezone(dt), dt)
+
+    def test_to_isoformat(self):
+        dt = datetime(2014, 9, 3, 10, 30, tzinfo=pytz.utc)
+        self.assertEqual(to_isoformat(dt), "2014-09-03T10:30:00+00:00")
+
+    def test_to_epoch_seconds(self):
+        dt = datetime(2014, 9, 3, tzinfo=pytz.utc)
+        self.assertEqual(to_epoch_seconds(dt), int(dt.timestamp()))
+
+    def test_defaults_use_current_time(self):
+        now = datetime.now(timezone.utc)
+        self.assertLessEqual(abs(to_epoch_seconds() - now.timestamp()), 2)
+        parsed = datetime.fromisoformat(to_isoformat())
+        self.assertLess(abs(parsed - now), timedelta(seconds=2))
+
+
+class TestCoarseClock(unittest.TestCase):
+    def test_renderings_agree(self):
+        clock = CoarseClock(resolution=60)
+        self.assertAlmostEqual(clock.now().timestamp(), clock.epoch(), places=5)
+        self.assertEqual(clock.isoformat(), clock.now().isoformat())
+        self.assertIs(clock.now().tzinfo, UTC)
+
+    def test_reuses_reading_within_resolution(self):
+        clock = CoarseClock(resolution=60)
+        self.assertIs(clock.isoformat(), clock.isoformat())
+
+    def test_refreshes_after_resolution(self):
+        clock = CoarseClock(resolution=0)
+        first = clock.epoch()
+        self.assertGreaterEqual(clock.epoch(), first)
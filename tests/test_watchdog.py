@@ -0,0 +1,111 @@
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from fam_analytics_py.base import Watchdog
+from fam_analytics_py.mixpanel import MixpanelClient, MixpanelConfig
+from fam_analytics_py.segment import SegmentClient
+
+from . import MockResponse
+
+
+class TestWatchdog(unittest.TestCase):
+    def setUp(self):
+        self.client = SegmentClient("testsecret", watchdog_interval=None)
+        self.watchdog = Watchdog(self.client, stall_timeout=60)
+
+    def tearDown(self):
+        self.client.join()
+
+    def test_healthy_consumers(self):
+        self.assertEqual(self.watchdog.check(), 0)
+        self.assertEqual(self.client.metrics.get("consumer_restarts"), 0)
+
+    def test_retrying_consumer_is_not_stalled(self):
+        consumer = self.client.consumer
+        # a batch busy with its retries since long before the timeout
+        consumer.heartbeat = time.monotonic() - 120
+        consumer._attempt()
+        self.assertEqual(self.watchdog.check(), 0)
+        self.assertIs(self.client.consumer, consumer)
+
+    @patch("requests.Session.post")
+    def test_restarts_dead_consumer(self, mocked_function):
+        mocked_function.return_value = MockResponse({}, status_code=200)
+        dead = self.client.consumer
+        with patch.object(dead, "next", side_effect=RuntimeError("bug")), patch(
+            "threading.excepthook"
+        ):
+            dead.join(5)
+        self.assertFalse(dead.is_alive())
+
+        self.assertEqual(self.watchdog.check(), 1)
+        self.assertIsNot(self.client.consumer, dead)
+        self.assertIs(self.client.consumer.queue, self.client.queue)
+        self.assertTrue(self.client.consumer.is_alive())
+        self.assertEqual(self.client.metrics.get("consumers_dead"), 1)
+        self.assertEqual(self.client.metrics.get("consumer_restarts"), 1)
+
+        # the queue is drained by the new consumer
+        self.client.track("userId", "python test event")
+        self.client.flush()
+        self.assertEqual(mocked_function.call_count, 1)
+
+    @patch("requests.Session.post")
+    def test_restarts_stalled_consumer(self, mocked_function):
+        posting = threading.Event()
+        release = threading.Event()
+
+        def post(*args, **kwargs):
+            posting.set()
+            release.wait(5)
+            return MockResponse({}, status_code=200)
+
+        mocked_function.side_effect = post
+        stalled = self.client.consumer
+        self.client.track("userId", "python test event")
+        self.assertTrue(posting.wait(5))
+
+        watchdog = Watchdog(self.client, stall_timeout=0.1)
+        time.sleep(0.2)
+        self.assertEqual(watchdog.check(), 1)
+        self.assertFalse(stalled.running)
+        self.assertTrue(self.client.consumer.is_alive())
+        self.assertEqual(self.client.metrics.get("consumers_stalled"), 1)
+        self.assertGreaterEqual(self.client.metrics.get("stalled_seconds"), 0.1)
+
+        # the stalled request still completes, and its thread exits
+        release.set()
+        self.client.flush()
+        stalled.join(5)
+        self.assertFalse(stalled.is_alive())
+
+    def test_ignores_paused_consumers(self):
+        self.client.join()
+        self.assertEqual(self.watchdog.check(), 0)
+
+    def test_replaces_mixpanel_lanes(self):
+        client = MixpanelClient(
+            config=MixpanelConfig(
+                project_id="",
+                project_token="",
+                service_account_username="",
+                service_account_secret="",
+                watchdog_interval=None,
+            )
+        )
+        profiles = client.consumers[1]
+        replacement = client._restart_consumer(1)
+        self.assertFalse(profiles.running)
+        self.assertEqual(replacement.lane, profiles.lane)
+        self.assertIs(replacement.queue, client.profile_queue)
+        client.join()
+
+    def test_started_with_the_client(self):
+        client = SegmentClient("testsecret", watchdog_interval=0.1)
+        self.assertTrue(client.watchdog.is_alive())
+        client.join()
+        client.watchdog.join(1)
+        self.assertFalse(client.watchdog.is_alive())
+        self.assertIsNone(SegmentClient("testsecret", send=False).watchdog)